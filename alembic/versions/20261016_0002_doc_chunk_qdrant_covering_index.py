@@ -0,0 +1,35 @@
+"""Cover doc_chunk(doc_id) lookups of qdrant_id with an index-only scan
+
+Revision ID: 20261016_0002
+Revises: 20260216_0001
+Create Date: 2026-10-16 00:00:00
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_0002"
+down_revision = "20260216_0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Re-indexing reads every qdrant_id of a document by doc_id; INCLUDE lets
+    # that be answered from the index. Supersedes the plain doc_id index.
+    op.create_index(
+        "ix_doc_chunk_doc_id_qdrant_id",
+        "doc_chunk",
+        ["doc_id"],
+        unique=False,
+        postgresql_include=["qdrant_id"],
+    )
+    op.drop_index("ix_doc_chunk_doc_id", table_name="doc_chunk")
+
+
+def downgrade() -> None:
+    op.create_index("ix_doc_chunk_doc_id", "doc_chunk", ["doc_id"], unique=False)
+    op.drop_index("ix_doc_chunk_doc_id_qdrant_id", table_name="doc_chunk")
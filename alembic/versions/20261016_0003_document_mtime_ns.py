@@ -0,0 +1,26 @@
+"""Add document.mtime_ns for the NAS sync stat fast path
+
+Revision ID: 20261016_0003
+Revises: 20261016_0002
+Create Date: 2026-10-16 00:00:00
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_0003"
+down_revision = "20261016_0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # With size, lets NAS sync skip hashing files whose stat is unchanged
+    op.add_column("document", sa.Column("mtime_ns", sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("document", "mtime_ns")
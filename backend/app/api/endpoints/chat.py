@@ -1,8 +1,9 @@
 """Chat/RAG Endpoints - Handles 50 concurrent requests"""
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from app.database import get_db
+from app.database import AsyncSessionLocal, get_db
 from app.models import User, ChatSession, ChatMsg, MsgRef
 from app.middleware.auth import build_qdrant_filter, get_current_active_user
 from app.middleware.logging import log_chat_interaction
@@ -16,7 +17,10 @@ from app.schemas import (
 )
 from app.services.rag_service import rag_service
 from app.services.qdrant_service import qdrant_service
+from typing import AsyncGenerator
 from uuid import uuid4
+import anyio
+import orjson
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,7 +28,7 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 
-@router.post("/", response_model=ChatResponse)
+@router.post("/", response_model=ChatResponse, response_class=ORJSONResponse)
 async def chat(
     request_body: ChatRequest,
     http_request: Request,
@@ -38,7 +42,15 @@ async def chat(
     - Generates answer using vLLM
     - Logs interaction to audit database
     - Handles up to 50 concurrent requests with FastAPI async
+    - With stream=true, returns tokens as Server-Sent Events
     """
+    if request_body.stream:
+        return StreamingResponse(
+            _stream_chat(request_body, http_request, current_user),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     try:
         # Generate RAG answer
         result = await rag_service.generate_answer(
@@ -100,6 +112,64 @@ async def chat(
         raise HTTPException(status_code=500, detail="Chat request failed")
 
 
+async def _stream_chat(
+    request_body: ChatRequest,
+    http_request: Request,
+    current_user: User,
+) -> AsyncGenerator[str, None]:
+    """Forward RAG stream events as SSE, then log the interaction to audit.
+
+    The request-scoped DB session is closed before the body is streamed, so
+    audit logging opens its own session. The audit row is also written when
+    the client disconnects mid-stream.
+    """
+    conversation_id = request_body.conversation_id or str(uuid4())
+    tokens = []
+    final = {"retrieved_documents": [], "token_count": 0, "latency_ms": 0}
+    error_message = None
+
+    try:
+        async for event in rag_service.stream_answer(
+            query=request_body.query,
+            user=current_user,
+            top_k=request_body.top_k or 5,
+            temperature=request_body.temperature or 0.7,
+            max_tokens=request_body.max_tokens or 1024
+        ):
+            if "token" in event:
+                tokens.append(event["token"])
+            else:
+                final = event
+                event = {**event, "conversation_id": conversation_id, "model_name": "vLLM"}
+            yield f"data: {orjson.dumps(event).decode()}\n\n"
+    except Exception as e:
+        logger.exception("Chat stream error")
+        error_message = str(e)
+        yield f"data: {orjson.dumps({'error': 'Chat request failed'}).decode()}\n\n"
+    except BaseException:
+        # Disconnect: Starlette cancels the stream (CancelledError) or closes it (GeneratorExit)
+        if not final.get("done"):
+            error_message = "client disconnected"
+        raise
+    finally:
+        # Shielded so a cancelled stream still writes its audit row
+        with anyio.CancelScope(shield=True):
+            async with AsyncSessionLocal() as db:
+                await log_chat_interaction(
+                    db=db,
+                    user=current_user,
+                    query=request_body.query,
+                    response="".join(tokens),
+                    retrieved_documents=final["retrieved_documents"],
+                    token_count=final["token_count"],
+                    latency_ms=final["latency_ms"],
+                    success=error_message is None,
+                    error_message=error_message,
+                    ip_address=http_request.client.host if http_request.client else None,
+                    user_agent=http_request.headers.get("user-agent")
+                )
+
+
 @router.post("/search", response_model=SearchResponse)
 async def search_documents(
     request_body: SearchRequest,
@@ -62,6 +62,7 @@ class Settings(BaseSettings):
     # vLLM
     VLLM_URL: str = "http://vllm_service:8000"
     VLLM_TIMEOUT: int = 120
+    VLLM_MAX_MODEL_LEN: int = 4096  # Must match vLLM --max-model-len
 
     # Microservice URLs
     OCR_URL: str = "http://ocr_service:8001"
@@ -77,6 +78,9 @@ class Settings(BaseSettings):
     # RAG Settings
     RAG_TOP_K: int = 5
     RAG_SIMILARITY_THRESHOLD: float = 0.7
+    RAG_MIN_CONTEXT_TOKENS: int = 512  # max_tokens is capped to leave this much for context
+    LLM_TOKENIZER_PATH: str = ""  # Served model dir (or its tokenizer.json) for exact prompt token counts
+    TIKTOKEN_CACHE_DIR: str = ""  # Bundled tiktoken BPE cache, used when LLM_TOKENIZER_PATH is unset
     CHUNK_SIZE: int = 500
     CHUNK_OVERLAP: int = 50
     
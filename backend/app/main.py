@@ -3,11 +3,17 @@ from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import logging
+import time
 from app.config import settings
 from app.database import init_db, close_db
 from app.middleware.logging import AuditLoggingMiddleware
 from app.api.endpoints import admin, auth, chat
+from app.services import reranker_client
+from app.services.llm_service import vllm_service
+from app.services.qdrant_service import qdrant_service
+from app.services.rag_service import load_tokenizer
 
 # Configure logging
 logging.basicConfig(
@@ -17,6 +23,26 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def warmup_connections():
+    """Open pooled connections to downstream services before serving traffic.
+
+    Moves DNS/TCP setup off the first user query. Failures are logged only;
+    the services may still be starting.
+    """
+    targets = {
+        "reranker": lambda: reranker_client.get_client().get(f"{settings.RERANKER_URL}/health", timeout=10),
+        "vllm": lambda: vllm_service.client.get(f"{settings.VLLM_URL}/health", timeout=10),
+        "qdrant": lambda: asyncio.to_thread(qdrant_service.client.get_collections),
+    }
+    for name, probe in targets.items():
+        start = time.perf_counter()
+        try:
+            await probe()
+            logger.info(f"Warmed {name} connection in {(time.perf_counter() - start) * 1000:.0f}ms")
+        except Exception as e:
+            logger.warning(f"Warmup of {name} failed: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan: startup and shutdown events"""
@@ -24,9 +50,13 @@ async def lifespan(app: FastAPI):
     logger.info("Starting application...")
     await init_db()
     logger.info("Database initialized")
+    await asyncio.to_thread(load_tokenizer)
+    await warmup_connections()
     yield
     # Shutdown
     logger.info("Shutting down application...")
+    await reranker_client.close_client()
+    await vllm_service.close()
     await close_db()
     logger.info("Database connections closed")
 
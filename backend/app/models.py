@@ -187,6 +187,7 @@ class Document(Base):
     type = Column(String(50), nullable=False)
     hash = Column(String(64), unique=True, nullable=False, index=True)
     size = Column(BigInteger)
+    mtime_ns = Column(BigInteger)
     dept_id = Column(Integer, ForeignKey("department.dept_id", ondelete="RESTRICT"), nullable=False)
     role_id = Column(Integer, ForeignKey("roles.role_id", ondelete="RESTRICT"), nullable=False)
     total_page_cnt = Column(Integer, default=0)
@@ -14,6 +14,20 @@ class vLLMService:
     def __init__(self):
         self.base_url = settings.VLLM_URL
         self.timeout = settings.VLLM_TIMEOUT
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Pooled HTTP client, created on first use and reused across requests."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def close(self):
+        """Close the pooled HTTP client (application shutdown)."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     async def generate(
         self,
@@ -28,19 +42,18 @@ class vLLMService:
         vLLM exposes OpenAI-compatible API.
         """
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/v1/completions",
-                    json={
-                        "prompt": prompt,
-                        "temperature": temperature,
-                        "max_tokens": max_tokens,
-                        "top_p": top_p,
-                        "stop": stop or [],
-                    }
-                )
-                response.raise_for_status()
-                return response.json()
+            response = await self.client.post(
+                f"{self.base_url}/v1/completions",
+                json={
+                    "prompt": prompt,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "top_p": top_p,
+                    "stop": stop or [],
+                }
+            )
+            response.raise_for_status()
+            return response.json()
         except Exception as e:
             logger.error(f"vLLM generation failed: {e}")
             raise
@@ -54,24 +67,25 @@ class vLLMService:
     ) -> AsyncGenerator[str, None]:
         """Stream generation from vLLM"""
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                async with client.stream(
-                    "POST",
-                    f"{self.base_url}/v1/completions",
-                    json={
-                        "prompt": prompt,
-                        "temperature": temperature,
-                        "max_tokens": max_tokens,
-                        "top_p": top_p,
-                        "stream": True,
-                    }
-                ) as response:
-                    response.raise_for_status()
-                    async for line in response.aiter_lines():
-                        if line.startswith("data: "):
-                            data = line[6:]  # Remove "data: " prefix
-                            if data != "[DONE]":
-                                yield data
+            async with self.client.stream(
+                "POST",
+                f"{self.base_url}/v1/completions",
+                json={
+                    "prompt": prompt,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "top_p": top_p,
+                    "stream": True,
+                    # Usage on the final chunk (always sent by older vLLM)
+                    "stream_options": {"include_usage": True},
+                }
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line.startswith("data: "):
+                        data = line[6:]  # Remove "data: " prefix
+                        if data != "[DONE]":
+                            yield data
         except Exception as e:
             logger.error(f"vLLM streaming failed: {e}")
             raise
@@ -79,9 +93,8 @@ class vLLMService:
     async def health_check(self) -> bool:
         """Check if vLLM service is healthy"""
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                response = await client.get(f"{self.base_url}/health")
-                return response.status_code == 200
+            response = await self.client.get(f"{self.base_url}/health", timeout=10)
+            return response.status_code == 200
         except Exception:
             return False
 
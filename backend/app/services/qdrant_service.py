@@ -12,6 +12,11 @@ from qdrant_client.models import (
     Filter,
     MatchValue,
     PointStruct,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
     VectorParams,
 )
 
@@ -57,6 +62,12 @@ class QdrantService:
                     vectors_config=VectorParams(
                         size=settings.QDRANT_VECTOR_SIZE,
                         distance=Distance.COSINE
+                    ),
+                    # Search on int8 vectors in RAM, rescore with the originals
+                    quantization_config=ScalarQuantization(
+                        scalar=ScalarQuantizationConfig(
+                            type=ScalarType.INT8, quantile=0.99, always_ram=True
+                        )
                     )
                 )
                 logger.info(f"Created Qdrant collection: {self.collection_name}")
@@ -226,6 +237,9 @@ class QdrantService:
                 query_filter=qdrant_filter,
                 limit=top_k,
                 score_threshold=score_threshold or settings.RAG_SIMILARITY_THRESHOLD,
+                search_params=SearchParams(
+                    quantization=QuantizationSearchParams(rescore=True)
+                ),
             )
             
             # Format results
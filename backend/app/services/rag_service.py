@@ -1,6 +1,11 @@
 """RAG Orchestration Service"""
+import asyncio
+import hashlib
+import json
+import os
 import time
-from typing import List, Dict, Any
+from typing import AsyncGenerator, List, Dict, Any, Optional, Tuple
+import orjson
 from app.services.qdrant_service import qdrant_service
 from app.services.llm_service import vllm_service
 from app.services.reranker_client import rerank_documents
@@ -11,26 +16,169 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+_SYS_PREFIX = """You are a helpful AI assistant for a biotech company. Answer the user's question based ONLY on the provided documents. If the answer cannot be found in the documents, say "I don't have enough information to answer that question."
+
+Context Documents:
+"""
+
+NO_DOCUMENTS_RESPONSE = (
+    "I couldn't find any relevant documents to answer your question. This might be due to "
+    "access restrictions or the information not being available in the system."
+)
+
+# Headroom for the question/answer scaffolding around the packed documents.
+_PROMPT_SCAFFOLD_TOKENS = 32
+# Share of the prompt budget held back for counting error. Small when counting
+# with the served model's own tokenizer, large when only approximating it.
+_EXACT_SLACK_RATIO = 0.02
+_APPROX_SLACK_RATIO = 0.15
+
+
+_CL100K_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+
+_tokenizer = None
+_encoding = None
+
+
+def _load_served_tokenizer() -> bool:
+    """Load the served model's tokenizer.json from LLM_TOKENIZER_PATH."""
+    global _tokenizer
+    path = settings.LLM_TOKENIZER_PATH
+    if not path:
+        return False
+    if os.path.isdir(path):
+        path = os.path.join(path, "tokenizer.json")
+    if not os.path.exists(path):
+        logger.warning(f"No tokenizer at {path}, approximating prompt token counts")
+        return False
+    try:
+        from tokenizers import Tokenizer
+        _tokenizer = Tokenizer.from_file(path)
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer {path} ({e}), approximating prompt token counts")
+        return False
+    logger.info(f"Counting prompt tokens with {path}")
+    return True
+
+
+def load_tokenizer() -> None:
+    """Load the prompt tokenizer (call once at startup).
+
+    Prefers the served model's own tokenizer from LLM_TOKENIZER_PATH so
+    counts match vLLM. Failing that, tiktoken is loaded from the bundled
+    cache: it downloads the BPE file when it is not cached, which hangs on
+    air-gapped hosts, so it is only used when TIKTOKEN_CACHE_DIR already
+    holds it. Otherwise count_tokens keeps the character-based estimate.
+    """
+    global _encoding
+    if _load_served_tokenizer():
+        return
+    cache_dir = settings.TIKTOKEN_CACHE_DIR
+    # tiktoken names cache entries by the SHA-1 of the blob URL
+    cached = os.path.join(cache_dir, hashlib.sha1(_CL100K_URL.encode()).hexdigest()) if cache_dir else ""
+    if not cached or not os.path.exists(cached):
+        logger.warning("No bundled tiktoken cache, using character-based token estimate")
+        return
+    os.environ["TIKTOKEN_CACHE_DIR"] = cache_dir
+    try:
+        import tiktoken
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable ({e}), using character-based token estimate")
+
+
+def _estimate_tokens(text: str) -> int:
+    """Conservative estimate: four ASCII characters per token, one per other character.
+
+    Llama-style vocabularies split Hangul and other non-Latin scripts into
+    one or more tokens per character, so chars/4 would undercount them.
+    """
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def count_tokens(text: str) -> int:
+    """Count (or conservatively approximate) the prompt tokens of text."""
+    if _tokenizer is not None:
+        return len(_tokenizer.encode(text, add_special_tokens=False).ids)
+    estimate = _estimate_tokens(text)
+    if _encoding is None:
+        return estimate
+    # cl100k_base is not the served model's vocabulary; never count below the estimate
+    return max(estimate, len(_encoding.encode(text, disallowed_special=())))
+
+
+def _prompt_slack_ratio() -> float:
+    """Share of the prompt budget to hold back for token counting error."""
+    return _EXACT_SLACK_RATIO if _tokenizer is not None else _APPROX_SLACK_RATIO
+
+
+def clamp_max_tokens(max_tokens: int) -> int:
+    """Cap the generation budget so the prompt keeps RAG_MIN_CONTEXT_TOKENS for context."""
+    return max(1, min(max_tokens, settings.VLLM_MAX_MODEL_LEN - settings.RAG_MIN_CONTEXT_TOKENS))
+
 
 class RAGService:
     """Orchestrate RAG pipeline: Retrieve + Rerank + Generate"""
 
-    def build_rag_prompt(self, query: str, context_documents: List[Dict[str, Any]]) -> str:
-        """Build prompt with retrieved context"""
-        context_str = "\n\n".join([
-            f"[Document {i+1}: {doc['filename']}]\n{doc['content']}"
-            for i, doc in enumerate(context_documents)
-        ])
+    def __init__(self):
+        # Identical in-flight requests (same query, RBAC scope and generation
+        # params) share one pipeline run. Entries are removed on completion.
+        self._inflight: Dict[str, asyncio.Future] = {}
 
-        prompt = f"""You are a helpful AI assistant for a biotech company. Answer the user's question based ONLY on the provided documents. If the answer cannot be found in the documents, say "I don't have enough information to answer that question."
+    @staticmethod
+    def _inflight_key(query: str, user_filter: dict, *params: Any) -> str:
+        """Build the coalescing key for a request within an RBAC scope."""
+        filter_repr = json.dumps(user_filter, sort_keys=True)
+        raw = "\x1f".join([query, filter_repr, *map(str, params)])
+        return hashlib.blake2s(raw.encode("utf-8")).hexdigest()
 
-Context Documents:
-{context_str}
+    def build_rag_prompt(
+        self,
+        query: str,
+        context_documents: List[Dict[str, Any]],
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """Build prompt with retrieved context.
+
+        Documents are packed greedily in rank order until the prompt would
+        exceed the vLLM context window minus the generation budget.
+        """
+        return self._pack_prompt(query, context_documents, max_tokens)[0]
+
+    def _pack_prompt(
+        self,
+        query: str,
+        context_documents: List[Dict[str, Any]],
+        max_tokens: Optional[int] = None,
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """Build the prompt and return it with the documents that fit in it."""
+        if max_tokens is None:
+            max_tokens = settings.LLM_MAX_TOKENS
+        budget = int((settings.VLLM_MAX_MODEL_LEN - clamp_max_tokens(max_tokens)) * (1 - _prompt_slack_ratio()))
+        used = count_tokens(_SYS_PREFIX) + count_tokens(query) + _PROMPT_SCAFFOLD_TOKENS
+
+        sections = []
+        for i, doc in enumerate(context_documents):
+            section = f"[Document {i+1}: {doc['filename']}]\n{doc['content']}"
+            doc_tokens = count_tokens(section)
+            if used + doc_tokens > budget:
+                break
+            used += doc_tokens
+            sections.append(section)
+
+        dropped = len(context_documents) - len(sections)
+        if dropped:
+            logger.info(f"Prompt token budget ({budget}) reached; dropped {dropped} context documents")
+
+        context_str = "\n\n".join(sections)
+
+        prompt = f"""{_SYS_PREFIX}{context_str}
 
 User Question: {query}
 
 Answer:"""
-        return prompt
+        return prompt, context_documents[:len(sections)]
 
     async def generate_answer(
         self,
@@ -47,40 +195,98 @@ Answer:"""
         3. Rerank documents using BGE Reranker
         4. Build prompt with top_k reranked context
         5. Generate answer with vLLM
+
+        Concurrent calls with the same query, RBAC scope and generation
+        parameters are coalesced onto a single pipeline execution.
         """
-        start_time = time.time()
+        # Step 1: Build RBAC filter
+        user_filter = build_qdrant_filter(user)
+        max_tokens = clamp_max_tokens(max_tokens)
+        key = self._inflight_key(query, user_filter, top_k, temperature, max_tokens)
 
-        try:
-            # Step 1: Build RBAC filter
-            user_filter = build_qdrant_filter(user)
+        pending = self._inflight.get(key)
+        if pending is None:
             logger.info(f"User {user.usr_name} (dept={user.dept_id}/role={user.role_id}) querying: {query[:100]}...")
-
-            # Step 2: Retrieve candidate documents (fetch more for reranking)
-            retrieval_k = top_k * 4
-            retrieved_docs = await qdrant_service.search_with_filter(
-                query=query,
-                user_filter=user_filter,
-                top_k=retrieval_k
+            pending = asyncio.ensure_future(
+                self._run_pipeline(query, user_filter, top_k, temperature, max_tokens)
             )
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+            # Mark the exception retrieved in case every caller was cancelled
+            pending.add_done_callback(lambda f: f.cancelled() or f.exception())
+        else:
+            logger.info(f"User {user.usr_name} joined in-flight request for: {query[:100]}...")
 
-            if not retrieved_docs:
+        # Shield so a disconnecting caller does not cancel the shared run.
+        return await asyncio.shield(pending)
+
+    async def _retrieve_context(
+        self,
+        query: str,
+        user_filter: dict,
+        top_k: int,
+    ) -> List[Dict[str, Any]]:
+        """Retrieve candidates from Qdrant (top_k * 4) and rerank down to top_k."""
+        # Step 2: Retrieve candidate documents (fetch more for reranking)
+        retrieval_k = top_k * 4
+        retrieved_docs = await qdrant_service.search_with_filter(
+            query=query,
+            user_filter=user_filter,
+            top_k=retrieval_k
+        )
+
+        if not retrieved_docs:
+            return []
+
+        # Step 3: Rerank documents (graceful fallback if reranker unavailable)
+        return await rerank_documents(
+            query=query,
+            documents=retrieved_docs,
+            reranker_url=settings.RERANKER_URL,
+            top_k=top_k,
+        )
+
+    @staticmethod
+    def _format_retrieved_documents(reranked_docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Shape reranked docs for the API response (after the prompt is built)."""
+        return [
+            {
+                "document_id": doc["document_id"],
+                "filename": doc["filename"],
+                "score": doc["score"],
+                "rerank_score": doc.get("rerank_score"),
+                # Prompt is already built; drop the full text so only the
+                # truncated preview stays alive in the response.
+                "content": doc.pop("content", "")[:500],
+                "metadata": doc["metadata"]
+            }
+            for doc in reranked_docs
+        ]
+
+    async def _run_pipeline(
+        self,
+        query: str,
+        user_filter: dict,
+        top_k: int,
+        temperature: float,
+        max_tokens: int,
+    ) -> Dict[str, Any]:
+        """Run retrieve -> rerank -> generate for an already-scoped request."""
+        start_time = time.time()
+
+        try:
+            reranked_docs = await self._retrieve_context(query, user_filter, top_k)
+
+            if not reranked_docs:
                 return {
-                    "response": "I couldn't find any relevant documents to answer your question. This might be due to access restrictions or the information not being available in the system.",
+                    "response": NO_DOCUMENTS_RESPONSE,
                     "retrieved_documents": [],
                     "token_count": 0,
                     "latency_ms": int((time.time() - start_time) * 1000)
                 }
 
-            # Step 3: Rerank documents (graceful fallback if reranker unavailable)
-            reranked_docs = await rerank_documents(
-                query=query,
-                documents=retrieved_docs,
-                reranker_url=settings.RERANKER_URL,
-                top_k=top_k,
-            )
-
-            # Step 4: Build prompt
-            prompt = self.build_rag_prompt(query, reranked_docs)
+            # Step 4: Build prompt; only the documents that fit are reported
+            prompt, packed_docs = self._pack_prompt(query, reranked_docs, max_tokens=max_tokens)
 
             # Step 5: Generate answer
             llm_response = await vllm_service.generate(
@@ -97,17 +303,7 @@ Answer:"""
 
             return {
                 "response": answer,
-                "retrieved_documents": [
-                    {
-                        "document_id": doc["document_id"],
-                        "filename": doc["filename"],
-                        "score": doc["score"],
-                        "rerank_score": doc.get("rerank_score"),
-                        "content": doc["content"][:500],
-                        "metadata": doc["metadata"]
-                    }
-                    for doc in reranked_docs
-                ],
+                "retrieved_documents": self._format_retrieved_documents(packed_docs),
                 "token_count": token_count,
                 "latency_ms": latency_ms
             }
@@ -116,6 +312,59 @@ Answer:"""
             logger.error(f"RAG generation failed: {e}")
             raise
 
+    async def stream_answer(
+        self,
+        query: str,
+        user: User,
+        top_k: int = 5,
+        temperature: float = 0.7,
+        max_tokens: int = 1024
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Stream a RAG answer as events.
+
+        Yields {"token": str} for each generated chunk from vLLM, followed by a
+        final {"done": True, "retrieved_documents", "token_count", "latency_ms"}
+        event. token_count is vLLM's reported total_tokens, as for
+        generate_answer. Streaming requests are not coalesced.
+        """
+        start_time = time.time()
+        user_filter = build_qdrant_filter(user)
+        max_tokens = clamp_max_tokens(max_tokens)
+        logger.info(f"User {user.usr_name} (dept={user.dept_id}/role={user.role_id}) streaming: {query[:100]}...")
+
+        try:
+            reranked_docs = await self._retrieve_context(query, user_filter, top_k)
+
+            token_count = 0
+            packed_docs: List[Dict[str, Any]] = []
+            if not reranked_docs:
+                yield {"token": NO_DOCUMENTS_RESPONSE}
+            else:
+                prompt, packed_docs = self._pack_prompt(query, reranked_docs, max_tokens=max_tokens)
+                async for data in vllm_service.generate_stream(
+                    prompt=prompt,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                ):
+                    chunk = orjson.loads(data)
+                    if chunk.get("usage"):
+                        token_count = chunk["usage"]["total_tokens"]
+                    choices = chunk.get("choices") or []
+                    if choices and choices[0].get("text"):
+                        yield {"token": choices[0]["text"]}
+
+            yield {
+                "done": True,
+                "retrieved_documents": self._format_retrieved_documents(packed_docs),
+                "token_count": token_count,
+                "latency_ms": int((time.time() - start_time) * 1000),
+            }
+
+        except Exception as e:
+            logger.error(f"RAG streaming failed: {e}")
+            raise
+
 
 # Singleton instance
 rag_service = RAGService()
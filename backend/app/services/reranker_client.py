@@ -5,11 +5,38 @@ by relevance. Includes graceful fallback if the reranker is unavailable.
 """
 import httpx
 import logging
-from typing import List, Dict, Any
+import orjson
+from typing import List, Dict, Any, Optional
+
+try:
+    import zstandard
+    _zstd_compressor = zstandard.ZstdCompressor(level=3)
+except ImportError:  # pragma: no cover - optional dependency
+    _zstd_compressor = None
 
 logger = logging.getLogger(__name__)
 
 RERANKER_TIMEOUT = 60.0
+# Request bodies above this size are sent zstd-compressed
+RERANKER_COMPRESS_MIN_BYTES = 16_384
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Create and cache the pooled HTTP client used for reranker calls."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=RERANKER_TIMEOUT)
+    return _client
+
+
+async def close_client() -> None:
+    """Close the pooled reranker client (application shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
 
 async def rerank_documents(
@@ -27,7 +54,7 @@ async def rerank_documents(
         top_k: Number of top results to return.
 
     Returns:
-        Reranked list of document dicts with 'rerank_score' added.
+        Reranked list of document dicts with 'rerank_score' added in place.
         Falls back to original order (truncated to top_k) if reranker is unavailable.
     """
     if not documents:
@@ -36,24 +63,31 @@ async def rerank_documents(
     try:
         doc_texts = [doc.get("content", "") for doc in documents]
 
-        async with httpx.AsyncClient(timeout=RERANKER_TIMEOUT) as client:
-            response = await client.post(
-                f"{reranker_url}/rerank",
-                json={
-                    "query": query,
-                    "documents": doc_texts,
-                    "top_k": top_k,
-                },
-            )
-            response.raise_for_status()
-            result = response.json()
-
-        # Map reranker output back to original documents
+        body = orjson.dumps({
+            "query": query,
+            "documents": doc_texts,
+            "top_k": top_k,
+        })
+        headers = {"content-type": "application/json"}
+        if _zstd_compressor is not None and len(body) > RERANKER_COMPRESS_MIN_BYTES:
+            body = _zstd_compressor.compress(body)
+            headers["content-encoding"] = "zstd"
+
+        response = await get_client().post(
+            f"{reranker_url}/rerank",
+            content=body,
+            headers=headers,
+        )
+        response.raise_for_status()
+        result = response.json()
+
+        # Map reranker output back to original documents. The input list is
+        # discarded by callers, so annotate the dicts in place instead of copying.
         reranked = []
         for item in result["results"]:
             idx = item["index"]
             if idx < len(documents):
-                doc = documents[idx].copy()
+                doc = documents[idx]
                 doc["rerank_score"] = item["relevance_score"]
                 reranked.append(doc)
 
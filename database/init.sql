@@ -166,6 +166,7 @@ CREATE TABLE IF NOT EXISTS document (
     type VARCHAR(50) NOT NULL,              -- 'pdf', 'docx', 'xlsx', 'pptx', 'tif', 'png', 'jpg'
     hash VARCHAR(64) UNIQUE NOT NULL,       -- SHA-256 for duplicate detection
     size BIGINT,
+    mtime_ns BIGINT,                        -- st_mtime_ns at last sync (NAS sync stat fast path)
     dept_id INTEGER NOT NULL REFERENCES department(dept_id) ON DELETE RESTRICT,
     role_id INTEGER NOT NULL REFERENCES roles(role_id) ON DELETE RESTRICT,
     total_page_cnt INTEGER DEFAULT 0,
@@ -199,6 +200,7 @@ CREATE TABLE IF NOT EXISTS doc_chunk (
 );
 
 CREATE INDEX idx_doc_chunk_doc ON doc_chunk(doc_id, chunk_idx);
+CREATE INDEX idx_doc_chunk_doc_qdrant ON doc_chunk(doc_id) INCLUDE (qdrant_id);
 CREATE INDEX idx_doc_chunk_qdrant ON doc_chunk(qdrant_id);
 
 -- =============================================================================
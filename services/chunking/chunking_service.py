@@ -53,6 +53,8 @@ class ChunkResponse(BaseModel):
     chunk_count: int
     avg_chunk_length: float
     total_chars: int
+    # Whitespace-delimited word count per chunk (doc_chunk.token_cnt)
+    token_counts: List[int] = []
 
 
 # =============================================================================
@@ -193,7 +195,8 @@ async def chunk_endpoint(request: ChunkRequest):
             method=request.method,
             chunk_count=len(chunks),
             avg_chunk_length=avg_length,
-            total_chars=len(request.text)
+            total_chars=len(request.text),
+            token_counts=[len(c.split()) for c in chunks],
         )
 
     except Exception as e:
@@ -250,4 +253,15 @@ async def test_chunking():
 
 if __name__ == "__main__":
     port = int(os.getenv("CHUNKING_SERVICE_PORT", str(settings.SERVICE_PORT)))
-    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=port,
+        log_level="info",
+        loop="uvloop",
+        http="httptools",
+        # Outlive the clients' 60s keep-alive so pooled connections are reused
+        timeout_keep_alive=75,
+        # Per-request access lines only when debugging
+        access_log=settings.LOG_LEVEL == "DEBUG",
+    )
@@ -5,18 +5,41 @@ Model: intfloat/multilingual-e5-large (1024 dimensions)
 Port: 8002
 """
 import os
-from typing import List, Union
+import asyncio
+import base64
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Union
 
 import uvicorn
 import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
-from fastapi import HTTPException
+from fastapi import HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 
 from shared.logging import setup_logging
-from shared.device import get_device, is_gpu_available
+from shared.device import (
+    get_device,
+    is_gpu_available,
+    compile_model,
+    configure_cpu_threads,
+    get_onnx_provider,
+    get_onnx_session_options,
+)
 from shared.config import GPUServiceSettings
-from shared.fastapi_utils import create_service_app, add_health_endpoint, add_root_endpoint
+from shared.batching import AsyncBatcher
+from shared.fastapi_utils import (
+    create_service_app,
+    add_health_endpoint,
+    add_readiness_endpoint,
+    add_root_endpoint,
+)
 
 # =============================================================================
 # Configuration
@@ -28,6 +51,11 @@ class EmbeddingSettings(GPUServiceSettings):
     SERVICE_PORT: int = 8002
     EMBEDDING_MODEL: str = "intfloat/multilingual-e5-large"
     EMBEDDING_MODEL_PATH: str = ""
+    EMBEDDING_BACKEND: str = "torch"  # "torch" or "onnx"
+    EMBEDDING_MAX_LENGTH: int = 512
+    EMBEDDING_QUANTIZE: str = ""  # "int8" = dynamic INT8 Linear layers (CPU only)
+    EMBEDDING_CACHE_SIZE: int = 100_000  # 0 disables the embedding cache
+    EMBEDDING_CACHE_PATH: str = ""  # memmap file to persist the cache across restarts
 
 
 settings = EmbeddingSettings()
@@ -38,6 +66,90 @@ logger = setup_logging(settings.SERVICE_NAME, level=settings.LOG_LEVEL)
 # =============================================================================
 
 _model = None
+_model_lock = threading.Lock()
+_ready = False
+
+# All model work runs here, off the event loop. One worker: the GPU is the
+# bottleneck, so extra threads only contend while tokenization/IO of other
+# requests overlaps on the loop.
+INFERENCE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+
+def _enable_fused_attention(model: SentenceTransformer) -> None:
+    """Swap the HF encoder to BetterTransformer (fused SDPA attention) if supported."""
+    module = model._first_module()
+    try:
+        module.auto_model = module.auto_model.to_bettertransformer()
+        logger.info("BetterTransformer fused attention enabled")
+    except Exception as e:
+        logger.warning(f"BetterTransformer unavailable, using default attention: {e}")
+
+
+class ORTEmbeddingModel:
+    """E5 encoder served by ONNX Runtime.
+
+    Exposes the subset of the SentenceTransformer interface used by this
+    service: tokenizer -> ORT session -> mean pooling -> optional L2 norm.
+    """
+
+    def __init__(self, model_path: str, max_length: int = 512):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_path,
+            export=True,
+            provider=get_onnx_provider(),
+            session_options=get_onnx_session_options(settings.CPU_THREADS),
+        )
+        self.max_length = max_length
+        self._dimension = self.model.config.hidden_size
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dimension
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        normalize_embeddings: bool = False,
+        convert_to_tensor: bool = False,
+        **kwargs,
+    ):
+        if isinstance(sentences, str):
+            sentences = [sentences]
+
+        # Length-sorted batches, like SentenceTransformer.encode()
+        order = np.argsort([-len(s) for s in sentences])
+        out = np.empty((len(sentences), self._dimension), dtype=np.float32)
+        for start in range(0, len(sentences), batch_size):
+            idx = order[start:start + batch_size]
+            inputs = self.tokenizer(
+                [sentences[i] for i in idx],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            hidden = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            out[idx] = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if normalize_embeddings:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        if convert_to_tensor:
+            return torch.from_numpy(out)
+        return out
+
+
+def _quantize_int8(model: SentenceTransformer) -> None:
+    """Dynamically quantize the encoder's Linear layers to INT8 (CPU inference)."""
+    module = model._first_module()
+    module.auto_model = torch.quantization.quantize_dynamic(
+        module.auto_model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    logger.info("E5 Linear layers quantized to INT8 (dynamic)")
 
 
 def load_model():
@@ -45,17 +157,215 @@ def load_model():
     global _model
 
     if _model is None:
-        model_path = settings.EMBEDDING_MODEL_PATH or settings.EMBEDDING_MODEL
-        logger.info(f"Loading E5 model from {model_path}...")
+        with _model_lock:
+            if _model is None:
+                model_path = settings.EMBEDDING_MODEL_PATH or settings.EMBEDDING_MODEL
+                logger.info(f"Loading E5 model from {model_path}...")
+
+                try:
+                    if settings.EMBEDDING_BACKEND == "onnx":
+                        model = ORTEmbeddingModel(model_path, max_length=settings.EMBEDDING_MAX_LENGTH)
+                        logger.info(f"E5 model exported to ONNX Runtime ({get_onnx_provider()})")
+                    else:
+                        model = SentenceTransformer(model_path, device=get_device())
+                        model.eval()
+                        if settings.EMBEDDING_QUANTIZE == "int8" and get_device() == "cpu":
+                            # Quantized Linear layers replace the fused-attention path
+                            _quantize_int8(model)
+                        elif settings.TORCH_COMPILE and get_device() == "cuda":
+                            # Inductor fuses layernorm/GELU/matmul chains around
+                            # native SDPA; BetterTransformer's fastpath doesn't trace
+                            module = model._first_module()
+                            module.auto_model = compile_model(module.auto_model)
+                        else:
+                            _enable_fused_attention(model)
+                    # Publish only the fully prepared model to other threads
+                    _model = model
+                    logger.info(f"E5 model loaded (dimension: {_model.get_sentence_embedding_dimension()})")
+                except Exception as e:
+                    logger.error(f"Failed to load E5 model: {e}")
+                    raise
+
+    return _model
+
+
+def warmup():
+    """Load the model and run one forward pass so CUDA kernels are loaded
+    before real traffic; marks the service ready."""
+    global _ready
+    model = load_model()
+    with torch.inference_mode():
+        model.encode(["warmup"] * 8, batch_size=8, show_progress_bar=False)
+    _ready = True
+    logger.info("E5 model warmed up")
+
 
+def _estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars/token) used to cap coalesced batches."""
+    return min(len(text) // 4 + 2, settings.EMBEDDING_MAX_LENGTH)
+
+
+def _encode_batch(texts: List[str], normalize: bool) -> np.ndarray:
+    """Encode a coalesced batch of texts (runs in a worker thread)."""
+    model = load_model()
+    # encode() sorts list inputs by length before batching (smart batching),
+    # so each mini-batch pads to similar lengths; keep the numpy path.
+    with torch.inference_mode():
+        return model.encode(
+            texts,
+            batch_size=settings.BATCH_MAX_SIZE,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            convert_to_tensor=False,
+            normalize_embeddings=normalize
+        )
+
+
+# Concurrent /embed requests are coalesced into shared encode() calls; one
+# batcher per normalize flag so merged requests share encode options.
+_batchers = {
+    normalize: AsyncBatcher(
+        functools.partial(_encode_batch, normalize=normalize),
+        max_batch=settings.BATCH_MAX_SIZE,
+        max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+        max_cost=settings.BATCH_MAX_TOKENS,
+        cost_fn=_estimate_tokens,
+        executor=INFERENCE_POOL,
+    )
+    for normalize in (True, False)
+}
+
+
+class EmbeddingCache:
+    """Exact-match LRU cache of embeddings keyed by BLAKE2b(text).
+
+    Vectors live in one preallocated (maxsize, dim) float32 array, a
+    numpy.memmap when `path` is set so the cache survives restarts (the key
+    index is written next to it on save(), with the size, dim and model it
+    was built for; a saved cache that doesn't match is discarded). The index
+    is removed once loaded, so after a crash the vectors are not trusted.
+    Only touched from the event loop.
+    """
+
+    def __init__(self, maxsize: int, path: str = "", model: str = ""):
+        self.maxsize = maxsize
+        self.path = path
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+        self._index: "OrderedDict[bytes, int]" = OrderedDict()
+        self._free: List[int] = []
+        self._vectors: Optional[np.ndarray] = None
+        if path:
+            saved = self._load_index()
+            if saved is not None:
+                self._allocate(int(saved["dim"]), saved)
+
+    @staticmethod
+    def key(text: str, normalize: bool) -> bytes:
+        return hashlib.blake2b(
+            text.encode("utf-8"), digest_size=16, person=b"norm" if normalize else b"raw"
+        ).digest()
+
+    def _allocate(self, dim: int, saved=None) -> None:
+        if not self.path:
+            self._vectors = np.empty((self.maxsize, dim), dtype=np.float32)
+            self._free = list(range(self.maxsize - 1, -1, -1))
+            return
+
+        self._vectors = np.memmap(
+            self.path, dtype=np.float32, mode="r+" if saved is not None else "w+",
+            shape=(self.maxsize, dim),
+        )
+        used = set()
+        if saved is not None:
+            for key, slot in zip(saved["keys"], saved["slots"].tolist()):
+                self._index[key.tobytes()] = slot
+                used.add(slot)
+            saved.close()
+            # Slots are overwritten in place from here on; only save() on a
+            # clean shutdown writes an index that matches the file again
+            os.remove(f"{self.path}.idx.npz")
+            logger.info(f"Loaded {len(self._index)} cached embeddings from {self.path}")
+        self._free = [slot for slot in range(self.maxsize - 1, -1, -1) if slot not in used]
+
+    def _load_index(self):
+        """Saved key index if the file on disk was built for this cache, else None."""
+        index_path = f"{self.path}.idx.npz"
+        if not (os.path.exists(self.path) and os.path.exists(index_path)):
+            return None
         try:
-            _model = SentenceTransformer(model_path, device=get_device())
-            logger.info(f"E5 model loaded (dimension: {_model.get_sentence_embedding_dimension()})")
+            saved = np.load(index_path)
+            meta = (int(saved["maxsize"]), int(saved["dim"]), str(saved["model"]))
         except Exception as e:
-            logger.error(f"Failed to load E5 model: {e}")
-            raise
+            logger.warning(f"Discarding unreadable embedding cache index {index_path}: {e}")
+            return None
+        maxsize, dim, model = meta
+        if (maxsize, model) != (self.maxsize, self.model) or os.path.getsize(self.path) != maxsize * dim * 4:
+            logger.info(
+                f"Discarding embedding cache {self.path}: built for size={maxsize} model={model!r}, "
+                f"now size={self.maxsize} model={self.model!r}"
+            )
+            return None
+        return saved
+
+    def get_many(self, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        found = []
+        for key in keys:
+            slot = self._index.get(key)
+            if slot is None:
+                self.misses += 1
+                found.append(None)
+            else:
+                self.hits += 1
+                self._index.move_to_end(key)
+                # Copy: the slot may be evicted and reused before the caller is done
+                found.append(self._vectors[slot].copy())
+        return found
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        if self._vectors is None:
+            self._allocate(vectors.shape[1])
+        for key, vector in zip(keys, vectors):
+            slot = self._index.get(key)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    _, slot = self._index.popitem(last=False)
+            self._vectors[slot] = vector
+            self._index[key] = slot
+
+    def save(self) -> None:
+        """Flush the memmap and write the key index (no-op when in-memory)."""
+        if not self.path or self._vectors is None:
+            return
+        self._vectors.flush()
+        np.savez(
+            f"{self.path}.idx.npz",
+            keys=np.frombuffer(b"".join(self._index.keys()), dtype=np.uint8).reshape(-1, 16),
+            slots=np.array(list(self._index.values()), dtype=np.int64),
+            dim=self._vectors.shape[1],
+            maxsize=self.maxsize,
+            model=self.model,
+        )
+        logger.info(f"Saved {len(self._index)} cached embeddings to {self.path}")
 
-    return _model
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._index),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+_cache = EmbeddingCache(
+    settings.EMBEDDING_CACHE_SIZE,
+    settings.EMBEDDING_CACHE_PATH,
+    model=settings.EMBEDDING_MODEL_PATH or settings.EMBEDDING_MODEL,
+) if settings.EMBEDDING_CACHE_SIZE > 0 else None
 
 
 # =============================================================================
@@ -66,7 +376,10 @@ def load_model():
 class EmbedRequest(BaseModel):
     texts: Union[str, List[str]] = Field(..., description="Text or list of texts to embed")
     normalize: bool = Field(True, description="Normalize embeddings to unit vectors")
-    batch_size: int = Field(32, ge=1, le=128, description="Batch size for processing")
+    batch_size: int = Field(
+        32, ge=1, le=128,
+        description="Deprecated: requests are batched server-side (BATCH_MAX_SIZE)",
+    )
 
 
 class EmbedResponse(BaseModel):
@@ -80,10 +393,36 @@ class EmbedResponse(BaseModel):
 # FastAPI Application
 # =============================================================================
 
+@asynccontextmanager
+async def lifespan(app):
+    """Start batchers and background warmup; on shutdown stop them, persist
+    the embedding cache and release the inference pool."""
+    async def _warmup():
+        try:
+            await asyncio.get_running_loop().run_in_executor(INFERENCE_POOL, warmup)
+        except Exception as e:
+            logger.error(f"Warmup failed, model will load on first request: {e}")
+
+    for batcher in _batchers.values():
+        batcher.start()
+    # /ready reports 503 until the background warmup finishes
+    warmup_task = asyncio.create_task(_warmup())
+    yield
+    warmup_task.cancel()
+    for batcher in _batchers.values():
+        await batcher.stop()
+    if _cache is not None:
+        _cache.save()
+    INFERENCE_POOL.shutdown(wait=False)
+
+
 app = create_service_app(
     title="E5 Embedding Service",
     description="Standalone embedding service using E5 multilingual model",
     version="1.0.0",
+    lifespan=lifespan,
+    # JSON float lists compress ~3x; small responses are left alone
+    gzip_minimum_size=16 * 1024,
 )
 
 
@@ -95,10 +434,12 @@ def _health_check():
         "device": get_device(),
         "gpu_available": is_gpu_available(),
         "dimension": _model.get_sentence_embedding_dimension() if _model else None,
+        "cache": _cache.stats() if _cache else None,
     }
 
 
 add_health_endpoint(app, _health_check)
+add_readiness_endpoint(app, lambda: _ready)
 add_root_endpoint(app, {
     "service": settings.SERVICE_NAME,
     "model": settings.EMBEDDING_MODEL,
@@ -107,34 +448,87 @@ add_root_endpoint(app, {
 })
 
 
-@app.post("/embed", response_model=EmbedResponse)
-async def embed_endpoint(request: EmbedRequest):
-    """Generate embeddings for provided texts."""
-    try:
-        model = load_model()
+async def _embed(request: EmbedRequest) -> np.ndarray:
+    """Embed the request's texts through the shared batcher."""
+    texts = [request.texts] if isinstance(request.texts, str) else request.texts
 
-        texts = [request.texts] if isinstance(request.texts, str) else request.texts
+    if not texts:
+        raise HTTPException(status_code=400, detail="No texts provided")
 
-        if not texts:
-            raise HTTPException(status_code=400, detail="No texts provided")
+    if _cache is None:
+        logger.info(f"Embedding {len(texts)} texts")
+        return np.asarray(await _batchers[request.normalize].submit(texts))
 
-        logger.info(f"Embedding {len(texts)} texts (batch_size={request.batch_size})")
+    # Encode only cache misses, then splice them back in request order
+    keys = [EmbeddingCache.key(text, request.normalize) for text in texts]
+    cached = _cache.get_many(keys)
+    miss_idx = [i for i, vector in enumerate(cached) if vector is None]
+    logger.info(f"Embedding {len(texts)} texts ({len(texts) - len(miss_idx)} cached)")
 
-        embeddings = model.encode(
-            texts,
-            batch_size=request.batch_size,
-            show_progress_bar=False,
-            convert_to_tensor=False,
-            normalize_embeddings=request.normalize
-        )
+    if not miss_idx:
+        return np.stack(cached)
 
-        if isinstance(embeddings, np.ndarray):
-            embeddings = embeddings.tolist()
+    encoded = np.asarray(await _batchers[request.normalize].submit([texts[i] for i in miss_idx]))
+    _cache.put_many([keys[i] for i in miss_idx], encoded)
+
+    embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+    for i, vector in enumerate(cached):
+        if vector is not None:
+            embeddings[i] = vector
+    embeddings[miss_idx] = encoded
+    return embeddings
+
+
+def _binary_response(embeddings: np.ndarray) -> Response:
+    """Raw little-endian float16 matrix; clients rebuild it with
+    np.frombuffer(content, dtype="<f2").reshape(n, d)."""
+    n, d = embeddings.shape
+    return Response(
+        content=embeddings.astype("<f2").tobytes(),
+        media_type="application/octet-stream",
+        headers={"X-Shape": f"{n},{d}", "X-Dtype": "float16", "X-Model": settings.EMBEDDING_MODEL},
+    )
+
+
+def _b64_response(embeddings: np.ndarray) -> dict:
+    """JSON envelope around base64-encoded little-endian float16 bytes;
+    clients rebuild the matrix with np.frombuffer(...).reshape(shape)."""
+    arr = embeddings.astype("<f2")
+    return {
+        "shape": list(arr.shape),
+        "dtype": "float16",
+        "data": base64.b64encode(arr.tobytes()).decode("ascii"),
+        "model": settings.EMBEDDING_MODEL,
+        "dimension": arr.shape[1],
+        "count": arr.shape[0],
+    }
+
+
+@app.post("/embed", response_model=EmbedResponse)
+async def embed_endpoint(
+    request: EmbedRequest,
+    http_request: Request,
+    format: str = Query("json", pattern="^(json|b64_f16)$"),
+):
+    """Generate embeddings for provided texts.
+
+    `format=b64_f16` returns base64 float16 data instead of float lists.
+    Send `Accept: application/octet-stream` to get the /embed_bin binary
+    response instead of JSON.
+    """
+    try:
+        embeddings = await _embed(request)
+
+        if "application/octet-stream" in http_request.headers.get("accept", ""):
+            return _binary_response(embeddings)
+
+        if format == "b64_f16":
+            return ORJSONResponse(_b64_response(embeddings))
 
         return EmbedResponse(
-            embeddings=embeddings,
+            embeddings=embeddings.tolist(),
             model=settings.EMBEDDING_MODEL,
-            dimension=model.get_sentence_embedding_dimension(),
+            dimension=embeddings.shape[1],
             count=len(embeddings)
         )
 
@@ -143,24 +537,28 @@ async def embed_endpoint(request: EmbedRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/similarity")
-async def similarity_endpoint(text1: str, text2: str):
-    """Calculate cosine similarity between two texts."""
-    import torch
+@app.post("/embed_bin")
+async def embed_bin_endpoint(request: EmbedRequest):
+    """Generate embeddings as raw float16 bytes (shape in X-Shape header).
 
+    Skips the per-float JSON encoding of /embed, which dominates response
+    time and size for large batches.
+    """
     try:
-        model = load_model()
+        return _binary_response(await _embed(request))
 
-        embeddings = model.encode(
-            [text1, text2],
-            normalize_embeddings=True,
-            convert_to_tensor=True
-        )
+    except Exception as e:
+        logger.error(f"Embedding failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        similarity = torch.nn.functional.cosine_similarity(
-            embeddings[0].unsqueeze(0),
-            embeddings[1].unsqueeze(0)
-        ).item()
+
+@app.post("/similarity")
+async def similarity_endpoint(text1: str, text2: str):
+    """Calculate cosine similarity between two texts."""
+    try:
+        # Normalized embeddings are unit-norm, so cosine similarity is the dot product
+        a, b = await _batchers[True].submit([text1, text2])
+        similarity = np.dot(a, b)
 
         return {
             "text1": text1[:100] + "..." if len(text1) > 100 else text1,
@@ -184,19 +582,15 @@ async def test_embed():
             "这是中文测试句子。"
         ]
 
-        model = load_model()
-        embeddings = model.encode(
-            test_texts,
-            normalize_embeddings=True,
-            convert_to_tensor=False
-        )
+        # One batch through the same path as /embed
+        embeddings = np.asarray(await _batchers[True].submit(test_texts))
 
         return {
             "status": "success",
             "test_texts": test_texts,
-            "embedding_shape": embeddings.shape if hasattr(embeddings, 'shape') else (len(embeddings), len(embeddings[0])),
-            "dimension": model.get_sentence_embedding_dimension(),
-            "sample_embedding_first_10": embeddings[0][:10].tolist() if hasattr(embeddings[0], 'tolist') else embeddings[0][:10],
+            "embedding_shape": list(embeddings.shape),
+            "dimension": embeddings.shape[1],
+            "sample_embedding_first_10": embeddings[0][:10].tolist(),
             "device": get_device(),
         }
 
@@ -210,5 +604,19 @@ async def test_embed():
 # =============================================================================
 
 if __name__ == "__main__":
+    if get_device() == "cpu":
+        # Single uvicorn worker: torch already uses all CPU_THREADS
+        configure_cpu_threads(settings.CPU_THREADS)
     port = int(os.getenv("EMBEDDING_SERVICE_PORT", str(settings.SERVICE_PORT)))
-    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=port,
+        log_level="info",
+        loop="uvloop",
+        http="httptools",
+        # Outlive the clients' 60s keep-alive so pooled connections are reused
+        timeout_keep_alive=75,
+        # Per-request access lines only when debugging
+        access_log=settings.LOG_LEVEL == "DEBUG",
+    )
@@ -6,16 +6,41 @@ Port: 8004
 Role: Rerank retrieved documents by relevance score for improved RAG accuracy.
 """
 import os
+
+# Let the Rust tokenizer parallelize batch encoding; must be set before
+# transformers/tokenizers are imported.
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "true")
+
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 
+import msgspec
 import uvicorn
-from fastapi import HTTPException
+from fastapi import HTTPException, Request, Response
 from pydantic import BaseModel, Field
 
 from shared.logging import setup_logging
-from shared.device import get_device, get_torch_dtype, is_gpu_available
+from shared.device import (
+    get_device,
+    get_torch_dtype,
+    is_gpu_available,
+    compile_model,
+    configure_cpu_threads,
+    get_onnx_provider,
+    get_onnx_session_options,
+)
 from shared.config import GPUServiceSettings
-from shared.fastapi_utils import create_service_app, add_health_endpoint, add_root_endpoint
+from shared.batching import AsyncBatcher
+from shared.fastapi_utils import (
+    create_service_app,
+    add_health_endpoint,
+    add_readiness_endpoint,
+    add_root_endpoint,
+    ZstdRequestMiddleware,
+)
 
 # =============================================================================
 # Configuration
@@ -27,6 +52,9 @@ class RerankerSettings(GPUServiceSettings):
     SERVICE_PORT: int = 8004
     RERANKER_MODEL: str = "BAAI/bge-reranker-v2-m3"
     RERANKER_MODEL_PATH: str = ""
+    RERANKER_BACKEND: str = "torch"  # "torch", "onnx" or "flag" (FlagEmbedding)
+    RERANKER_ONNX_TENSORRT: bool = False  # onnx on CUDA: TensorRT EP with fp16 engines
+    RERANKER_TRT_CACHE_DIR: str = "/tmp/trt_cache"
     MAX_LENGTH: int = 512
 
 
@@ -39,28 +67,231 @@ logger = setup_logging(settings.SERVICE_NAME, level=settings.LOG_LEVEL)
 
 _model = None
 _tokenizer = None
+_model_lock = threading.Lock()
+_ready = False
+
+# All model work runs here, off the event loop. One worker: the GPU is the
+# bottleneck, so extra threads only contend.
+INFERENCE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
 
 
 def load_model():
     """Lazy load BGE reranker model and tokenizer."""
     global _model, _tokenizer
     if _model is None:
-        import torch
-        from transformers import AutoModelForSequenceClassification, AutoTokenizer
-
-        model_path = settings.RERANKER_MODEL_PATH or settings.RERANKER_MODEL
-        logger.info(f"Loading reranker model from {model_path}...")
-
-        _tokenizer = AutoTokenizer.from_pretrained(model_path)
-        _model = AutoModelForSequenceClassification.from_pretrained(
-            model_path,
-            torch_dtype=get_torch_dtype(),
-        ).to(get_device())
-        _model.eval()
-        logger.info(f"Reranker model loaded on {get_device()}")
+        with _model_lock:
+            if _model is None:
+                import torch
+                from transformers import (
+                    AutoModelForSequenceClassification,
+                    AutoTokenizer,
+                    PreTrainedTokenizerFast,
+                )
+
+                model_path = settings.RERANKER_MODEL_PATH or settings.RERANKER_MODEL
+                logger.info(f"Loading reranker model from {model_path}...")
+
+                _tokenizer = AutoTokenizer.from_pretrained(model_path, use_fast=True)
+                if not isinstance(_tokenizer, PreTrainedTokenizerFast):
+                    logger.warning("Fast tokenizer unavailable; tokenizing pairs in chunks across threads")
+                if settings.RERANKER_BACKEND == "flag":
+                    from FlagEmbedding import FlagReranker
+
+                    model = FlagReranker(model_path, use_fp16=get_device() == "cuda")
+                    logger.info("Reranker loaded with FlagEmbedding FlagReranker")
+                elif settings.RERANKER_BACKEND == "onnx":
+                    from optimum.onnxruntime import ORTModelForSequenceClassification
+
+                    provider, provider_options = get_onnx_provider(), None
+                    if settings.RERANKER_ONNX_TENSORRT and get_device() == "cuda":
+                        # fp16 TRT engines, cached on disk so restarts skip the build
+                        provider = "TensorrtExecutionProvider"
+                        provider_options = {
+                            "trt_fp16_enable": True,
+                            "trt_engine_cache_enable": True,
+                            "trt_engine_cache_path": settings.RERANKER_TRT_CACHE_DIR,
+                        }
+                    model = ORTModelForSequenceClassification.from_pretrained(
+                        model_path,
+                        export=True,
+                        provider=provider,
+                        provider_options=provider_options,
+                        session_options=get_onnx_session_options(settings.CPU_THREADS),
+                    )
+                    logger.info(f"Reranker exported to ONNX Runtime ({provider})")
+                else:
+                    model = AutoModelForSequenceClassification.from_pretrained(
+                        model_path,
+                        torch_dtype=get_torch_dtype(),
+                    ).to(get_device())
+                    model.eval()
+                    if settings.TORCH_COMPILE and get_device() == "cuda":
+                        # Inductor fuses layernorm/GELU/matmul chains around
+                        # native SDPA; BetterTransformer's fastpath doesn't trace
+                        model = compile_model(model)
+                    else:
+                        try:
+                            # Fused SDPA attention kernels for the cross-encoder forward
+                            model = model.to_bettertransformer()
+                            logger.info("BetterTransformer fused attention enabled")
+                        except Exception as e:
+                            logger.warning(f"BetterTransformer unavailable, using default attention: {e}")
+                # Publish only the fully prepared model to other threads
+                _model = model
+                logger.info(f"Reranker model loaded on {get_device()}")
     return _model, _tokenizer
 
 
+def warmup():
+    """Load the model and run one dummy forward pass; marks the service ready."""
+    global _ready
+    model, tokenizer = load_model()
+    if settings.RERANKER_BACKEND == "flag":
+        model.compute_score([["warmup query", "warmup document"]])
+        _ready = True
+        logger.info("Reranker model warmed up")
+        return
+    with _inference_context():
+        # One pass per padding bucket so each compiled shape is ready
+        for bucket in sorted({_bucket_length(n) for n in (64, 128, 256, settings.MAX_LENGTH)}):
+            inputs = tokenizer(
+                [["warmup query", "warmup document"]],
+                padding="max_length", truncation=True,
+                max_length=bucket, return_tensors="pt",
+            ).to(get_device())
+            model(**inputs, return_dict=True)
+    _ready = True
+    logger.info("Reranker model warmed up")
+
+
+def _inference_context():
+    """inference_mode plus autocast to the model dtype on CUDA.
+
+    inference_mode skips autograd version-counter/view tracking entirely;
+    autocast keeps matmuls in half precision while reductions stay fp32.
+    """
+    import contextlib
+    import torch
+
+    stack = contextlib.ExitStack()
+    stack.enter_context(torch.inference_mode())
+    stack.enter_context(torch.autocast(
+        device_type=get_device(),
+        dtype=get_torch_dtype(),
+        enabled=get_device() == "cuda" and settings.RERANKER_BACKEND == "torch",
+    ))
+    return stack
+
+
+def _bucket_length(length: int) -> int:
+    """Smallest power-of-two bucket (>= 64) covering length, capped at MAX_LENGTH."""
+    bucket = 64
+    while bucket < length:
+        bucket *= 2
+    return min(bucket, settings.MAX_LENGTH)
+
+
+_SLOW_TOKENIZE_CHUNK = 32
+
+
+def _tokenize_pairs(tokenizer, pairs: List[List[str]]) -> List[dict]:
+    """Build truncated, unpadded cross-encoder features for each pair.
+
+    Each distinct query is tokenized once and all documents in one batch,
+    both without special tokens; the `<s> q </s></s> d </s>` inputs are then
+    assembled from ids instead of re-tokenizing the query for every document.
+    The fast tokenizer parallelizes batches natively; a slow tokenizer is
+    mapped over chunks on a thread pool instead.
+    """
+    def _encode(texts):
+        return tokenizer(
+            texts, add_special_tokens=False, truncation=True, max_length=settings.MAX_LENGTH,
+        )["input_ids"]
+
+    def _encode_all(texts):
+        if tokenizer.is_fast or len(texts) <= _SLOW_TOKENIZE_CHUNK:
+            return _encode(texts)
+        chunks = [texts[i:i + _SLOW_TOKENIZE_CHUNK] for i in range(0, len(texts), _SLOW_TOKENIZE_CHUNK)]
+        with ThreadPoolExecutor(max_workers=min(len(chunks), os.cpu_count() or 1)) as pool:
+            return [ids for part in pool.map(_encode, chunks) for ids in part]
+
+    queries = list(dict.fromkeys(query for query, _ in pairs))
+    query_ids = dict(zip(queries, _encode_all(queries)))
+    doc_ids = _encode_all([doc for _, doc in pairs])
+
+    special = tokenizer.num_special_tokens_to_add(pair=True)
+    with_token_types = "token_type_ids" in tokenizer.model_input_names
+    features = []
+    for (query, _), d_ids in zip(pairs, doc_ids):
+        # Mirror truncation="longest_first" closely: the query keeps at most
+        # half the window, the document gets the rest.
+        q_ids = query_ids[query][: settings.MAX_LENGTH // 2]
+        d_ids = d_ids[: settings.MAX_LENGTH - special - len(q_ids)]
+        input_ids = tokenizer.build_inputs_with_special_tokens(q_ids, d_ids)
+        feature = {"input_ids": input_ids, "attention_mask": [1] * len(input_ids)}
+        if with_token_types:
+            feature["token_type_ids"] = tokenizer.create_token_type_ids_from_sequences(q_ids, d_ids)
+        features.append(feature)
+    return features
+
+
+def _score_pairs(pairs: List[List[str]]):
+    """Score (query, document) pairs with the cross-encoder (runs in a worker thread).
+
+    Pairs are tokenized once, sorted by length into mini-batches, and each
+    mini-batch is padded to a fixed bucket (64/128/256/512) so the compiled
+    forward (and its CUDA graphs) sees a handful of stable shapes.
+
+    Returns a float32 score tensor on the model device, in input order.
+    """
+    import torch
+
+    model, tokenizer = load_model()
+    if settings.RERANKER_BACKEND == "flag":
+        # FlagReranker does its own length-sorted batching and truncation.
+        # Raw logits (normalize=False) keep scores comparable to other backends.
+        scores = model.compute_score(
+            pairs, batch_size=settings.BATCH_MAX_SIZE, max_length=settings.MAX_LENGTH,
+        )
+        if not isinstance(scores, list):
+            scores = [scores]
+        return torch.tensor(scores, dtype=torch.float32, device=get_device())
+
+    features = _tokenize_pairs(tokenizer, pairs)
+    order = sorted(range(len(pairs)), key=lambda i: len(features[i]["input_ids"]))
+
+    scores = torch.empty(len(pairs), dtype=torch.float32, device=get_device())
+    with _inference_context():
+        for start in range(0, len(order), settings.BATCH_MAX_SIZE):
+            idx = order[start:start + settings.BATCH_MAX_SIZE]
+            bucket = _bucket_length(len(features[idx[-1]]["input_ids"]))
+            inputs = tokenizer.pad(
+                [features[i] for i in idx],
+                padding="max_length",
+                max_length=bucket,
+                return_tensors="pt",
+            ).to(get_device())
+            logits = model(**inputs, return_dict=True).logits.view(-1).float()
+            scores[torch.tensor(idx, device=scores.device)] = logits
+    return scores
+
+
+def _estimate_pair_tokens(pair: List[str]) -> int:
+    """Cheap token estimate (~4 chars/token) used to cap coalesced batches."""
+    return min((len(pair[0]) + len(pair[1])) // 4 + 3, settings.MAX_LENGTH)
+
+
+# Pairs from concurrent /rerank requests are scored in shared forward passes
+_batcher = AsyncBatcher(
+    _score_pairs,
+    max_batch=settings.BATCH_MAX_SIZE,
+    max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+    max_cost=settings.BATCH_MAX_TOKENS,
+    cost_fn=_estimate_pair_tokens,
+    executor=INFERENCE_POOL,
+)
+
+
 # =============================================================================
 # Request / Response Schemas
 # =============================================================================
@@ -72,28 +303,55 @@ class RerankRequest(BaseModel):
     top_k: Optional[int] = Field(None, ge=1, description="Return top K results (default: all)")
 
 
-class RerankResult(BaseModel):
+# Response types are msgspec Structs: built without per-field validation and
+# encoded straight to JSON bytes, which matters for large top_k responses.
+class RerankResult(msgspec.Struct):
     index: int
     document: str
     relevance_score: float
 
 
-class RerankResponse(BaseModel):
+class RerankResponse(msgspec.Struct):
     results: List[RerankResult]
     model: str
     query: str
     total_documents: int
 
 
+_json_encoder = msgspec.json.Encoder()
+
+
 # =============================================================================
 # FastAPI Application
 # =============================================================================
 
+@asynccontextmanager
+async def lifespan(app):
+    """Start the batcher and background warmup; stop both and release the
+    inference pool on shutdown."""
+    async def _warmup():
+        try:
+            await asyncio.get_running_loop().run_in_executor(INFERENCE_POOL, warmup)
+        except Exception as e:
+            logger.error(f"Warmup failed, model will load on first request: {e}")
+
+    _batcher.start()
+    # /ready reports 503 until the background warmup finishes
+    warmup_task = asyncio.create_task(_warmup())
+    yield
+    warmup_task.cancel()
+    await _batcher.stop()
+    INFERENCE_POOL.shutdown(wait=False)
+
+
 app = create_service_app(
     title="BGE Reranker Service",
     description="Reranking service using BAAI/bge-reranker-v2-m3 for improved RAG retrieval",
     version="1.0.0",
+    lifespan=lifespan,
 )
+# Backend compresses large rerank payloads (many multi-KB documents) with zstd
+app.add_middleware(ZstdRequestMiddleware)
 
 
 def _health_check():
@@ -107,6 +365,7 @@ def _health_check():
 
 
 add_health_endpoint(app, _health_check)
+add_readiness_endpoint(app, lambda: _ready)
 add_root_endpoint(app, {
     "service": settings.SERVICE_NAME,
     "model": settings.RERANKER_MODEL,
@@ -115,63 +374,127 @@ add_root_endpoint(app, {
 })
 
 
-@app.post("/rerank", response_model=RerankResponse)
+@app.post("/rerank")
 async def rerank_endpoint(request: RerankRequest):
     """Rerank documents by relevance to the query.
 
     Takes a query and list of document texts, returns them sorted by relevance score.
     Uses cross-encoder scoring: each (query, document) pair gets a relevance score.
     """
-    import torch
-
     try:
-        model, tokenizer = load_model()
-
         # Build query-document pairs for cross-encoder
         pairs = [[request.query, doc] for doc in request.documents]
 
-        with torch.no_grad():
-            inputs = tokenizer(
-                pairs,
-                padding=True,
-                truncation=True,
-                max_length=settings.MAX_LENGTH,
-                return_tensors="pt",
-            ).to(get_device())
-
-            scores = model(**inputs, return_dict=True).logits.view(-1).float()
-
-        scores_list = scores.cpu().tolist()
+        scores = await _batcher.submit(pairs)
 
-        # Build results sorted by score (descending)
+        # Select and sort the top K on device; only K scores cross to the host
+        k = min(request.top_k or scores.numel(), scores.numel())
+        top_scores, top_idx = scores.topk(k)
         results = [
-            RerankResult(index=i, document=doc, relevance_score=score)
-            for i, (doc, score) in enumerate(zip(request.documents, scores_list))
+            RerankResult(index=i, document=request.documents[i], relevance_score=score)
+            for i, score in zip(top_idx.cpu().tolist(), top_scores.cpu().tolist())
         ]
-        results.sort(key=lambda r: r.relevance_score, reverse=True)
 
-        # Apply top_k filter
-        if request.top_k is not None:
-            results = results[: request.top_k]
-
-        return RerankResponse(
+        payload = RerankResponse(
             results=results,
             model=settings.RERANKER_MODEL,
             query=request.query,
             total_documents=len(request.documents),
         )
+        return Response(content=_json_encoder.encode(payload), media_type="application/json")
 
     except Exception as e:
         logger.error(f"Reranking failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/rerank_stream")
+async def rerank_stream_endpoint(request: Request):
+    """Rerank an application/x-ndjson body as it streams in.
+
+    First line: {"query": ..., "top_k": ...}; each following line is one
+    JSON-encoded document string. Documents are handed to the batcher every
+    BATCH_MAX_SIZE lines, so scoring starts before the whole body arrives.
+    Response format matches /rerank.
+    """
+    header = None
+    documents: List[str] = []
+    pending = []
+    batch_start = 0
+
+    def submit_batch():
+        nonlocal batch_start
+        if batch_start < len(documents):
+            pairs = [[header["query"], doc] for doc in documents[batch_start:]]
+            pending.append(asyncio.ensure_future(_batcher.submit(pairs)))
+            batch_start = len(documents)
+
+    def handle_line(line: bytes):
+        nonlocal header
+        if not line.strip():
+            return
+        value = msgspec.json.decode(line)
+        if header is None:
+            if not isinstance(value, dict) or not isinstance(value.get("query"), str):
+                raise HTTPException(status_code=422, detail="First line must be {\"query\": ...}")
+            top_k = value.get("top_k")
+            # Same rule as RerankRequest.top_k (ge=1)
+            if top_k is not None and (type(top_k) is not int or top_k < 1):
+                raise HTTPException(status_code=422, detail="top_k must be a positive integer")
+            header = value
+        elif isinstance(value, str):
+            documents.append(value)
+            if len(documents) - batch_start >= settings.BATCH_MAX_SIZE:
+                submit_batch()
+        else:
+            raise HTTPException(status_code=422, detail="Documents must be JSON strings")
+
+    try:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                handle_line(line)
+        handle_line(buffer)
+
+        if header is None or not documents:
+            raise HTTPException(status_code=422, detail="Query and at least one document are required")
+        submit_batch()
+
+        import torch
+        scores = torch.cat(await asyncio.gather(*pending))
+        top_k = header.get("top_k")
+        k = min(top_k or scores.numel(), scores.numel())
+        top_scores, top_idx = scores.topk(k)
+        results = [
+            RerankResult(index=i, document=documents[i], relevance_score=score)
+            for i, score in zip(top_idx.cpu().tolist(), top_scores.cpu().tolist())
+        ]
+
+        payload = RerankResponse(
+            results=results,
+            model=settings.RERANKER_MODEL,
+            query=header["query"],
+            total_documents=len(documents),
+        )
+        return Response(content=_json_encoder.encode(payload), media_type="application/json")
+
+    except (HTTPException, msgspec.DecodeError) as e:
+        for future in pending:
+            future.cancel()
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=422, detail=f"Invalid ndjson line: {e}")
+    except Exception as e:
+        logger.error(f"Streaming rerank failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/test")
 async def test_endpoint():
     """Internal test endpoint with sample data."""
     try:
-        model, tokenizer = load_model()
-
         query = "What is the clinical trial protocol?"
         documents = [
             "The clinical trial protocol defines the study design and endpoints.",
@@ -179,15 +502,9 @@ async def test_endpoint():
             "Patient enrollment criteria for Phase 3 trials.",
         ]
 
-        pairs = [[query, doc] for doc in documents]
-
-        import torch
-        with torch.no_grad():
-            inputs = tokenizer(
-                pairs, padding=True, truncation=True,
-                max_length=settings.MAX_LENGTH, return_tensors="pt",
-            ).to(get_device())
-            scores = model(**inputs, return_dict=True).logits.view(-1).float()
+        scores = await asyncio.get_running_loop().run_in_executor(
+            INFERENCE_POOL, _score_pairs, [[query, doc] for doc in documents]
+        )
 
         results = [
             {"document": doc, "score": round(score, 4)}
@@ -212,5 +529,19 @@ async def test_endpoint():
 # =============================================================================
 
 if __name__ == "__main__":
+    if get_device() == "cpu":
+        # Single uvicorn worker: torch already uses all CPU_THREADS
+        configure_cpu_threads(settings.CPU_THREADS)
     port = int(os.getenv("RERANKER_SERVICE_PORT", str(settings.SERVICE_PORT)))
-    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=port,
+        log_level="info",
+        loop="uvloop",
+        http="httptools",
+        # Outlive the clients' 60s keep-alive so pooled connections are reused
+        timeout_keep_alive=75,
+        # Per-request access lines only when debugging
+        access_log=settings.LOG_LEVEL == "DEBUG",
+    )
@@ -0,0 +1,137 @@
+"""Request-level batching for model inference.
+
+Coalesces items from concurrent requests into one model call so the GPU
+sees a few large batches instead of many tiny ones.
+"""
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBatcher:
+    """Coalesce concurrent submissions into a single batched call.
+
+    Each `submit(items)` call is queued as one unit. A background worker takes
+    the first waiting unit, then keeps adding units until `max_batch` items or
+    `max_cost` total cost is reached, or `max_wait_ms` has elapsed. It runs
+    `process_fn` once on the concatenated items in `executor` (the default
+    thread pool if None) and hands each caller back its own slice.
+
+    `process_fn` may also be a coroutine function (e.g. an HTTP call); it is
+    then awaited on the loop, and batches are dispatched concurrently.
+
+    `process_fn` must return a sequence aligned with its input. A unit larger
+    than the limits is processed on its own rather than split.
+    """
+
+    def __init__(
+        self,
+        process_fn: Callable[[List[Any]], Any],
+        max_batch: int = 64,
+        max_wait_ms: float = 5.0,
+        max_cost: Optional[int] = None,
+        cost_fn: Optional[Callable[[Any], int]] = None,
+        executor=None,
+    ):
+        self.process_fn = process_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_cost = max_cost
+        self.cost_fn = cost_fn or (lambda item: 1)
+        self.executor = executor
+        self._is_async = asyncio.iscoroutinefunction(process_fn)
+        self._dispatches: set = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._carry: Optional[Tuple[List[Any], asyncio.Future]] = None
+
+    def start(self) -> None:
+        """Start the background worker on the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._carry = None
+        self._worker = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancel the background worker."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, items: List[Any]) -> List[Any]:
+        """Queue items for the next batch and wait for their results."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self.start()
+        future = loop.create_future()
+        self._queue.put_nowait((items, future))
+        return await future
+
+    def _unit_cost(self, items: List[Any]) -> int:
+        return sum(self.cost_fn(item) for item in items)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if self._carry is not None:
+                unit, self._carry = self._carry, None
+            else:
+                unit = await self._queue.get()
+
+            pending = [unit]
+            count = len(unit[0])
+            cost = self._unit_cost(unit[0])
+            deadline = loop.time() + self.max_wait
+
+            while count < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    unit = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                unit_cost = self._unit_cost(unit[0])
+                if count + len(unit[0]) > self.max_batch or (
+                    self.max_cost is not None and cost + unit_cost > self.max_cost
+                ):
+                    self._carry = unit
+                    break
+                pending.append(unit)
+                count += len(unit[0])
+                cost += unit_cost
+
+            if self._is_async:
+                task = loop.create_task(self._dispatch(pending))
+                self._dispatches.add(task)
+                task.add_done_callback(self._dispatches.discard)
+            else:
+                await self._dispatch(pending)
+
+    async def _dispatch(self, pending: List[Tuple[List[Any], asyncio.Future]]) -> None:
+        flat = [item for items, _ in pending for item in items]
+        loop = asyncio.get_running_loop()
+        try:
+            if self._is_async:
+                results = await self.process_fn(flat)
+            else:
+                results = await loop.run_in_executor(self.executor, self.process_fn, flat)
+        except Exception as e:
+            logger.error(f"Batched call failed for {len(flat)} items: {e}")
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for items, future in pending:
+            if not future.done():
+                future.set_result(results[offset:offset + len(items)])
+            offset += len(items)
@@ -1,7 +1,12 @@
 """Base configuration using Pydantic Settings.
 
-All microservices extend these base settings classes.
+All microservices extend these base settings classes. Settings are frozen;
+use the cached get_*_settings() factories (or one module-level instance per
+service) rather than re-parsing env/.env on every construction.
 """
+from functools import lru_cache
+from typing import Dict
+
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -19,10 +24,29 @@ class BaseServiceSettings(BaseSettings):
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
 
+    # Client-side coalescing of embed() calls (BatchingEmbeddingClient
+    # defaults). MAX_BATCH is capped at 128, the /embed request limit.
+    EMBED_CLIENT_MAX_BATCH: int = Field(128, ge=1, le=128)
+    EMBED_CLIENT_MAX_WAIT_MS: float = 30.0
+    # Approximate tokens (~4 chars each) per merged /embed request
+    EMBED_CLIENT_MAX_TOKENS: int = 8192
+
+    # Read/write timeouts (seconds) per shared.service_client client; set as
+    # JSON, e.g. HTTP_TIMEOUTS='{"embedding": 90}'. Connect and pool
+    # acquisition use the short HTTP_CONNECT_TIMEOUT.
+    HTTP_TIMEOUTS: Dict[str, float] = Field(default_factory=lambda: {
+        "embedding": 180.0,
+        "chunking": 60.0,
+        "ocr": 120.0,
+        "reranker": 60.0,
+    })
+    HTTP_CONNECT_TIMEOUT: float = 2.0
+
     model_config = {
         "env_file": ".env",
         "case_sensitive": True,
         "extra": "ignore",
+        "frozen": True,
     }
 
 
@@ -32,3 +56,26 @@ class GPUServiceSettings(BaseServiceSettings):
     CUDA_VISIBLE_DEVICES: str = "0"
     MODEL_PATH: str = ""
     MODEL_NAME: str = ""
+
+    # Cross-request batching (see shared.batching.AsyncBatcher)
+    BATCH_MAX_SIZE: int = 64
+    BATCH_MAX_WAIT_MS: float = 5.0
+    BATCH_MAX_TOKENS: int = 16384
+
+    # torch.compile (inductor) the model forward on CUDA
+    TORCH_COMPILE: bool = True
+
+    # Intra-op threads for CPU-only inference (0 = all cores)
+    CPU_THREADS: int = 0
+
+
+@lru_cache(maxsize=1)
+def get_base_settings() -> BaseServiceSettings:
+    """Process-wide BaseServiceSettings instance."""
+    return BaseServiceSettings()
+
+
+@lru_cache(maxsize=1)
+def get_gpu_settings() -> GPUServiceSettings:
+    """Process-wide GPUServiceSettings instance."""
+    return GPUServiceSettings()
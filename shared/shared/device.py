@@ -1,40 +1,107 @@
 """Device detection utility for GPU/CPU services.
 
 Replaces duplicated get_device() across OCR and Embedding services.
+torch is imported on first use, so importing this module stays cheap for
+CPU-only services that never touch it.
 """
 import logging
+import os
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
-_device: str | None = None
+
+@lru_cache(maxsize=None)
+def _torch():
+    """Import torch once; None when it is not installed."""
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch
+
+
+def __getattr__(name: str):
+    # PEP 562: `shared.device.torch` resolves lazily
+    if name == "torch":
+        return _torch()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
+@lru_cache(maxsize=None)
 def get_device() -> str:
     """Get compute device (GPU if available, else CPU). Cached after first call."""
-    global _device
-    if _device is None:
-        try:
-            import torch
-            _device = "cuda" if torch.cuda.is_available() else "cpu"
-        except ImportError:
-            _device = "cpu"
-        logger.info(f"Using device: {_device}")
-    return _device
+    torch = _torch()
+    device = "cuda" if torch is not None and torch.cuda.is_available() else "cpu"
+    logger.info(f"Using device: {device}")
+    return device
 
 
+@lru_cache(maxsize=None)
 def get_torch_dtype():
     """Get appropriate torch dtype based on device.
 
     Returns float16 for GPU (faster inference), float32 for CPU.
     """
-    import torch
+    torch = _torch()
     return torch.float16 if get_device() == "cuda" else torch.float32
 
 
 def is_gpu_available() -> bool:
     """Check if GPU is available without caching the device choice."""
+    torch = _torch()
+    return torch is not None and torch.cuda.is_available()
+
+
+def compile_model(model, mode: str = "reduce-overhead"):
+    """Wrap a module with torch.compile (inductor backend).
+
+    dynamic=True keeps variable batch/sequence shapes from retriggering a
+    recompile per shape. Returns the module unchanged if compile is unavailable.
+    """
     try:
-        import torch
-        return torch.cuda.is_available()
-    except ImportError:
-        return False
+        compiled = _torch().compile(model, mode=mode, dynamic=True)
+        logger.info(f"torch.compile enabled (mode={mode})")
+        return compiled
+    except Exception as e:
+        logger.warning(f"torch.compile unavailable, running eager: {e}")
+        return model
+
+
+def get_onnx_provider() -> str:
+    """Get the ONNX Runtime execution provider matching the compute device."""
+    return "CUDAExecutionProvider" if get_device() == "cuda" else "CPUExecutionProvider"
+
+
+def configure_cpu_threads(num_threads: int = 0) -> int:
+    """Pin torch's intra-op thread count for CPU inference.
+
+    num_threads=0 uses all cores. Inter-op parallelism is set to 1 so torch
+    does not spawn a second thread team competing with uvicorn's threads.
+    Run a single uvicorn worker when relying on this to avoid oversubscription.
+    OMP_NUM_THREADS/MKL_NUM_THREADS are read when torch is imported, so they
+    are set in the compose environment rather than here.
+    """
+    n = num_threads or os.cpu_count() or 1
+    torch = _torch()
+    try:
+        torch.set_num_threads(n)
+        torch.set_num_interop_threads(1)
+    except (AttributeError, RuntimeError) as e:
+        logger.warning(f"Could not configure torch CPU threads: {e}")
+    logger.info(f"CPU inference threads: {n}")
+    return n
+
+
+def get_onnx_session_options(num_threads: int = 0):
+    """Build ONNX Runtime session options with full graph optimization.
+
+    On CPU, intra-op parallelism is set to num_threads (0 = all cores).
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if get_device() == "cpu":
+        options.intra_op_num_threads = num_threads or os.cpu_count() or 1
+    return options
@@ -2,9 +2,16 @@
 
 Reduces boilerplate across service initialization.
 """
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
-from typing import Optional, Callable
+import inspect
+import io
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from typing import Any, Dict, Optional, Callable, Tuple
+
+import anyio
 
 
 def create_service_app(
@@ -12,36 +19,200 @@ def create_service_app(
     description: str,
     version: str = "1.0.0",
     lifespan: Optional[Callable] = None,
+    client_factories: Optional[Dict[str, Callable[[], Any]]] = None,
+    gzip_minimum_size: Optional[int] = None,
 ) -> FastAPI:
-    """Create a FastAPI app with standard configuration."""
-    return FastAPI(
+    """Create a FastAPI app with standard configuration.
+
+    client_factories maps a name to a zero-arg factory for a shared client
+    (e.g. a ServiceClient). Each is built once at startup into
+    app.state.clients, injected with Depends(get_client(name)), and
+    aclose()d at shutdown. An explicit lifespan runs inside that scope.
+
+    gzip_minimum_size enables gzip for responses at least that many bytes
+    when the client sends Accept-Encoding: gzip (httpx does by default).
+    """
+    if client_factories:
+        app_lifespan = lifespan
+
+        @asynccontextmanager
+        async def lifespan(app: FastAPI):
+            app.state.clients = {name: factory() for name, factory in client_factories.items()}
+            try:
+                if app_lifespan is None:
+                    yield
+                else:
+                    async with app_lifespan(app):
+                        yield
+            finally:
+                for client in app.state.clients.values():
+                    await client.aclose()
+
+    app = FastAPI(
         title=title,
         description=description,
         version=version,
         lifespan=lifespan,
+        # orjson (C) encodes dicts/lists of floats straight to bytes
+        default_response_class=ORJSONResponse,
     )
+    if gzip_minimum_size is not None:
+        app.add_middleware(GZipMiddleware, minimum_size=gzip_minimum_size)
+    return app
+
+
+def get_client(name: str) -> Callable[[Request], Any]:
+    """Dependency returning the shared client registered under name.
+
+    Usage: client: EmbeddingClient = Depends(get_client("embedding"))
+    """
+    def _get_client(request: Request) -> Any:
+        return request.app.state.clients[name]
+
+    return _get_client
 
 
-def add_health_endpoint(app: FastAPI, health_checker: Callable):
+def add_health_endpoint(app: FastAPI, health_checker: Callable, ttl_seconds: float = 2.0):
     """Register a /health endpoint that calls the provided health_checker.
 
     The health_checker should return a dict with at minimum {"status": "healthy"}.
-    If it raises, a 503 with {"status": "unhealthy"} is returned.
+    It may be a coroutine function; a sync checker runs in a worker thread so
+    CUDA/HTTP probes never block the event loop.
+    If it raises, a 503 with {"status": "unhealthy"} is returned. Successful
+    results are reused for ttl_seconds so frequent probes don't re-run the
+    check; failures are never cached.
     """
+    last_ok: Optional[Tuple[float, Any]] = None
+    is_async = inspect.iscoroutinefunction(health_checker)
+
     @app.get("/health")
     async def health_check():
+        nonlocal last_ok
+        now = time.monotonic()
+        if last_ok is not None and now - last_ok[0] < ttl_seconds:
+            return last_ok[1]
         try:
-            result = health_checker()
+            if is_async:
+                result = await health_checker()
+            else:
+                result = await anyio.to_thread.run_sync(health_checker)
+            last_ok = (now, result)
             return result
         except Exception as e:
-            return JSONResponse(
+            last_ok = None
+            return ORJSONResponse(
                 status_code=503,
                 content={"status": "unhealthy", "error": str(e)},
             )
 
 
+def add_readiness_endpoint(app: FastAPI, is_ready: Callable[[], bool]):
+    """Register a /ready endpoint that returns 200 only once is_ready() is true.
+
+    Unlike /health (liveness), this gates traffic until model warmup finishes.
+    """
+    @app.get("/ready")
+    async def readiness_check():
+        if is_ready():
+            return {"status": "ready"}
+        return ORJSONResponse(status_code=503, content={"status": "warming_up"})
+
+
 def add_root_endpoint(app: FastAPI, info: dict):
     """Register a / endpoint returning service info."""
     @app.get("/")
     async def root():
         return info
+
+
+def _content_encodings(headers) -> list:
+    """Content-Encoding codings of an ASGI request, lowercased, in order."""
+    codings = []
+    for key, value in headers:
+        if key == b"content-encoding":
+            codings.extend(c.strip().lower() for c in value.decode("latin-1").split(",") if c.strip())
+    return codings
+
+
+class ZstdRequestMiddleware:
+    """ASGI middleware that transparently decompresses zstd request bodies.
+
+    Clients may send large JSON payloads with `Content-Encoding: zstd`;
+    endpoints then see the plain body. Bodies that decompress to more than
+    `max_body_size` bytes get a 413. Requires the `zstandard` package.
+    """
+
+    def __init__(self, app, max_body_size: int = 64 * 1024 * 1024):
+        import zstandard
+
+        self.app = app
+        self.max_body_size = max_body_size
+        self._dctx = zstandard.ZstdDecompressor()
+
+    def _decompress(self, data: bytes) -> Optional[bytes]:
+        """Decompressed body, or None if it exceeds max_body_size."""
+        # Streamed in bounded reads: the frame header's content size is not trusted
+        parts, total = [], 0
+        with self._dctx.stream_reader(io.BytesIO(data)) as reader:
+            while True:
+                block = reader.read(min(1 << 20, self.max_body_size + 1 - total))
+                if not block:
+                    return b"".join(parts)
+                parts.append(block)
+                total += len(block)
+                if total > self.max_body_size:
+                    return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codings = _content_encodings(scope["headers"])
+        if "zstd" not in codings:
+            await self.app(scope, receive, send)
+            return
+        if codings != ["zstd"]:
+            response = ORJSONResponse(
+                status_code=415, content={"detail": f"Unsupported Content-Encoding: {', '.join(codings)}"},
+            )
+            await response(scope, receive, send)
+            return
+
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+
+        try:
+            body = self._decompress(b"".join(chunks))
+        except Exception:
+            response = ORJSONResponse(status_code=400, content={"detail": "Invalid zstd request body"})
+            await response(scope, receive, send)
+            return
+        if body is None:
+            response = ORJSONResponse(
+                status_code=413,
+                content={"detail": f"Decompressed request body exceeds {self.max_body_size} bytes"},
+            )
+            await response(scope, receive, send)
+            return
+
+        headers = [
+            (k, v) for k, v in scope["headers"]
+            if k not in (b"content-encoding", b"content-length")
+        ]
+        headers.append((b"content-length", str(len(body)).encode()))
+        scope = dict(scope, headers=headers)
+
+        body_sent = False
+
+        async def receive_decompressed():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(scope, receive_decompressed, send)
@@ -4,6 +4,20 @@ Replaces duplicated logging.basicConfig() calls across 4+ services.
 """
 import logging
 import sys
+from typing import Optional
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+_handler: Optional[logging.Handler] = None
+
+
+def _stdout_handler(fmt: str) -> logging.Handler:
+    """Single stdout handler shared by the root and service loggers."""
+    global _handler
+    if _handler is None:
+        _handler = logging.StreamHandler(sys.stdout)
+        _handler.setFormatter(logging.Formatter(fmt, datefmt=DATE_FORMAT))
+    return _handler
 
 
 def setup_logging(
@@ -13,17 +27,38 @@ def setup_logging(
 ) -> logging.Logger:
     """Configure logging for a service and return the logger.
 
+    Idempotent: repeated calls (e.g. module reloads in tests) reuse the same
+    stdout handler instead of stacking duplicates.
+
     Args:
         service_name: Name used as the logger identifier.
         level: Log level string (DEBUG, INFO, WARNING, ERROR).
-        fmt: Log message format string.
+        fmt: Log message format string (used on the first call).
 
     Returns:
         Configured logger instance.
     """
     log_level = getattr(logging, level.upper(), logging.INFO)
-    logging.basicConfig(level=log_level, format=fmt, stream=sys.stdout)
+
+    # Records never use thread/process fields; skip collecting them
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    handler = _stdout_handler(fmt)
+    root = logging.getLogger()
+    if not any(
+        isinstance(h, logging.StreamHandler) and getattr(h, "stream", None) is sys.stdout
+        for h in root.handlers
+    ):
+        root.addHandler(handler)
+    root.setLevel(log_level)
+
     logger = logging.getLogger(service_name)
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+    # Own handler above; don't emit again through root
+    logger.propagate = False
     logger.setLevel(log_level)
     logger.info(f"Logging initialized for {service_name} at level {level}")
     return logger
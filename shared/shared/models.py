@@ -1,6 +1,7 @@
 """Common Pydantic models shared across services."""
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from typing import Optional, Dict, Any, List
+from typing_extensions import TypedDict
 
 
 class HealthResponse(BaseModel):
@@ -47,3 +48,30 @@ class RerankResponse(BaseModel):
     results: List[RerankResult]
     model: str
     query: str
+
+
+# Wire formats decoded by shared.service_client. TypedDicts keep the plain
+# dict interface callers use while letting a prebuilt TypeAdapter validate
+# straight from JSON bytes.
+class RerankResultDict(TypedDict):
+    index: int
+    document: str
+    relevance_score: float
+
+
+class RerankResponseDict(TypedDict):
+    results: List[RerankResultDict]
+    model: str
+    query: str
+    total_documents: int
+
+
+class EmbedResponseDict(TypedDict):
+    embeddings: List[List[float]]
+    model: str
+    dimension: int
+    count: int
+
+
+RERANK_RESPONSE_ADAPTER = TypeAdapter(RerankResponseDict)
+EMBED_RESPONSE_ADAPTER = TypeAdapter(EmbedResponseDict)
@@ -2,53 +2,404 @@
 
 Used by the worker and backend to call AI microservices.
 """
+import asyncio
+import base64
+import functools
+import json
+import mimetypes
+import os
+import secrets
+import anyio
 import httpx
 import logging
-from typing import List, Optional
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Union
 from pathlib import Path
 
+from shared.batching import AsyncBatcher
+from shared.config import get_base_settings
+from shared.models import EMBED_RESPONSE_ADAPTER, RERANK_RESPONSE_ADAPTER
+
 logger = logging.getLogger(__name__)
 
+# Idle connections are kept for 60s (httpx default 5s) so they survive the
+# gaps between worker tasks; services keep theirs open for 75s.
+DEFAULT_LIMITS = httpx.Limits(
+    max_keepalive_connections=32, max_connections=100, keepalive_expiry=60.0,
+)
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+TimeoutTypes = Union[float, httpx.Timeout, None]
+
+
+def service_timeout(name: str) -> httpx.Timeout:
+    """httpx.Timeout for a service from HTTP_TIMEOUTS / HTTP_CONNECT_TIMEOUT.
+
+    Connect and pool waits stay short so an unreachable service fails fast;
+    read/write get the per-service budget.
+    """
+    settings = get_base_settings()
+    budget = settings.HTTP_TIMEOUTS.get(name, 60.0)
+    return httpx.Timeout(
+        connect=settings.HTTP_CONNECT_TIMEOUT,
+        read=budget,
+        write=budget,
+        pool=settings.HTTP_CONNECT_TIMEOUT,
+    )
+
+
+def _multipart_file_upload(
+    file_path: str,
+    fields: Dict[str, str],
+    field_name: str = "file",
+) -> tuple:
+    """Build a streamed multipart/form-data body for one file plus form fields.
+
+    Returns (headers, body) where body is an async iterator that reads the
+    file in UPLOAD_CHUNK_SIZE chunks on a worker thread, so the upload never
+    buffers the whole file nor blocks the event loop on disk reads.
+    """
+    boundary = secrets.token_hex(16)
+    filename = Path(file_path).name
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    head = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ) + (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field_name}"; '
+        f'filename="{filename}"\r\nContent-Type: {content_type}\r\n\r\n'
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+
+    async def body() -> AsyncIterator[bytes]:
+        yield head
+        f = await anyio.to_thread.run_sync(open, file_path, "rb")
+        try:
+            while chunk := await anyio.to_thread.run_sync(f.read, UPLOAD_CHUNK_SIZE):
+                yield chunk
+        finally:
+            f.close()
+        yield tail
+
+    headers = {
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+        "Content-Length": str(len(head) + os.path.getsize(file_path) + len(tail)),
+    }
+    return headers, body()
 
-class EmbeddingClient:
-    """Client for the E5 Embedding Service."""
 
-    def __init__(self, base_url: str = "http://embedding_service:8002", timeout: float = 180.0):
+class ServiceClient:
+    """Base class holding one pooled httpx.AsyncClient per event loop.
+
+    Keep-alive connections are reused across calls instead of opening a new
+    TCP connection per request. The pool is bound to the loop it was created
+    on, so it is rebuilt when used from a different loop (e.g. Celery tasks
+    that each run on a fresh loop); the old pool is closed on its own loop
+    if that loop is still running. Close with `aclose()` or use as an async
+    context manager.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: Union[float, httpx.Timeout],
+        limits: httpx.Limits = DEFAULT_LIMITS,
+    ):
         self.base_url = base_url
         self.timeout = timeout
+        self.limits = limits
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._discard_client()
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+            )
+            self._loop = loop
+            self._pid = os.getpid()
+        return self._client
+
+    def _discard_client(self) -> None:
+        """Close the pool left behind on another event loop.
+
+        Its connections can only be closed on the loop that opened them, so
+        the close is handed to that loop when it is still running in this
+        process. A stopped or closed loop can't run it; the sockets are then
+        released when the old client is garbage collected.
+        """
+        client, loop = self._client, self._loop
+        self._client = None
+        self._loop = None
+        if client is None or client.is_closed or loop is None:
+            return
+        if self._pid == os.getpid() and loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        else:
+            logger.debug(f"Dropping {self.base_url} client from a stopped event loop")
+
+    async def health(self) -> dict:
+        """GET /health."""
+        response = await self.client.get("/health")
+        response.raise_for_status()
+        return response.json()
+
+    async def warmup(self) -> bool:
+        """Open a pooled connection ahead of the first real request.
+
+        Probes /health so DNS and the TCP connection are in place; failures
+        are logged and ignored. Returns whether the probe succeeded.
+        """
+        try:
+            await self.health()
+            return True
+        except Exception as e:
+            logger.warning(f"Warmup of {self.base_url} failed: {e}")
+            return False
+
+    async def aclose(self) -> None:
+        """Close pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+def decode_b64_embeddings(payload: dict) -> dict:
+    """Turn a `format=b64_f16` /embed payload into an embed() result dict."""
+    import numpy as np
+
+    data = base64.b64decode(payload["data"])
+    embeddings = np.frombuffer(data, dtype="<f2").reshape(payload["shape"])
+    return {
+        "embeddings": embeddings,
+        "model": payload["model"],
+        "dimension": payload["dimension"],
+        "count": payload["count"],
+    }
+
+
+def decode_fp16_embeddings(response: httpx.Response) -> dict:
+    """Turn a raw float16 /embed (octet-stream) response into an embed() result dict."""
+    import numpy as np
+
+    n, d = (int(x) for x in response.headers["X-Shape"].split(","))
+    embeddings = np.frombuffer(response.content, dtype="<f2").reshape(n, d)
+    return {
+        "embeddings": embeddings,
+        "model": response.headers.get("X-Model"),
+        "dimension": d,
+        "count": n,
+    }
+
+
+class EmbeddingClient(ServiceClient):
+    """Client for the E5 Embedding Service."""
+
+    def __init__(self, base_url: str = "http://embedding_service:8002", timeout: TimeoutTypes = None):
+        super().__init__(base_url, timeout if timeout is not None else service_timeout("embedding"))
 
     async def embed(
         self,
         texts: List[str],
         normalize: bool = True,
         batch_size: int = 32,
+        format: str = "json",
     ) -> dict:
-        """Generate embeddings for a list of texts."""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(
-                f"{self.base_url}/embed",
-                json={"texts": texts, "normalize": normalize, "batch_size": batch_size},
+        """Generate embeddings for a list of texts.
+
+        With `format="b64_f16"` (base64 in JSON) or `format="fp16"` (raw
+        octet-stream body) "embeddings" is returned as an (n, d) float16
+        numpy array.
+        """
+        payload = {"texts": texts, "normalize": normalize, "batch_size": batch_size}
+        if format == "fp16":
+            response = await self.client.post(
+                "/embed",
+                json=payload,
+                # float16 bytes barely compress; skip the server's gzip pass
+                headers={"Accept": "application/octet-stream", "Accept-Encoding": "identity"},
             )
             response.raise_for_status()
-            return response.json()
+            return decode_fp16_embeddings(response)
+
+        response = await self.client.post(
+            "/embed",
+            json=payload,
+            params=None if format == "json" else {"format": format},
+        )
+        response.raise_for_status()
+        if format == "b64_f16":
+            return decode_b64_embeddings(response.json())
+        return EMBED_RESPONSE_ADAPTER.validate_json(response.content)
+
+    async def embed_many(
+        self,
+        batches: List[List[str]],
+        normalize: bool = True,
+        batch_size: int = 32,
+        format: str = "json",
+    ) -> List[dict]:
+        """Embed several batches concurrently, one /embed request each.
+
+        The requests share the pooled client, so they overlap on the wire
+        and the service batcher can coalesce them into full GPU batches.
+        """
+        return list(await asyncio.gather(*[
+            self.embed(batch, normalize=normalize, batch_size=batch_size, format=format)
+            for batch in batches
+        ]))
 
     async def similarity(self, text1: str, text2: str) -> dict:
         """Calculate cosine similarity between two texts."""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(
-                f"{self.base_url}/similarity",
-                json={"text1": text1, "text2": text2},
+        response = await self.client.post(
+            "/similarity",
+            json={"text1": text1, "text2": text2},
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) for request sizing."""
+    return len(text) // 4 + 1
+
+
+class BatchingEmbeddingClient:
+    """EmbeddingClient wrapper that coalesces concurrent embed() calls.
+
+    Calls arriving within `max_wait_ms` of each other (up to `max_batch`
+    texts and about `max_tokens` tokens) are merged into one /embed request
+    and each caller gets back its own slice, so bursts of small requests
+    share one HTTP round trip and one GPU batch on the server. Larger calls
+    are split to fit the same limits. Identical texts within a merged batch
+    are sent once. `format` is passed through to EmbeddingClient.embed.
+    Limits default to the EMBED_CLIENT_* settings.
+    """
+
+    def __init__(
+        self,
+        client: EmbeddingClient,
+        max_batch: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        format: str = "json",
+    ):
+        settings = get_base_settings()
+        if max_batch is None:
+            max_batch = settings.EMBED_CLIENT_MAX_BATCH
+        if max_wait_ms is None:
+            max_wait_ms = settings.EMBED_CLIENT_MAX_WAIT_MS
+        if max_tokens is None:
+            max_tokens = settings.EMBED_CLIENT_MAX_TOKENS
+        self.client = client
+        self.max_batch = max_batch
+        self.max_tokens = max_tokens
+        self.format = format
+        self._model: Optional[str] = None
+        self._batchers = {
+            normalize: AsyncBatcher(
+                functools.partial(self._post, normalize=normalize),
+                max_batch=max_batch,
+                max_wait_ms=max_wait_ms,
+                max_cost=max_tokens,
+                cost_fn=estimate_tokens,
             )
-            response.raise_for_status()
-            return response.json()
+            for normalize in (True, False)
+        }
+
+    async def _post(self, texts: List[str], normalize: bool):
+        position = {text: i for i, text in enumerate(dict.fromkeys(texts))}
+        # batch_size is left at its default: the service sizes GPU batches
+        # itself and rejects values above 128
+        result = await self.client.embed(list(position), normalize=normalize, format=self.format)
+        self._model = result.get("model")
+        embeddings = result["embeddings"]
+        if len(position) == len(texts):
+            return embeddings
+        order = [position[text] for text in texts]
+        if self.format == "json":
+            return [embeddings[i] for i in order]
+        return embeddings[order]
+
+    def _split(self, texts: List[str]) -> List[List[str]]:
+        """Cut texts into units that each fit max_batch and max_tokens.
 
+        AsyncBatcher never splits a unit, so an oversized call would
+        otherwise go out as one oversized request.
+        """
+        units, unit, cost = [], [], 0
+        for text in texts:
+            text_cost = estimate_tokens(text)
+            if unit and (len(unit) >= self.max_batch or cost + text_cost > self.max_tokens):
+                units.append(unit)
+                unit, cost = [], 0
+            unit.append(text)
+            cost += text_cost
+        if unit:
+            units.append(unit)
+        return units
 
-class ChunkingClient:
+    async def embed(
+        self,
+        texts: List[str],
+        normalize: bool = True,
+        batch_size: int = 32,
+    ) -> dict:
+        """Generate embeddings; same response shape as EmbeddingClient.embed."""
+        batcher = self._batchers[normalize]
+        units = self._split(texts)
+        if len(units) <= 1:
+            embeddings = await batcher.submit(texts)
+        else:
+            parts = await asyncio.gather(*[batcher.submit(unit) for unit in units])
+            if self.format == "json":
+                embeddings = [embedding for part in parts for embedding in part]
+            else:
+                import numpy as np
+                embeddings = np.concatenate(parts)
+        return {
+            "embeddings": embeddings,
+            "model": self._model,
+            "dimension": len(embeddings[0]) if len(embeddings) else 0,
+            "count": len(embeddings),
+        }
+
+    async def embed_many(
+        self,
+        batches: List[List[str]],
+        normalize: bool = True,
+        batch_size: int = 32,
+    ) -> List[dict]:
+        """Submit several batches at once; they are coalesced with other callers'."""
+        return list(await asyncio.gather(*[
+            self.embed(batch, normalize=normalize, batch_size=batch_size) for batch in batches
+        ]))
+
+    async def aclose(self) -> None:
+        for batcher in self._batchers.values():
+            await batcher.stop()
+        await self.client.aclose()
+
+
+class ChunkingClient(ServiceClient):
     """Client for the Hybrid Chunking Service."""
 
-    def __init__(self, base_url: str = "http://chunking_service:8003", timeout: float = 60.0):
-        self.base_url = base_url
-        self.timeout = timeout
+    def __init__(self, base_url: str = "http://chunking_service:8003", timeout: TimeoutTypes = None):
+        super().__init__(base_url, timeout if timeout is not None else service_timeout("chunking"))
 
     async def chunk(
         self,
@@ -58,48 +409,42 @@ class ChunkingClient:
         chunk_overlap: int = 200,
     ) -> dict:
         """Chunk text using the specified method."""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(
-                f"{self.base_url}/chunk",
-                json={
-                    "text": text,
-                    "method": method,
-                    "chunk_size": chunk_size,
-                    "chunk_overlap": chunk_overlap,
-                },
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self.client.post(
+            "/chunk",
+            json={
+                "text": text,
+                "method": method,
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+            },
+        )
+        response.raise_for_status()
+        return response.json()
 
 
-class OCRClient:
+class OCRClient(ServiceClient):
     """Client for the GLM-OCR Service."""
 
-    def __init__(self, base_url: str = "http://ocr_service:8001", timeout: float = 120.0):
-        self.base_url = base_url
-        self.timeout = timeout
+    def __init__(self, base_url: str = "http://ocr_service:8001", timeout: TimeoutTypes = None):
+        super().__init__(base_url, timeout if timeout is not None else service_timeout("ocr"))
 
     async def ocr(self, file_path: str, language: str = "en") -> dict:
-        """Extract text from an image file via OCR."""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            with open(file_path, "rb") as f:
-                files = {"file": (Path(file_path).name, f)}
-                data = {"language": language}
-                response = await client.post(
-                    f"{self.base_url}/ocr",
-                    files=files,
-                    data=data,
-                )
-                response.raise_for_status()
-                return response.json()
-
-
-class RerankerClient:
+        """Extract text from an image file via OCR (streamed upload)."""
+        headers, body = _multipart_file_upload(file_path, {"language": language})
+        response = await self.client.post(
+            "/ocr",
+            content=body,
+            headers=headers,
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+class RerankerClient(ServiceClient):
     """Client for the BGE Reranker Service."""
 
-    def __init__(self, base_url: str = "http://reranker_service:8004", timeout: float = 60.0):
-        self.base_url = base_url
-        self.timeout = timeout
+    def __init__(self, base_url: str = "http://reranker_service:8004", timeout: TimeoutTypes = None):
+        super().__init__(base_url, timeout if timeout is not None else service_timeout("reranker"))
 
     async def rerank(
         self,
@@ -108,13 +453,93 @@ class RerankerClient:
         top_k: Optional[int] = None,
     ) -> dict:
         """Rerank documents by relevance to query."""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            payload = {"query": query, "documents": documents}
-            if top_k is not None:
-                payload["top_k"] = top_k
-            response = await client.post(
-                f"{self.base_url}/rerank",
-                json=payload,
-            )
-            response.raise_for_status()
-            return response.json()
+        payload = {"query": query, "documents": documents}
+        if top_k is not None:
+            payload["top_k"] = top_k
+        response = await self.client.post(
+            "/rerank",
+            json=payload,
+        )
+        response.raise_for_status()
+        return RERANK_RESPONSE_ADAPTER.validate_json(response.content)
+
+    async def rerank_stream(
+        self,
+        query: str,
+        documents: Union[Iterable[str], AsyncIterable[str]],
+        top_k: Optional[int] = None,
+    ) -> dict:
+        """Rerank via /rerank_stream, sending documents as ndjson as they are produced.
+
+        The server starts scoring batches before the full body has arrived,
+        so documents may come from a (async) generator.
+        """
+        header = {"query": query}
+        if top_k is not None:
+            header["top_k"] = top_k
+
+        async def body() -> AsyncIterator[bytes]:
+            yield json.dumps(header).encode() + b"\n"
+            if hasattr(documents, "__aiter__"):
+                async for doc in documents:
+                    yield json.dumps(doc).encode() + b"\n"
+            else:
+                for doc in documents:
+                    yield json.dumps(doc).encode() + b"\n"
+
+        response = await self.client.post(
+            "/rerank_stream",
+            content=body(),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        response.raise_for_status()
+        return RERANK_RESPONSE_ADAPTER.validate_json(response.content)
+
+
+class ServiceRegistry:
+    """Named set of service clients with concurrent health checks.
+
+    Responses are gzip-decoded transparently by httpx, which advertises
+    Accept-Encoding on every request.
+    """
+
+    def __init__(self, clients: Dict[str, ServiceClient]):
+        self._clients = clients
+
+    @classmethod
+    def from_env(cls) -> "ServiceRegistry":
+        """Registry of the AI microservices using the *_URL env vars."""
+        return cls({
+            "ocr": OCRClient(base_url=os.getenv("OCR_URL", "http://ocr_service:8001")),
+            "embedding": EmbeddingClient(base_url=os.getenv("EMBEDDING_URL", "http://embedding_service:8002")),
+            "chunking": ChunkingClient(base_url=os.getenv("CHUNKING_URL", "http://chunking_service:8003")),
+            "reranker": RerankerClient(base_url=os.getenv("RERANKER_URL", "http://reranker_service:8004")),
+        })
+
+    def __getitem__(self, name: str) -> ServiceClient:
+        return self._clients[name]
+
+    async def health_all(self) -> Dict[str, dict]:
+        """Probe every service's /health concurrently.
+
+        A service that is unreachable or returns an error status maps to
+        {"status": "unhealthy", "error": ...} instead of raising.
+        """
+        results = await asyncio.gather(
+            *[client.health() for client in self._clients.values()],
+            return_exceptions=True,
+        )
+        return {
+            name: result if not isinstance(result, Exception)
+            else {"status": "unhealthy", "error": str(result) or type(result).__name__}
+            for name, result in zip(self._clients, results)
+        }
+
+    async def aclose(self) -> None:
+        await asyncio.gather(*[client.aclose() for client in self._clients.values()])
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
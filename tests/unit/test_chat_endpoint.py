@@ -0,0 +1,58 @@
+"""Unit tests for the streaming chat endpoint (RAG service and audit DB mocked)."""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+
+class TestStreamChat:
+    @staticmethod
+    def _request():
+        return MagicMock(query="q", conversation_id="c", top_k=5, temperature=0.7, max_tokens=64)
+
+    @pytest.mark.asyncio
+    async def test_client_disconnect_is_audited(self):
+        from app.api.endpoints import chat
+
+        async def stream_answer(**kwargs):
+            yield {"token": "partial"}
+            await asyncio.sleep(10)
+            yield {"token": "never sent"}
+
+        log = AsyncMock()
+        with patch.object(chat.rag_service, "stream_answer", stream_answer), \
+                patch.object(chat, "AsyncSessionLocal", MagicMock()), \
+                patch.object(chat, "log_chat_interaction", log):
+            stream = chat._stream_chat(self._request(), MagicMock(), MagicMock())
+            consumer = asyncio.ensure_future(stream.__anext__())
+            await consumer
+            consumer = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0)
+            consumer.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await consumer
+
+        log.assert_awaited_once()
+        kwargs = log.await_args.kwargs
+        assert kwargs["success"] is False
+        assert kwargs["error_message"] == "client disconnected"
+        assert kwargs["response"] == "partial"
+
+    @pytest.mark.asyncio
+    async def test_completed_stream_is_audited(self):
+        from app.api.endpoints import chat
+
+        async def stream_answer(**kwargs):
+            yield {"token": "answer"}
+            yield {"done": True, "retrieved_documents": [], "token_count": 12, "latency_ms": 5}
+
+        log = AsyncMock()
+        with patch.object(chat.rag_service, "stream_answer", stream_answer), \
+                patch.object(chat, "AsyncSessionLocal", MagicMock()), \
+                patch.object(chat, "log_chat_interaction", log):
+            events = [event async for event in chat._stream_chat(self._request(), MagicMock(), MagicMock())]
+
+        assert len(events) == 2
+        kwargs = log.await_args.kwargs
+        assert kwargs["success"] is True
+        assert kwargs["token_count"] == 12
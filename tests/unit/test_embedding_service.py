@@ -0,0 +1,105 @@
+"""Unit tests for embedding service schemas and cache (model never loaded)."""
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../services/embedding"))
+
+pytest.importorskip("torch")
+pytest.importorskip("sentence_transformers")
+
+
+class TestEmbedRequest:
+    def test_accepts_full_worker_batch(self):
+        import httpx
+        from embedding_service import EmbedRequest
+        from shared.config import get_base_settings
+        from shared.service_client import BatchingEmbeddingClient, EmbeddingClient
+
+        max_batch = get_base_settings().EMBED_CLIENT_MAX_BATCH
+        payloads = []
+
+        def handler(request):
+            payloads.append(json.loads(request.content))
+            count = len(payloads[-1]["texts"])
+            return httpx.Response(200, json={
+                "embeddings": [[0.0]] * count, "model": "m", "dimension": 1, "count": count,
+            })
+
+        embedding = EmbeddingClient(base_url="http://embedding")
+        batching = BatchingEmbeddingClient(embedding, max_wait_ms=50)
+
+        async def main():
+            embedding._client = httpx.AsyncClient(
+                transport=httpx.MockTransport(handler), base_url="http://embedding",
+            )
+            embedding._loop = asyncio.get_running_loop()
+            texts = [f"text {i}" for i in range(max_batch)]
+            half = max_batch // 2
+            await asyncio.gather(batching.embed(texts[:half]), batching.embed(texts[half:]))
+            await batching.aclose()
+
+        asyncio.run(main())
+        assert len(payloads) == 1
+        assert len(payloads[0]["texts"]) == max_batch
+        EmbedRequest(**payloads[0])
+
+
+class TestEmbeddingCache:
+    def _filled(self, path, maxsize, model="m"):
+        import numpy as np
+        from embedding_service import EmbeddingCache
+
+        cache = EmbeddingCache(maxsize, str(path), model=model)
+        keys = [EmbeddingCache.key(f"text {i}", True) for i in range(maxsize)]
+        cache.put_many(keys, np.arange(maxsize * 4, dtype=np.float32).reshape(maxsize, 4))
+        cache.save()
+        return keys
+
+    def test_reloads_matching_cache(self, tmp_path):
+        from embedding_service import EmbeddingCache
+
+        keys = self._filled(tmp_path / "cache.bin", 4)
+        cache = EmbeddingCache(4, str(tmp_path / "cache.bin"), model="m")
+        assert cache.get_many(keys[:1])[0].tolist() == [0.0, 1.0, 2.0, 3.0]
+
+    def test_discards_cache_not_saved_after_loading(self, tmp_path):
+        import numpy as np
+        from embedding_service import EmbeddingCache
+
+        keys = self._filled(tmp_path / "cache.bin", 4)
+        cache = EmbeddingCache(4, str(tmp_path / "cache.bin"), model="m")
+        # Evicts a slot in place; the process then dies without save()
+        cache.put_many([EmbeddingCache.key("other", True)], np.ones((1, 4), dtype=np.float32))
+        restarted = EmbeddingCache(4, str(tmp_path / "cache.bin"), model="m")
+        assert restarted.get_many(keys) == [None] * 4
+
+    def test_discards_cache_when_size_grows(self, tmp_path):
+        import numpy as np
+        from embedding_service import EmbeddingCache
+
+        keys = self._filled(tmp_path / "cache.bin", 4)
+        cache = EmbeddingCache(8, str(tmp_path / "cache.bin"), model="m")
+        assert cache.get_many(keys) == [None] * 4
+        cache.put_many(keys, np.ones((4, 4), dtype=np.float32))
+        assert cache.stats()["size"] == 4
+
+    def test_discards_cache_when_size_shrinks(self, tmp_path):
+        import numpy as np
+        from embedding_service import EmbeddingCache
+
+        keys = self._filled(tmp_path / "cache.bin", 8)
+        cache = EmbeddingCache(2, str(tmp_path / "cache.bin"), model="m")
+        assert cache.get_many(keys) == [None] * 8
+        cache.put_many(keys[:3], np.ones((3, 4), dtype=np.float32))
+        assert cache.stats()["size"] == 2
+
+    def test_discards_cache_from_other_model(self, tmp_path):
+        from embedding_service import EmbeddingCache
+
+        keys = self._filled(tmp_path / "cache.bin", 4, model="old")
+        cache = EmbeddingCache(4, str(tmp_path / "cache.bin"), model="new")
+        assert cache.get_many(keys) == [None] * 4
@@ -30,3 +30,191 @@ class TestRAGServicePrompt:
         prompt = rag.build_rag_prompt("test query", [])
 
         assert "test query" in prompt
+
+
+class TestRAGServicePacking:
+    @pytest.fixture(autouse=True)
+    def small_context(self, monkeypatch):
+        from app.services import rag_service
+
+        monkeypatch.setattr(rag_service, "_tokenizer", None)
+        monkeypatch.setattr(rag_service, "_encoding", None)
+        monkeypatch.setattr(rag_service.settings, "VLLM_MAX_MODEL_LEN", 1024)
+        monkeypatch.setattr(rag_service.settings, "RAG_MIN_CONTEXT_TOKENS", 512)
+
+    @staticmethod
+    def _docs(count):
+        # ~160 tokens each under the chars/4 estimate
+        return [
+            {
+                "document_id": str(i), "filename": f"doc{i}.pdf", "score": 1.0,
+                "content": f"doc{i} " + "x" * 600, "metadata": {},
+            }
+            for i in range(count)
+        ]
+
+    def test_packs_documents_within_budget(self):
+        from app.services.rag_service import RAGService
+
+        # 15% of the 768-token budget is held back while approximating
+        prompt, packed = RAGService()._pack_prompt("query", self._docs(5), max_tokens=256)
+        assert [doc["filename"] for doc in packed] == ["doc0.pdf", "doc1.pdf", "doc2.pdf"]
+        assert "doc2 " in prompt
+        assert "doc3 " not in prompt
+
+    def test_exact_tokenizer_shrinks_slack(self, monkeypatch):
+        from app.services import rag_service
+        from app.services.rag_service import RAGService
+
+        tokenizer = MagicMock()
+        tokenizer.encode.side_effect = lambda text, add_special_tokens: MagicMock(ids=[0] * (len(text) // 4 + 1))
+        monkeypatch.setattr(rag_service, "_tokenizer", tokenizer)
+
+        prompt, packed = RAGService()._pack_prompt("query", self._docs(5), max_tokens=256)
+        assert len(packed) == 4
+
+    def test_estimate_counts_non_ascii_per_character(self):
+        from app.services.rag_service import count_tokens
+
+        assert count_tokens("abcd" * 10) == 11
+        assert count_tokens("안녕하세요" * 10) == 51
+
+    def test_clamps_max_tokens_to_keep_context(self):
+        from app.services.rag_service import RAGService, clamp_max_tokens
+
+        assert clamp_max_tokens(4096) == 512
+        prompt, packed = RAGService()._pack_prompt("query", self._docs(5), max_tokens=4096)
+        assert len(packed) == 2
+        assert "doc0 " in prompt
+
+    @pytest.mark.asyncio
+    async def test_returns_only_packed_documents(self):
+        from app.services.rag_service import RAGService
+
+        rag = RAGService()
+        user = MagicMock(usr_name="u", dept_id=1, role_id=1)
+        llm_response = {"choices": [{"text": " answer "}], "usage": {"total_tokens": 10}}
+        with patch("app.services.rag_service.build_qdrant_filter", return_value={}), \
+                patch.object(rag, "_retrieve_context", AsyncMock(return_value=self._docs(5))), \
+                patch("app.services.rag_service.vllm_service.generate", AsyncMock(return_value=llm_response)) as generate:
+            result = await rag.generate_answer("query", user, max_tokens=4096)
+
+        assert [doc["filename"] for doc in result["retrieved_documents"]] == ["doc0.pdf", "doc1.pdf"]
+        assert generate.await_args.kwargs["max_tokens"] == 512
+
+
+class TestRAGServiceCoalescing:
+    @staticmethod
+    def _user():
+        return MagicMock(usr_name="u", dept_id=1, role_id=1)
+
+    @pytest.mark.asyncio
+    async def test_identical_concurrent_calls_share_one_run(self):
+        import asyncio
+        from app.services.rag_service import RAGService
+
+        rag = RAGService()
+        release = asyncio.Event()
+
+        async def run(*args):
+            await release.wait()
+            return {"response": "answer"}
+
+        with patch("app.services.rag_service.build_qdrant_filter", return_value={"dept": 1}), \
+                patch.object(rag, "_run_pipeline", AsyncMock(side_effect=run)) as pipeline:
+            calls = asyncio.gather(
+                rag.generate_answer("query", self._user()),
+                rag.generate_answer("query", self._user()),
+            )
+            await asyncio.sleep(0)
+            release.set()
+            first, second = await calls
+
+        assert pipeline.await_count == 1
+        assert first == second == {"response": "answer"}
+        assert rag._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_exception_reaches_every_waiter(self):
+        import asyncio
+        from app.services.rag_service import RAGService
+
+        rag = RAGService()
+        release = asyncio.Event()
+
+        async def run(*args):
+            await release.wait()
+            raise RuntimeError("vllm down")
+
+        with patch("app.services.rag_service.build_qdrant_filter", return_value={"dept": 1}), \
+                patch.object(rag, "_run_pipeline", AsyncMock(side_effect=run)) as pipeline:
+            calls = asyncio.gather(
+                rag.generate_answer("query", self._user()),
+                rag.generate_answer("query", self._user()),
+                return_exceptions=True,
+            )
+            await asyncio.sleep(0)
+            release.set()
+            results = await calls
+
+        assert pipeline.await_count == 1
+        assert [str(result) for result in results] == ["vllm down", "vllm down"]
+
+    @pytest.mark.asyncio
+    async def test_failure_after_all_callers_cancel_is_retrieved(self):
+        import asyncio
+        import gc
+        from app.services.rag_service import RAGService
+
+        rag = RAGService()
+        release = asyncio.Event()
+        unretrieved = []
+        loop = asyncio.get_running_loop()
+        loop.set_exception_handler(lambda loop, context: unretrieved.append(context))
+
+        async def run(*args):
+            await release.wait()
+            raise RuntimeError("vllm down")
+
+        with patch("app.services.rag_service.build_qdrant_filter", return_value={"dept": 1}), \
+                patch.object(rag, "_run_pipeline", AsyncMock(side_effect=run)):
+            caller = asyncio.ensure_future(rag.generate_answer("query", self._user()))
+            await asyncio.sleep(0)
+            pending = next(iter(rag._inflight.values()))
+            caller.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await caller
+            release.set()
+            while not pending.done():
+                await asyncio.sleep(0)
+        del pending
+        gc.collect()
+        assert unretrieved == []
+
+
+class TestRAGServiceStreaming:
+    @pytest.mark.asyncio
+    async def test_token_count_comes_from_vllm_usage(self):
+        import orjson
+        from app.services.rag_service import RAGService
+
+        rag = RAGService()
+        docs = [{"document_id": "1", "filename": "a.pdf", "score": 1.0, "content": "text", "metadata": {}}]
+        chunks = [
+            {"choices": [{"text": "Hello"}]},
+            {"choices": [{"text": " world"}]},
+            {"choices": [{"text": ""}], "usage": {"prompt_tokens": 40, "completion_tokens": 3, "total_tokens": 43}},
+        ]
+
+        async def generate_stream(**kwargs):
+            for chunk in chunks:
+                yield orjson.dumps(chunk).decode()
+
+        user = MagicMock(usr_name="u", dept_id=1, role_id=1)
+        with patch("app.services.rag_service.build_qdrant_filter", return_value={}), \
+                patch.object(rag, "_retrieve_context", AsyncMock(return_value=docs)), \
+                patch("app.services.rag_service.vllm_service.generate_stream", generate_stream):
+            events = [event async for event in rag.stream_answer("query", user)]
+
+        assert [event["token"] for event in events[:-1]] == ["Hello", " world"]
+        assert events[-1]["token_count"] == 43
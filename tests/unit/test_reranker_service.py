@@ -37,6 +37,12 @@ class TestRerankerEndpoints:
         data = response.json()
         assert data["status"] == "healthy"
 
+    def test_ready_endpoint_before_warmup(self, client):
+        # Startup warmup does not run without the TestClient context manager
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming_up"
+
     def test_rerank_requires_query(self, client):
         response = client.post("/rerank", json={"documents": ["doc1"]})
         assert response.status_code == 422
@@ -48,3 +54,52 @@ class TestRerankerEndpoints:
     def test_rerank_empty_documents(self, client):
         response = client.post("/rerank", json={"query": "test", "documents": []})
         assert response.status_code == 422
+
+    def test_rerank_accepts_zstd_body(self, client):
+        zstandard = pytest.importorskip("zstandard")
+        body = zstandard.ZstdCompressor().compress(b'{"query": "test"}')
+        response = client.post(
+            "/rerank",
+            content=body,
+            headers={"content-type": "application/json", "content-encoding": "zstd"},
+        )
+        # Body was decompressed and validated (missing documents), not rejected as garbage
+        assert response.status_code == 422
+
+    def test_rerank_rejects_corrupt_zstd_body(self, client):
+        pytest.importorskip("zstandard")
+        response = client.post(
+            "/rerank",
+            content=b"not zstd",
+            headers={"content-type": "application/json", "content-encoding": "zstd"},
+        )
+        assert response.status_code == 400
+
+    def test_rerank_stream_requires_query_header(self, client):
+        body = b'"just a document"\n"another"\n'
+        response = client.post(
+            "/rerank_stream", content=body, headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 422
+
+    def test_rerank_stream_requires_documents(self, client):
+        body = b'{"query": "test", "top_k": 3}\n'
+        response = client.post(
+            "/rerank_stream", content=body, headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 422
+
+    @pytest.mark.parametrize("top_k", ['"3"', "0", "-1", "2.5", "true"])
+    def test_rerank_stream_rejects_invalid_top_k(self, client, top_k):
+        body = b'{"query": "test", "top_k": %s}\n"doc"\n' % top_k.encode()
+        response = client.post(
+            "/rerank_stream", content=body, headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 422
+
+    def test_rerank_stream_rejects_invalid_line(self, client):
+        body = b'{"query": "test"}\nnot-json\n'
+        response = client.post(
+            "/rerank_stream", content=body, headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 422
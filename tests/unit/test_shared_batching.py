@@ -0,0 +1,124 @@
+"""Unit tests for shared.batching module."""
+import asyncio
+
+import pytest
+from shared.batching import AsyncBatcher
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class TestAsyncBatcher:
+    def test_coalesces_concurrent_submissions(self):
+        calls = []
+
+        def process(items):
+            calls.append(list(items))
+            return [item * 2 for item in items]
+
+        async def main():
+            batcher = AsyncBatcher(process, max_batch=64, max_wait_ms=50)
+            results = await asyncio.gather(
+                batcher.submit([1, 2]),
+                batcher.submit([3]),
+                batcher.submit([4, 5, 6]),
+            )
+            await batcher.stop()
+            return results
+
+        results = _run(main())
+        assert results == [[2, 4], [6], [8, 10, 12]]
+        assert calls == [[1, 2, 3, 4, 5, 6]]
+
+    def test_respects_max_batch(self):
+        calls = []
+
+        def process(items):
+            calls.append(len(items))
+            return items
+
+        async def main():
+            batcher = AsyncBatcher(process, max_batch=3, max_wait_ms=50)
+            results = await asyncio.gather(
+                batcher.submit([1, 2]),
+                batcher.submit([3, 4]),
+            )
+            await batcher.stop()
+            return results
+
+        assert _run(main()) == [[1, 2], [3, 4]]
+        assert calls == [2, 2]
+
+    def test_respects_max_cost(self):
+        calls = []
+
+        def process(items):
+            calls.append(list(items))
+            return items
+
+        async def main():
+            batcher = AsyncBatcher(
+                process, max_batch=64, max_wait_ms=50, max_cost=10, cost_fn=len,
+            )
+            results = await asyncio.gather(
+                batcher.submit(["aaaaaa"]),
+                batcher.submit(["bbbbbb"]),
+            )
+            await batcher.stop()
+            return results
+
+        assert _run(main()) == [["aaaaaa"], ["bbbbbb"]]
+        assert calls == [["aaaaaa"], ["bbbbbb"]]
+
+    def test_propagates_errors_to_all_callers(self):
+        def process(items):
+            raise RuntimeError("model failed")
+
+        async def main():
+            batcher = AsyncBatcher(process, max_wait_ms=20)
+            results = await asyncio.gather(
+                batcher.submit([1]),
+                batcher.submit([2]),
+                return_exceptions=True,
+            )
+            await batcher.stop()
+            return results
+
+        results = _run(main())
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    def test_recovers_after_error(self):
+        state = {"fail": True}
+
+        def process(items):
+            if state.pop("fail", False):
+                raise RuntimeError("transient")
+            return items
+
+        async def main():
+            batcher = AsyncBatcher(process, max_wait_ms=1)
+            with pytest.raises(RuntimeError):
+                await batcher.submit([1])
+            result = await batcher.submit([2])
+            await batcher.stop()
+            return result
+
+        assert _run(main()) == [2]
+
+    def test_async_process_fn(self):
+        calls = []
+
+        async def process(items):
+            calls.append(list(items))
+            await asyncio.sleep(0)
+            return [item + 1 for item in items]
+
+        async def main():
+            batcher = AsyncBatcher(process, max_batch=8, max_wait_ms=50)
+            results = await asyncio.gather(batcher.submit([1]), batcher.submit([2, 3]))
+            await batcher.stop()
+            return results
+
+        assert _run(main()) == [[2], [3, 4]]
+        assert calls == [[1, 2, 3]]
@@ -1,5 +1,6 @@
 """Unit tests for shared.config module."""
 import pytest
+from pydantic import ValidationError
 from shared.config import BaseServiceSettings, GPUServiceSettings
 
 
@@ -24,6 +25,11 @@ class TestBaseServiceSettings:
         assert settings.LOG_LEVEL == "DEBUG"
 
 
+    def test_embed_client_batch_capped_at_request_limit(self, monkeypatch):
+        monkeypatch.setenv("EMBED_CLIENT_MAX_BATCH", "256")
+        with pytest.raises(ValidationError):
+            BaseServiceSettings()
+
 class TestGPUServiceSettings:
     def test_inherits_base(self):
         settings = GPUServiceSettings()
@@ -38,3 +44,15 @@ class TestGPUServiceSettings:
         settings = GPUServiceSettings()
         assert settings.CUDA_VISIBLE_DEVICES == "0,1"
         assert settings.MODEL_PATH == "/models/test"
+
+
+class TestSettingsFactories:
+    def test_settings_are_frozen(self):
+        settings = BaseServiceSettings()
+        with pytest.raises(ValidationError):
+            settings.SERVICE_PORT = 1234
+
+    def test_factories_return_cached_instance(self):
+        from shared.config import get_base_settings, get_gpu_settings
+        assert get_base_settings() is get_base_settings()
+        assert get_gpu_settings() is get_gpu_settings()
@@ -0,0 +1,170 @@
+"""Unit tests for shared.fastapi_utils module."""
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import Depends, Request
+from fastapi.testclient import TestClient
+from shared.fastapi_utils import create_service_app, get_client
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+class TestClientFactories:
+    def test_clients_injected_and_closed(self):
+        app = create_service_app(
+            title="test", description="test", client_factories={"fake": FakeClient},
+        )
+
+        @app.get("/client")
+        async def client_endpoint(client: FakeClient = Depends(get_client("fake"))):
+            return {"closed": client.closed, "shared": client is app.state.clients["fake"]}
+
+        with TestClient(app) as http:
+            assert http.get("/client").json() == {"closed": False, "shared": True}
+            client = app.state.clients["fake"]
+        assert client.closed
+
+    def test_runs_explicit_lifespan(self):
+        events = []
+
+        @asynccontextmanager
+        async def lifespan(app):
+            events.append(("start", "fake" in app.state.clients))
+            yield
+            events.append(("stop", app.state.clients["fake"].closed))
+
+        app = create_service_app(
+            title="test", description="test",
+            lifespan=lifespan, client_factories={"fake": FakeClient},
+        )
+        with TestClient(app):
+            pass
+        assert events == [("start", True), ("stop", False)]
+
+
+class TestCreateServiceApp:
+    def test_default_response_class_is_orjson(self):
+        from fastapi.responses import ORJSONResponse
+
+        app = create_service_app(title="test", description="test")
+
+        @app.get("/values")
+        async def values():
+            return {"scores": [0.5, 1.25]}
+
+        assert app.router.default_response_class is ORJSONResponse
+        with TestClient(app) as http:
+            response = http.get("/values")
+        assert response.json() == {"scores": [0.5, 1.25]}
+        assert response.content == b'{"scores":[0.5,1.25]}'
+
+    def test_gzip_large_responses(self):
+        app = create_service_app(title="test", description="test", gzip_minimum_size=1024)
+
+        @app.get("/big")
+        async def big():
+            return {"values": [0.125] * 1000}
+
+        @app.get("/small")
+        async def small():
+            return {"ok": True}
+
+        with TestClient(app) as http:
+            big_response = http.get("/big", headers={"Accept-Encoding": "gzip"})
+            small_response = http.get("/small", headers={"Accept-Encoding": "gzip"})
+        assert big_response.headers["content-encoding"] == "gzip"
+        assert big_response.json()["values"][0] == 0.125
+        assert "content-encoding" not in small_response.headers
+
+
+class TestZstdRequestMiddleware:
+    def _app(self, **kwargs):
+        from shared.fastapi_utils import ZstdRequestMiddleware
+
+        app = create_service_app(title="test", description="test")
+        app.add_middleware(ZstdRequestMiddleware, **kwargs)
+
+        @app.post("/echo")
+        async def echo(request: Request):
+            return {"size": len(await request.body())}
+
+        return app
+
+    def test_parses_content_encoding_value(self):
+        zstandard = pytest.importorskip("zstandard")
+        body = zstandard.ZstdCompressor().compress(b"x" * 100)
+        with TestClient(self._app()) as http:
+            response = http.post("/echo", content=body, headers={"Content-Encoding": " ZSTD "})
+        assert response.json() == {"size": 100}
+
+    def test_oversized_body_is_413(self):
+        zstandard = pytest.importorskip("zstandard")
+        body = zstandard.ZstdCompressor().compress(b"x" * 5000)
+        with TestClient(self._app(max_body_size=4096)) as http:
+            response = http.post("/echo", content=body, headers={"Content-Encoding": "zstd"})
+        assert response.status_code == 413
+
+    def test_stacked_encodings_are_415(self):
+        pytest.importorskip("zstandard")
+        with TestClient(self._app()) as http:
+            response = http.post("/echo", content=b"abc", headers={"Content-Encoding": "gzip, zstd"})
+        assert response.status_code == 415
+
+class TestHealthEndpoint:
+    def test_caches_successful_result(self):
+        from shared.fastapi_utils import add_health_endpoint
+
+        calls = []
+
+        def checker():
+            calls.append(1)
+            return {"status": "healthy"}
+
+        app = create_service_app(title="test", description="test")
+        add_health_endpoint(app, checker, ttl_seconds=60)
+        with TestClient(app) as http:
+            assert http.get("/health").json() == {"status": "healthy"}
+            assert http.get("/health").json() == {"status": "healthy"}
+        assert len(calls) == 1
+
+    def test_failures_are_not_cached(self):
+        from shared.fastapi_utils import add_health_endpoint
+
+        calls = []
+
+        def checker():
+            calls.append(1)
+            raise RuntimeError("gpu lost")
+
+        app = create_service_app(title="test", description="test")
+        add_health_endpoint(app, checker, ttl_seconds=60)
+        with TestClient(app) as http:
+            assert http.get("/health").status_code == 503
+            assert http.get("/health").status_code == 503
+        assert len(calls) == 2
+
+    def test_async_and_sync_checkers(self):
+        import threading
+        from shared.fastapi_utils import add_health_endpoint
+
+        async def async_checker():
+            return {"status": "healthy", "kind": "async"}
+
+        def sync_checker():
+            return {"status": "healthy", "thread": threading.current_thread().name}
+
+        app = create_service_app(title="test", description="test")
+        add_health_endpoint(app, async_checker)
+        sync_app = create_service_app(title="test", description="test")
+        add_health_endpoint(sync_app, sync_checker)
+
+        with TestClient(app) as http:
+            assert http.get("/health").json()["kind"] == "async"
+        with TestClient(sync_app) as http:
+            assert http.get("/health").json()["thread"] != threading.main_thread().name
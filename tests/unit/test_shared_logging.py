@@ -20,3 +20,13 @@ class TestSetupLogging:
     def test_log_level_case_insensitive(self):
         logger = setup_logging("test-case", level="warning")
         assert logger.level == logging.WARNING
+
+    def test_repeated_setup_does_not_duplicate_handlers(self):
+        first = setup_logging("test-idempotent")
+        handlers = list(first.handlers)
+        root_handlers = list(logging.getLogger().handlers)
+        second = setup_logging("test-idempotent")
+        assert second is first
+        assert second.handlers == handlers
+        assert logging.getLogger().handlers == root_handlers
+        assert second.propagate is False
@@ -0,0 +1,359 @@
+"""Unit tests for shared.service_client module."""
+import asyncio
+import threading
+
+from shared.service_client import BatchingEmbeddingClient, EmbeddingClient, RerankerClient
+
+
+class TestServiceClientPooling:
+    def test_reuses_client_within_loop(self):
+        embedding = EmbeddingClient(base_url="http://embedding:8002")
+
+        async def main():
+            first = embedding.client
+            second = embedding.client
+            await embedding.aclose()
+            return first, second
+
+        first, second = asyncio.run(main())
+        assert first is second
+        assert str(first.base_url).startswith("http://embedding:8002")
+
+    def test_rebuilds_client_on_new_loop(self):
+        reranker = RerankerClient(base_url="http://reranker:8004")
+
+        async def get_client():
+            return reranker.client
+
+        first = asyncio.run(get_client())
+        second = asyncio.run(get_client())
+        assert first is not second
+
+    def test_closes_old_client_on_its_running_loop(self):
+        reranker = RerankerClient(base_url="http://reranker:8004")
+        other_loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            async def get_client():
+                return reranker.client
+
+            first = asyncio.run_coroutine_threadsafe(get_client(), other_loop).result(timeout=5)
+            second = asyncio.run(get_client())
+            # The close was queued on other_loop; wait for it to run there
+            asyncio.run_coroutine_threadsafe(asyncio.sleep(0), other_loop).result(timeout=5)
+        finally:
+            other_loop.call_soon_threadsafe(other_loop.stop)
+            thread.join(timeout=5)
+            other_loop.close()
+
+        assert first is not second
+        assert first.is_closed
+        assert not second.is_closed
+
+    def test_context_manager_closes_client(self):
+        async def main():
+            async with EmbeddingClient() as embedding:
+                client = embedding.client
+            return client
+
+        assert asyncio.run(main()).is_closed
+
+
+class FakeEmbeddingClient:
+    def __init__(self):
+        self.calls = []
+
+    async def embed(self, texts, normalize=True, batch_size=32, format="json"):
+        self.calls.append(list(texts))
+        return {"embeddings": [[float(len(t))] for t in texts], "model": "fake"}
+
+    async def aclose(self):
+        pass
+
+
+class TestBatchingEmbeddingClient:
+    def test_coalesces_concurrent_embeds(self):
+        fake = FakeEmbeddingClient()
+        batching = BatchingEmbeddingClient(fake, max_batch=16, max_wait_ms=50)
+
+        async def main():
+            results = await asyncio.gather(
+                batching.embed(["a", "bb"]),
+                batching.embed(["ccc"]),
+            )
+            await batching.aclose()
+            return results
+
+        first, second = asyncio.run(main())
+        assert fake.calls == [["a", "bb", "ccc"]]
+        assert first["embeddings"] == [[1.0], [2.0]]
+        assert second["embeddings"] == [[3.0]]
+        assert second["model"] == "fake"
+
+    def test_deduplicates_identical_texts(self):
+        fake = FakeEmbeddingClient()
+        batching = BatchingEmbeddingClient(fake, max_batch=16, max_wait_ms=50)
+
+        async def main():
+            results = await asyncio.gather(
+                batching.embed(["header", "a"]),
+                batching.embed(["header", "bb", "a"]),
+            )
+            await batching.aclose()
+            return results
+
+        first, second = asyncio.run(main())
+        assert fake.calls == [["header", "a", "bb"]]
+        assert first["embeddings"] == [[6.0], [1.0]]
+        assert second["embeddings"] == [[6.0], [2.0], [1.0]]
+
+
+    def test_does_not_forward_max_batch_as_batch_size(self):
+        fake = FakeEmbeddingClient()
+        seen = []
+
+        async def embed(texts, normalize=True, batch_size=32, format="json"):
+            seen.append(batch_size)
+            return {"embeddings": [[0.0]] * len(texts), "model": "fake"}
+
+        fake.embed = embed
+        batching = BatchingEmbeddingClient(fake, max_batch=256, max_wait_ms=1)
+
+        async def main():
+            await batching.embed(["a"] * 3 + ["b"])
+            await batching.aclose()
+
+        asyncio.run(main())
+        # /embed rejects batch_size > 128
+        assert seen == [32]
+
+    def test_limits_default_to_settings(self):
+        from shared.config import get_base_settings
+
+        batching = BatchingEmbeddingClient(FakeEmbeddingClient())
+        settings = get_base_settings()
+        assert batching.max_batch == settings.EMBED_CLIENT_MAX_BATCH
+        assert batching._batchers[True].max_wait == settings.EMBED_CLIENT_MAX_WAIT_MS / 1000.0
+
+    def test_caps_request_tokens(self):
+        fake = FakeEmbeddingClient()
+        # each 40-char text is ~11 tokens; 3 fit in a 35-token request
+        batching = BatchingEmbeddingClient(fake, max_batch=16, max_wait_ms=20, max_tokens=35)
+        texts = [str(i) * 40 for i in range(7)]
+
+        async def main():
+            result = await batching.embed(texts)
+            await batching.aclose()
+            return result
+
+        result = asyncio.run(main())
+        assert [len(call) for call in fake.calls] == [3, 3, 1]
+        assert result["embeddings"] == [[40.0]] * 7
+
+    def test_splits_fp16_calls_and_concatenates(self):
+        import numpy as np
+
+        class FakeFP16Client(FakeEmbeddingClient):
+            async def embed(self, texts, normalize=True, batch_size=32, format="json"):
+                self.calls.append(list(texts))
+                return {"embeddings": np.array([[len(t)] for t in texts], dtype="<f2"), "model": "fake"}
+
+        fake = FakeFP16Client()
+        batching = BatchingEmbeddingClient(fake, max_batch=2, max_wait_ms=1, format="fp16")
+
+        async def main():
+            result = await batching.embed(["a", "bb", "ccc"])
+            await batching.aclose()
+            return result
+
+        result = asyncio.run(main())
+        assert [len(call) for call in fake.calls] == [2, 1]
+        assert result["embeddings"].tolist() == [[1.0], [2.0], [3.0]]
+
+class TestOCRClientUpload:
+    def test_streams_multipart_upload(self, tmp_path):
+        import httpx
+        from fastapi import FastAPI, File, Form, UploadFile
+        from shared.service_client import OCRClient, UPLOAD_CHUNK_SIZE
+
+        app = FastAPI()
+
+        @app.post("/ocr")
+        async def ocr(file: UploadFile = File(...), language: str = Form("en")):
+            data = await file.read()
+            return {
+                "filename": file.filename,
+                "content_type": file.content_type,
+                "size": len(data),
+                "ok": data == payload,
+                "language": language,
+            }
+
+        payload = bytes(range(256)) * (UPLOAD_CHUNK_SIZE // 128 + 3)
+        image = tmp_path / "scan.png"
+        image.write_bytes(payload)
+        ocr_client = OCRClient(base_url="http://ocr")
+
+        async def main():
+            ocr_client._client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://ocr",
+            )
+            ocr_client._loop = asyncio.get_running_loop()
+            try:
+                return await ocr_client.ocr(str(image), language="ko")
+            finally:
+                await ocr_client.aclose()
+
+        assert asyncio.run(main()) == {
+            "filename": "scan.png",
+            "content_type": "image/png",
+            "size": len(payload),
+            "ok": True,
+            "language": "ko",
+        }
+
+
+class TestResponseAdapters:
+    def test_rerank_adapter_decodes_bytes_to_dict(self):
+        from shared.models import RERANK_RESPONSE_ADAPTER
+
+        payload = (
+            b'{"results":[{"index":1,"document":"b","relevance_score":2.5}],'
+            b'"model":"m","query":"q","total_documents":2}'
+        )
+        result = RERANK_RESPONSE_ADAPTER.validate_json(payload)
+        assert isinstance(result, dict)
+        assert result["results"][0] == {"index": 1, "document": "b", "relevance_score": 2.5}
+        assert result["total_documents"] == 2
+
+    def test_embed_adapter_rejects_malformed_payload(self):
+        import pytest
+        from pydantic import ValidationError
+        from shared.models import EMBED_RESPONSE_ADAPTER
+
+        with pytest.raises(ValidationError):
+            EMBED_RESPONSE_ADAPTER.validate_json(b'{"embeddings": "oops"}')
+
+
+class TestB64Embeddings:
+    def test_decodes_float16_payload(self):
+        import base64
+        import numpy as np
+        from shared.service_client import decode_b64_embeddings
+
+        arr = np.array([[0.5, -1.0, 0.25], [1.0, 0.0, 2.0]], dtype="<f2")
+        payload = {
+            "shape": [2, 3],
+            "dtype": "float16",
+            "data": base64.b64encode(arr.tobytes()).decode("ascii"),
+            "model": "m",
+            "dimension": 3,
+            "count": 2,
+        }
+        result = decode_b64_embeddings(payload)
+        assert result["embeddings"].shape == (2, 3)
+        assert result["embeddings"].dtype == np.float16
+        assert result["embeddings"].tolist() == arr.tolist()
+        assert result["count"] == 2
+
+    def test_decodes_raw_fp16_response(self):
+        import httpx
+        import numpy as np
+        from shared.service_client import decode_fp16_embeddings
+
+        arr = np.array([[0.5, -1.0], [0.25, 2.0], [1.0, 0.0]], dtype="<f2")
+        response = httpx.Response(
+            200, content=arr.tobytes(), headers={"X-Shape": "3,2", "X-Model": "m"},
+        )
+        result = decode_fp16_embeddings(response)
+        assert result["embeddings"].tolist() == arr.tolist()
+        assert (result["model"], result["dimension"], result["count"]) == ("m", 2, 3)
+
+
+class TestEmbedMany:
+    def test_dispatches_batches_concurrently(self):
+        embedding = EmbeddingClient(base_url="http://embedding")
+        in_flight = {"now": 0, "peak": 0}
+
+        async def fake_embed(texts, normalize=True, batch_size=32, format="json"):
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+            return {"embeddings": [[float(len(t))] for t in texts]}
+
+        embedding.embed = fake_embed
+        results = asyncio.run(embedding.embed_many([["a"], ["bb", "ccc"]]))
+        assert [r["embeddings"] for r in results] == [[[1.0]], [[2.0], [3.0]]]
+        assert in_flight["peak"] == 2
+
+
+class TestServiceTimeouts:
+    def test_default_timeout_from_settings(self):
+        from shared.service_client import OCRClient
+
+        timeout = OCRClient().timeout
+        assert timeout.read == 120.0
+        assert timeout.write == 120.0
+        assert timeout.connect == 2.0
+        assert timeout.pool == 2.0
+
+    def test_explicit_timeout_wins(self):
+        assert RerankerClient(timeout=5.0).timeout == 5.0
+
+
+class TestServiceRegistry:
+    def test_health_all_reports_each_service(self):
+        import httpx
+        from fastapi import FastAPI, HTTPException
+        from shared.service_client import ChunkingClient, ServiceRegistry
+
+        up = FastAPI()
+        down = FastAPI()
+
+        @up.get("/health")
+        async def healthy():
+            return {"status": "healthy"}
+
+        @down.get("/health")
+        async def unhealthy():
+            raise HTTPException(status_code=503)
+
+        clients = {"chunking": ChunkingClient(base_url="http://up"),
+                   "reranker": RerankerClient(base_url="http://down")}
+
+        async def main():
+            for client, asgi in zip(clients.values(), (up, down)):
+                client._client = httpx.AsyncClient(
+                    transport=httpx.ASGITransport(app=asgi), base_url=client.base_url,
+                )
+                client._loop = asyncio.get_running_loop()
+            async with ServiceRegistry(clients) as registry:
+                return await registry.health_all()
+
+        results = asyncio.run(main())
+        assert results["chunking"] == {"status": "healthy"}
+        assert results["reranker"]["status"] == "unhealthy"
+
+
+class TestWarmup:
+    def test_warmup_swallows_connection_errors(self):
+        import httpx
+
+        def refuse(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        reranker = RerankerClient(base_url="http://reranker")
+
+        async def main():
+            reranker._client = httpx.AsyncClient(
+                transport=httpx.MockTransport(refuse), base_url="http://reranker",
+            )
+            reranker._loop = asyncio.get_running_loop()
+            try:
+                return await reranker.warmup()
+            finally:
+                await reranker.aclose()
+
+        assert asyncio.run(main()) is False
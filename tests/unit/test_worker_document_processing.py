@@ -0,0 +1,245 @@
+"""Unit tests for worker document processing (services and stores mocked)."""
+import asyncio
+import contextlib
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../worker"))
+
+pytest.importorskip("celery")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("qdrant_client")
+pytest.importorskip("redis")
+
+import numpy as np
+
+from tasks import document_processing as dp
+
+
+def no_stage(name):
+    return contextlib.nullcontext()
+
+
+class TestSplitSections:
+    def test_short_text_is_one_section(self):
+        assert dp.split_sections("short text", 100) == ["short text"]
+
+    def test_prefers_paragraph_breaks(self):
+        text = "aaaa\nbbbb\n\ncccc\ndddd"
+        assert dp.split_sections(text, 15) == ["aaaa\nbbbb", "\n\ncccc\ndddd"]
+
+    def test_falls_back_to_line_then_hard_breaks(self):
+        assert dp.split_sections("aaaa\nbbbbbbbb", 10) == ["aaaa", "\nbbbbbbbb"]
+        assert dp.split_sections("x" * 25, 10) == ["x" * 10, "x" * 10, "x" * 5]
+
+    def test_sections_rejoin_to_text(self):
+        text = "\n\n".join(f"paragraph {i} " + "word " * 30 for i in range(20))
+        sections = dp.split_sections(text, 500)
+        assert "".join(sections) == text
+        assert all(len(section) <= 500 for section in sections)
+
+
+class FakeCache:
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.stored = {}
+
+    async def get_many(self, texts, normalize):
+        return [self.vectors.get(text) for text in texts]
+
+    async def set_many(self, texts, normalize, vectors):
+        self.stored.update(zip(texts, vectors.tolist()))
+
+
+class FakeBatcher:
+    def __init__(self):
+        self.calls = []
+
+    async def embed(self, texts, normalize=True):
+        self.calls.append(list(texts))
+        return {"embeddings": np.array([[float(ord(t[0])), 0.0] for t in texts], dtype=np.float16)}
+
+
+class TestEmbedChunks:
+    def test_dedupes_and_splices_cached_vectors(self, monkeypatch):
+        cache = FakeCache({"b": np.array([2.0, 2.0], dtype=np.float16)})
+        batcher = FakeBatcher()
+        monkeypatch.setattr(dp, "embedding_cache", cache)
+        monkeypatch.setattr(dp, "embedding_batcher", batcher)
+
+        embeddings = asyncio.run(dp.embed_chunks_async(["a", "b", "a", "c"]))
+
+        assert batcher.calls == [["a", "c"]]
+        assert embeddings.dtype == np.float32
+        assert embeddings.tolist() == [[97.0, 0.0], [2.0, 2.0], [97.0, 0.0], [99.0, 0.0]]
+        assert set(cache.stored) == {"a", "c"}
+
+    def test_all_cached_skips_service(self, monkeypatch):
+        cache = FakeCache({"a": np.array([1.0, 0.0], dtype=np.float16)})
+        batcher = FakeBatcher()
+        monkeypatch.setattr(dp, "embedding_cache", cache)
+        monkeypatch.setattr(dp, "embedding_batcher", batcher)
+
+        embeddings = asyncio.run(dp.embed_chunks_async(["a", "a"]))
+
+        assert batcher.calls == []
+        assert embeddings.tolist() == [[1.0, 0.0], [1.0, 0.0]]
+
+    def test_without_cache(self, monkeypatch):
+        batcher = FakeBatcher()
+        monkeypatch.setattr(dp, "embedding_cache", None)
+        monkeypatch.setattr(dp, "embedding_batcher", batcher)
+
+        embeddings = asyncio.run(dp.embed_chunks_async(["a", "b"]))
+
+        assert batcher.calls == [["a", "b"]]
+        assert embeddings.shape == (2, 2)
+
+    def test_service_failure_returns_empty(self, monkeypatch):
+        class FailingBatcher:
+            async def embed(self, texts, normalize=True):
+                raise RuntimeError("embedding service down")
+
+        monkeypatch.setattr(dp, "embedding_cache", None)
+        monkeypatch.setattr(dp, "embedding_batcher", FailingBatcher())
+        assert len(asyncio.run(dp.embed_chunks_async(["a"]))) == 0
+
+
+class TestChunkAndEmbed:
+    @pytest.fixture(autouse=True)
+    def small_sections(self, monkeypatch):
+        monkeypatch.setattr(dp, "PIPELINE_SECTION_CHARS", 10)
+
+        async def embed(chunks):
+            return np.ones((len(chunks), 2), dtype=np.float32)
+
+        monkeypatch.setattr(dp, "embed_chunks_async", embed)
+
+    def test_concatenates_sections_in_order(self, monkeypatch):
+        async def chunk(text, **kwargs):
+            return [text.strip()], [1]
+
+        monkeypatch.setattr(dp, "chunk_text_async", chunk)
+        chunks, counts, embeddings = asyncio.run(dp.chunk_and_embed_async("aaaa\n\nbbbb\n\ncccc", no_stage))
+        assert chunks == ["aaaa", "bbbb", "cccc"]
+        assert counts == [1, 1, 1]
+        assert embeddings.shape == (3, 2)
+
+    def test_one_failed_section_fails_document(self, monkeypatch):
+        async def chunk(text, **kwargs):
+            return ([], []) if "bbbb" in text else ([text.strip()], [1])
+
+        monkeypatch.setattr(dp, "chunk_text_async", chunk)
+        chunks, counts, embeddings = asyncio.run(dp.chunk_and_embed_async("aaaa\n\nbbbb\n\ncccc", no_stage))
+        assert chunks == []
+        assert counts == []
+        assert len(embeddings) == 0
+
+
+class TestExtractStage:
+    @pytest.fixture(autouse=True)
+    def services(self, monkeypatch):
+        monkeypatch.setattr(dp, "text_cache", None)
+
+        async def ocr(file_path):
+            return {"text": "scanned"}
+
+        monkeypatch.setattr(dp.ocr_client, "ocr", ocr)
+        monkeypatch.setitem(dp.EXTRACTORS, ".txt", lambda file_path: "parsed")
+        monkeypatch.setattr(dp, "drop_cached_pages", lambda file_path: None)
+
+    @staticmethod
+    def _stage(entered):
+        def stage(name):
+            entered.append(name)
+            return contextlib.nullcontext()
+        return stage
+
+    def test_only_ocr_holds_the_ocr_stage(self):
+        entered = []
+        assert asyncio.run(dp.extract_text_async("a.png", ".png", None, self._stage(entered))) == "scanned"
+        assert asyncio.run(dp.extract_text_async("a.txt", ".txt", None, self._stage(entered))) == "parsed"
+        assert entered == ["ocr"]
+
+
+class TestDocumentClaim:
+    @staticmethod
+    def _engine(row):
+        conn = MagicMock()
+        conn.execute.return_value.mappings.return_value.one.return_value = row
+        engine = MagicMock()
+        engine.begin.return_value.__enter__.return_value = conn
+        return engine, conn
+
+    def test_upsert_claims_row_in_one_statement(self, monkeypatch):
+        engine, conn = self._engine({"doc_id": 5, "existing_doc_id": 5})
+        monkeypatch.setattr(dp, "get_db_engine", lambda: engine)
+
+        row = dp.upsert_document_metadata(
+            filename="a.pdf", file_path="/nas/a.pdf", file_type=".pdf", file_size=10,
+            file_hash="h", dept_id=1, role_id=2, mtime_ns=3,
+        )
+
+        assert row == {"doc_id": 5, "existing_doc_id": 5}
+        statement, params = conn.execute.call_args.args
+        assert statement is dp._UPSERT_DOCUMENT
+        assert params["hash"] == "h"
+        assert params["size"] == 10
+        assert params["path"] == "/nas/a.pdf"
+
+    def test_unchanged_document_is_skipped(self, monkeypatch, tmp_path):
+        path = tmp_path / "a.pdf"
+        path.write_bytes(b"pdf")
+        monkeypatch.setattr(dp, "upsert_document_metadata", lambda **kwargs: {"doc_id": None, "existing_doc_id": 5})
+        extract = MagicMock()
+        monkeypatch.setattr(dp, "extract_text_async", extract)
+
+        result = asyncio.run(dp.process_document_async(str(path), "h", 1, 2))
+
+        assert result == {"status": "skipped", "reason": "unchanged", "doc_id": 5}
+        extract.assert_not_called()
+
+    def test_claimed_document_without_text_is_marked_failed(self, monkeypatch, tmp_path):
+        path = tmp_path / "a.pdf"
+        path.write_bytes(b"pdf")
+        marked = []
+        monkeypatch.setattr(dp, "upsert_document_metadata", lambda **kwargs: {"doc_id": 9, "existing_doc_id": None})
+        monkeypatch.setattr(dp, "mark_document_status", lambda doc_id, status: marked.append((doc_id, status)))
+
+        async def extract(*args):
+            return ""
+
+        monkeypatch.setattr(dp, "extract_text_async", extract)
+
+        result = asyncio.run(dp.process_document_async(str(path), "h", 1, 2))
+
+        assert result == {"status": "skipped", "reason": "no_text"}
+        assert marked == [(9, "failed")]
+
+
+class TestProcessDocumentBatch:
+    def test_runs_documents_concurrently_with_shared_limits(self, monkeypatch):
+        seen = []
+        both_started = asyncio.Event()
+
+        async def process(file_path, file_hash, dept_id, role_id, limits=None):
+            seen.append((file_path, limits))
+            if len(seen) == 2:
+                both_started.set()
+            # Deadlocks unless the two documents run concurrently
+            await asyncio.wait_for(both_started.wait(), timeout=5)
+            return {"status": "completed" if file_path == "a" else "failed"}
+
+        monkeypatch.setattr(dp, "process_document_async", process)
+        documents = [
+            {"file_path": name, "file_hash": name, "dept_id": 1, "role_id": 1} for name in ("a", "b")
+        ]
+
+        results = dp.process_document_batch(documents)
+
+        assert results == [{"status": "completed"}, {"status": "failed"}]
+        assert seen[0][1] is seen[1][1]
+        assert set(seen[0][1]) == {"ocr", "chunk", "embed"}
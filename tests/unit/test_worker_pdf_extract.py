@@ -0,0 +1,79 @@
+"""Unit tests for worker PDF extraction (PyMuPDF and the process pool mocked)."""
+import os
+import sys
+import threading
+import types
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../worker"))
+
+from tasks import pdf_extract
+
+
+class FakeDocument:
+    page_count = 100
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return iter([])
+
+
+class BrokenPool:
+    def submit(self, *args):
+        raise BrokenProcessPool("worker died")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+@pytest.fixture
+def large_pdf(monkeypatch):
+    monkeypatch.setitem(sys.modules, "pymupdf", types.SimpleNamespace(open=lambda path: FakeDocument()))
+    monkeypatch.setattr(pdf_extract, "PDF_EXTRACT_PROCESSES", 4)
+    monkeypatch.setattr(pdf_extract, "PDF_PARALLEL_MIN_PAGES", 64)
+    monkeypatch.setattr(pdf_extract, "extract_page_range", lambda path, start, end: f"{start}-{end}")
+    monkeypatch.setattr(pdf_extract, "_pool", None)
+
+
+class TestPool:
+    def test_one_pool_across_threads(self, monkeypatch):
+        created = []
+
+        def executor(**kwargs):
+            created.append(kwargs)
+            return BrokenPool()
+
+        monkeypatch.setattr(pdf_extract, "_pool", None)
+        monkeypatch.setattr(pdf_extract, "ProcessPoolExecutor", executor)
+        barrier = threading.Barrier(8)
+
+        def get():
+            barrier.wait()
+            pdf_extract._get_pool()
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(created) == 1
+
+
+class TestExtractPdf:
+    def test_broken_pool_is_reset_and_falls_back(self, large_pdf, monkeypatch):
+        monkeypatch.setattr(pdf_extract, "_pool", BrokenPool())
+        monkeypatch.setattr(pdf_extract, "_can_spawn", lambda: True)
+        assert pdf_extract.extract_pdf("doc.pdf") == "0-100"
+        assert pdf_extract._pool is None
+
+    def test_daemonic_process_extracts_in_process(self, large_pdf, monkeypatch):
+        monkeypatch.setattr(pdf_extract, "_can_spawn", lambda: False)
+        monkeypatch.setattr(pdf_extract, "_get_pool", lambda: pytest.fail("pool started"))
+        assert pdf_extract.extract_pdf("doc.pdf") == ""
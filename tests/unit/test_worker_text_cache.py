@@ -0,0 +1,55 @@
+"""Unit tests for the worker's extracted-text cache (Redis mocked)."""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../worker"))
+
+pytest.importorskip("redis")
+
+from tasks.text_cache import ExtractedTextCache, text_cache_from_env
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+
+class TestExtractedTextCache:
+    def _cache(self, max_bytes=100):
+        cache = ExtractedTextCache(url="redis://cache:6379/1", ttl_seconds=60, max_bytes=max_bytes)
+        cache._client = FakeRedis()
+        return cache
+
+    def test_round_trip(self):
+        cache = self._cache()
+
+        async def main():
+            await cache.set("h", "문서 text")
+            return await cache.get("h")
+
+        assert asyncio.run(main()) == "문서 text"
+
+    def test_skips_texts_over_limit(self):
+        cache = self._cache(max_bytes=10)
+
+        async def main():
+            await cache.set("h", "가" * 4)  # 12 UTF-8 bytes
+            return await cache.get("h")
+
+        assert asyncio.run(main()) is None
+        assert cache.client.values == {}
+
+    def test_uses_cache_instance_and_own_db(self, monkeypatch):
+        monkeypatch.setenv("REDIS_CACHE_HOST", "cachehost")
+        monkeypatch.setenv("TEXT_CACHE_REDIS_DB", "3")
+        monkeypatch.setenv("EMBED_CACHE_REDIS_DB", "0")
+        assert text_cache_from_env().url == "redis://cachehost:6379/3"
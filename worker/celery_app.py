@@ -1,5 +1,6 @@
 """Celery Application Configuration"""
 import os
+import socket
 from celery import Celery
 from celery.schedules import crontab
 
@@ -10,6 +11,11 @@ BROKER_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
 RESULT_BACKEND = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
 NAS_SYNC_SCHEDULE = os.getenv("NAS_SYNC_SCHEDULE", "0 2 * * *")
 
+# Keep Redis sockets alive between bursts instead of reconnecting
+_SOCKET_KEEPALIVE_OPTIONS = (
+    {socket.TCP_KEEPIDLE: 60} if hasattr(socket, "TCP_KEEPIDLE") else {}
+)
+
 
 def parse_cron_schedule(expr: str):
     """Parse simple 5-field cron expression for celery crontab."""
@@ -44,10 +50,25 @@ app.conf.update(
     timezone="UTC",
     enable_utc=True,
     task_track_started=True,
+    # Nothing reads task results back; tasks opt in with ignore_result=False
+    task_ignore_result=True,
     task_time_limit=3600,  # 1 hour
     task_soft_time_limit=3000,  # 50 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    # Connection pooling / keepalive for broker and result backend
+    broker_pool_limit=32,
+    broker_connection_retry_on_startup=True,
+    broker_transport_options={
+        "socket_keepalive": True,
+        "socket_keepalive_options": _SOCKET_KEEPALIVE_OPTIONS,
+        "visibility_timeout": 3600,
+    },
+    result_backend_transport_options={"socket_keepalive": True},
+    redis_backend_health_check_interval=30,
+    # Task args and results (e.g. float lists) are compressed on the wire
+    task_compression="zstd",
+    result_compression="zstd",
 )
 
 # Scheduled tasks (Celery Beat)
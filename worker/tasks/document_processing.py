@@ -6,20 +6,36 @@ Chunking: Hybrid Chunking Service (Port 8003)
 Embedding: E5 Embedding Service (Port 8002)
 """
 import asyncio
+import contextlib
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-from uuid import uuid4
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar, Union
 
+import numpy as np
 from celery import Task
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, PointIdsList, PointStruct, VectorParams
-from sqlalchemy import create_engine, text
+from celery.signals import worker_process_init, worker_process_shutdown
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    Distance,
+    PointIdsList,
+    PointStruct,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    VectorParams,
+)
+from sqlalchemy import column, create_engine, func, insert, table, text
 
 from celery_app import app
 
-from shared.service_client import OCRClient, ChunkingClient, EmbeddingClient
+from shared.service_client import OCRClient, ChunkingClient, EmbeddingClient, BatchingEmbeddingClient
+from tasks.embedding_cache import embedding_cache_from_env
+from tasks.file_io import drop_cached_pages
+from tasks.text_cache import text_cache_from_env
+from tasks.pdf_extract import extract_pdf, shutdown_pool as shutdown_pdf_pool
 
 logger = logging.getLogger(__name__)
 
@@ -27,8 +43,93 @@ logger = logging.getLogger(__name__)
 ocr_client = OCRClient(base_url=os.getenv("OCR_URL", "http://ocr_service:8001"))
 chunking_client = ChunkingClient(base_url=os.getenv("CHUNKING_URL", "http://chunking_service:8003"))
 embedding_client = EmbeddingClient(base_url=os.getenv("EMBEDDING_URL", "http://embedding_service:8002"))
+# Chunks from concurrent documents on this worker's loop share /embed calls
+# (limits from EMBED_CLIENT_MAX_BATCH / EMBED_CLIENT_MAX_WAIT_MS)
+embedding_batcher = BatchingEmbeddingClient(embedding_client, format="fp16")
+embedding_cache = embedding_cache_from_env()
+text_cache = text_cache_from_env()
 
 _db_engine = None
+_qdrant_client: Optional[QdrantClient] = None
+_async_qdrant_client: Optional[AsyncQdrantClient] = None
+_collection_ready = False
+_collection_lock = threading.Lock()
+
+# Blocking document parsers (PyMuPDF, python-docx, calamine/openpyxl, python-pptx)
+_EXTRACT_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="extract")
+
+T = TypeVar("T")
+
+# One event loop per worker process, running on a daemon thread, so the
+# pooled HTTP/gRPC clients above stay connected across tasks.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+
+# Points per Qdrant upsert request and how many requests run at once
+QDRANT_BATCH_SIZE = int(os.getenv("QDRANT_BATCH_SIZE", "64"))
+QDRANT_UPSERT_CONCURRENCY = 2
+
+# int8 copies of the vectors in RAM for search; originals stay on disk for rescoring
+INT8_QUANTIZATION = ScalarQuantization(
+    scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+)
+
+_NO_EMBEDDINGS = np.empty((0, 0), dtype=np.float32)
+
+# Longer extracted texts are chunked and embedded in sections of about this size
+PIPELINE_SECTION_CHARS = int(os.getenv("PIPELINE_SECTION_CHARS", "50000"))
+
+# Chunk point IDs are doc_id * POINTS_PER_DOCUMENT + chunk_idx
+POINTS_PER_DOCUMENT = 100_000
+
+# SQL statements, parsed once at import
+_SELECT_QDRANT_IDS = text("SELECT qdrant_id FROM doc_chunk WHERE doc_id = :doc_id AND qdrant_id IS NOT NULL")
+_DELETE_CHUNKS = text("DELETE FROM doc_chunk WHERE doc_id = :doc_id")
+_MARK_INDEXED = text("UPDATE document SET status = 'indexed', updated_at = NOW() WHERE doc_id = :doc_id")
+_MARK_STATUS = text("UPDATE document SET status = :status, updated_at = NOW() WHERE doc_id = :doc_id")
+_UPSERT_DOCUMENT = text(
+    """
+    WITH prev AS (
+        SELECT doc_id FROM document WHERE hash = :hash
+    ), upserted AS (
+        INSERT INTO document (
+            file_name, path, type, hash, size, mtime_ns,
+            dept_id, role_id, status, created_at, updated_at
+        )
+        VALUES (
+            :file_name, :path, :type, :hash, :size, :mtime_ns,
+            :dept_id, :role_id, 'processing', NOW(), NOW()
+        )
+        ON CONFLICT (hash) DO UPDATE SET
+            file_name = EXCLUDED.file_name,
+            path = EXCLUDED.path,
+            type = EXCLUDED.type,
+            size = EXCLUDED.size,
+            mtime_ns = EXCLUDED.mtime_ns,
+            status = 'processing',
+            updated_at = NOW()
+        WHERE NOT (
+            document.status = 'indexed'
+            AND document.size IS NOT DISTINCT FROM EXCLUDED.size
+            AND document.path = EXCLUDED.path
+        )
+        RETURNING doc_id
+    )
+    SELECT
+        (SELECT doc_id FROM upserted) AS doc_id,
+        (SELECT doc_id FROM prev) AS existing_doc_id
+    """
+)
+# Core insert() rather than text(): only compiled INSERTs get SQLAlchemy's
+# multi-row "insertmanyvalues" batching; a text() executemany is one
+# statement per row under psycopg2.
+_DOC_CHUNK = table(
+    "doc_chunk",
+    column("doc_id"), column("chunk_idx"), column("content"), column("token_cnt"),
+    column("qdrant_id"), column("embed_model"), column("created_at"), column("updated_at"),
+)
+_INSERT_CHUNKS = insert(_DOC_CHUNK).values(created_at=func.now(), updated_at=func.now())
 
 
 def get_db_engine():
@@ -41,48 +142,144 @@ def get_db_engine():
         password = os.getenv("POSTGRES_PASSWORD", "securepassword")
         database = os.getenv("POSTGRES_DB", "onprem_llm")
         dsn = f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{database}"
-        _db_engine = create_engine(dsn, pool_pre_ping=True)
+        _db_engine = create_engine(
+            dsn,
+            pool_pre_ping=True,
+            # Multi-row VALUES pages for executemany INSERTs, execute_batch
+            # for other executemany statements
+            executemany_mode="values_plus_batch",
+            insertmanyvalues_page_size=500,
+        )
     return _db_engine
 
 
 def get_qdrant_client() -> QdrantClient:
-    """Create Qdrant client from environment."""
-    return QdrantClient(
-        host=os.getenv("QDRANT_HOST", "qdrant"),
-        port=int(os.getenv("QDRANT_PORT", "6333")),
-        timeout=30,
-    )
+    """Create and cache Qdrant client from environment."""
+    global _qdrant_client
+    if _qdrant_client is None:
+        _qdrant_client = QdrantClient(
+            host=os.getenv("QDRANT_HOST", "qdrant"),
+            port=int(os.getenv("QDRANT_PORT", "6333")),
+            timeout=30,
+        )
+    return _qdrant_client
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """Create and cache an async gRPC Qdrant client for bulk upserts.
+
+    Only use it from coroutines run through run_async(); its channel is
+    bound to the worker's event loop.
+    """
+    global _async_qdrant_client
+    if _async_qdrant_client is None:
+        _async_qdrant_client = AsyncQdrantClient(
+            host=os.getenv("QDRANT_HOST", "qdrant"),
+            port=int(os.getenv("QDRANT_PORT", "6333")),
+            grpc_port=int(os.getenv("QDRANT_GRPC_PORT", "6334")),
+            prefer_grpc=True,
+            timeout=30,
+        )
+    return _async_qdrant_client
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Return this process's background event loop, starting it if needed.
+
+    Started from worker_process_init in prefork children; the pid check
+    also covers solo/threads pools and a loop inherited across fork.
+    """
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid() or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(
+                target=_loop.run_forever, name="worker-event-loop", daemon=True,
+            ).start()
+        return _loop
+
+
+def run_async(coro: Awaitable[T]) -> T:
+    """Run a coroutine on the worker event loop and block for its result."""
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    try:
+        return future.result()
+    except BaseException:
+        # e.g. SoftTimeLimitExceeded: don't leave the coroutine running
+        future.cancel()
+        raise
+
+
+async def _warm_up_clients() -> None:
+    await asyncio.gather(ocr_client.warmup(), chunking_client.warmup(), embedding_client.warmup())
+
+
+@worker_process_init.connect
+def _start_event_loop(**kwargs) -> None:
+    # Connect to the services in the background; the first task reuses them
+    asyncio.run_coroutine_threadsafe(_warm_up_clients(), get_event_loop())
+
+
+async def _close_async_clients() -> None:
+    global _async_qdrant_client
+    closers = [ocr_client.aclose(), chunking_client.aclose(), embedding_batcher.aclose()]
+    if embedding_cache is not None:
+        closers.append(embedding_cache.aclose())
+    if text_cache is not None:
+        closers.append(text_cache.aclose())
+    if _async_qdrant_client is not None:
+        closers.append(_async_qdrant_client.close())
+        _async_qdrant_client = None
+    await asyncio.gather(*closers)
+
+
+@worker_process_shutdown.connect
+def _stop_event_loop(**kwargs) -> None:
+    if _loop is None or _loop_pid != os.getpid() or _loop.is_closed():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_close_async_clients(), _loop).result(timeout=10)
+    except Exception as e:
+        logger.warning(f"Failed to close async clients: {e}")
+    _loop.call_soon_threadsafe(_loop.stop)
+
+
+@worker_process_shutdown.connect
+def _stop_pdf_pool(**kwargs) -> None:
+    shutdown_pdf_pool()
 
 
 def ensure_qdrant_collection(client: QdrantClient) -> str:
-    """Create collection if missing."""
+    """Create collection if missing. Checked once per worker process."""
+    global _collection_ready
     collection_name = os.getenv("QDRANT_COLLECTION_NAME", "documents")
-    vector_size = int(os.getenv("QDRANT_VECTOR_SIZE", "1024"))
-    collections = client.get_collections().collections
-    names = {collection.name for collection in collections}
-    if collection_name not in names:
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
-        )
+    if _collection_ready:
+        return collection_name
+    with _collection_lock:
+        if _collection_ready:
+            return collection_name
+        vector_size = int(os.getenv("QDRANT_VECTOR_SIZE", "1024"))
+        collections = client.get_collections().collections
+        names = {collection.name for collection in collections}
+        if collection_name not in names:
+            client.create_collection(
+                collection_name=collection_name,
+                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
+                quantization_config=INT8_QUANTIZATION,
+            )
+        _collection_ready = True
     return collection_name
 
 
-def get_existing_document(file_hash: str) -> Optional[Dict[str, Any]]:
-    """Load existing document row by file hash."""
-    engine = get_db_engine()
-    with engine.connect() as conn:
-        row = conn.execute(
-            text(
-                """
-                SELECT doc_id
-                FROM document
-                WHERE hash = :file_hash
-                """
-            ),
-            {"file_hash": file_hash},
-        ).mappings().first()
-        return dict(row) if row else None
+def chunk_point_id(doc_id: int, chunk_idx: int) -> int:
+    """Deterministic integer Qdrant point ID for a document chunk."""
+    return doc_id * POINTS_PER_DOCUMENT + chunk_idx
+
+
+def _as_point_id(qdrant_id: str) -> Union[int, str]:
+    # doc_chunk.qdrant_id is text: integer IDs, or UUIDs from older indexing
+    return int(qdrant_id) if qdrant_id.isdigit() else qdrant_id
 
 
 def get_existing_qdrant_ids(doc_id: int) -> List[str]:
@@ -90,68 +287,78 @@ def get_existing_qdrant_ids(doc_id: int) -> List[str]:
     engine = get_db_engine()
     with engine.connect() as conn:
         rows = conn.execute(
-            text("SELECT qdrant_id FROM doc_chunk WHERE doc_id = :doc_id AND qdrant_id IS NOT NULL"),
+            _SELECT_QDRANT_IDS,
             {"doc_id": doc_id},
         ).all()
         return [row[0] for row in rows]
 
 
 def delete_existing_qdrant_points(client: QdrantClient, collection_name: str, point_ids: List[str]) -> None:
-    """Delete previous vectors before re-indexing modified document."""
+    """Delete previous vectors before re-indexing modified document.
+
+    wait=False like the upserts: Qdrant applies a collection's operations in
+    WAL order, so the delete still lands before the re-upserted points.
+    """
     if not point_ids:
         return
     client.delete(
         collection_name=collection_name,
-        points_selector=PointIdsList(points=point_ids),
+        points_selector=PointIdsList(points=[_as_point_id(point_id) for point_id in point_ids]),
+        wait=False,
     )
 
 
-def delete_existing_chunks(doc_id: int) -> None:
-    """Delete existing chunks from doc_chunk table before re-indexing."""
-    engine = get_db_engine()
-    with engine.begin() as conn:
-        conn.execute(
-            text("DELETE FROM doc_chunk WHERE doc_id = :doc_id"),
-            {"doc_id": doc_id},
-        )
-
-
-def upsert_to_qdrant(
-    client: QdrantClient,
+async def upsert_to_qdrant(
+    client: AsyncQdrantClient,
     collection_name: str,
     doc_id: int,
     chunks: List[str],
-    embeddings: List[List[float]],
+    embeddings: np.ndarray,
     dept_id: int,
     role_id: int,
     filename: str,
     file_path: str,
     file_type: str,
 ) -> List[str]:
-    """Upsert chunk vectors with RBAC payload into Qdrant."""
-    points: List[PointStruct] = []
-    point_ids: List[str] = []
-    for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-        point_id = str(uuid4())
-        point_ids.append(point_id)
-        points.append(
-            PointStruct(
-                id=point_id,
-                vector=embedding,
-                payload={
-                    "document_id": doc_id,
-                    "chunk_index": idx,
-                    "content": chunk,
-                    "filename": filename,
-                    "file_path": file_path,
-                    "file_type": file_type,
-                    "dept_id": dept_id,
-                    "role_id": role_id,
-                },
-            )
+    """Upsert chunk vectors with RBAC payload into Qdrant.
+
+    Points go out in QDRANT_BATCH_SIZE slices, at most
+    QDRANT_UPSERT_CONCURRENCY requests in flight. wait=False returns once
+    Qdrant has written each batch to its WAL; it applies them in order.
+    """
+    if len(chunks) > POINTS_PER_DOCUMENT:
+        raise ValueError(f"Document {doc_id} has {len(chunks)} chunks; max is {POINTS_PER_DOCUMENT}")
+
+    ids = [chunk_point_id(doc_id, idx) for idx in range(len(chunks))]
+    base_payload = {
+        "document_id": doc_id,
+        "filename": filename,
+        "file_path": file_path,
+        "file_type": file_type,
+        "dept_id": dept_id,
+        "role_id": role_id,
+    }
+    points = [
+        PointStruct(
+            id=point_id,
+            # PointStruct validates plain lists; one C-level tolist() per row
+            vector=embedding.tolist(),
+            payload={**base_payload, "chunk_index": idx, "content": chunk},
         )
+        for idx, (point_id, chunk, embedding) in enumerate(zip(ids, chunks, embeddings))
+    ]
+    point_ids = [str(point_id) for point_id in ids]
+
+    semaphore = asyncio.Semaphore(QDRANT_UPSERT_CONCURRENCY)
+
+    async def upsert_batch(batch: List[PointStruct]) -> None:
+        async with semaphore:
+            await client.upsert(collection_name=collection_name, points=batch, wait=False)
 
-    client.upsert(collection_name=collection_name, points=points)
+    await asyncio.gather(*[
+        upsert_batch(points[i:i + QDRANT_BATCH_SIZE])
+        for i in range(0, len(points), QDRANT_BATCH_SIZE)
+    ])
     return point_ids
 
 
@@ -163,92 +370,87 @@ def upsert_document_metadata(
     file_hash: str,
     dept_id: int,
     role_id: int,
-    existing_doc_id: Optional[int] = None,
-) -> int:
-    """Upsert document metadata into PostgreSQL. Returns doc_id."""
+    mtime_ns: Optional[int] = None,
+) -> Dict[str, Optional[int]]:
+    """Insert or claim the document row for file_hash in one statement.
+
+    Returns {"doc_id", "existing_doc_id"}. existing_doc_id is set when a row
+    with this hash already existed (re-index). doc_id is None when that row
+    is already indexed with the same size and path, i.e. nothing to redo;
+    otherwise the row is (re)set to status 'processing'.
+    """
     engine = get_db_engine()
     with engine.begin() as conn:
-        if existing_doc_id:
-            conn.execute(
-                text(
-                    """
-                    UPDATE document SET
-                        file_name = :file_name,
-                        path = :path,
-                        type = :type,
-                        size = :size,
-                        status = 'processing',
-                        updated_at = NOW()
-                    WHERE doc_id = :doc_id
-                    """
-                ),
-                {
-                    "file_name": filename,
-                    "path": file_path,
-                    "type": file_type,
-                    "size": file_size,
-                    "doc_id": existing_doc_id,
-                },
-            )
-            return existing_doc_id
-        else:
-            result = conn.execute(
-                text(
-                    """
-                    INSERT INTO document (
-                        file_name, path, type, hash, size,
-                        dept_id, role_id, status, created_at, updated_at
-                    )
-                    VALUES (
-                        :file_name, :path, :type, :hash, :size,
-                        :dept_id, :role_id, 'processing', NOW(), NOW()
-                    )
-                    RETURNING doc_id
-                    """
-                ),
-                {
-                    "file_name": filename,
-                    "path": file_path,
-                    "type": file_type,
-                    "hash": file_hash,
-                    "size": file_size,
-                    "dept_id": dept_id,
-                    "role_id": role_id,
-                },
-            )
-            return result.scalar_one()
+        row = conn.execute(
+            _UPSERT_DOCUMENT,
+            {
+                "file_name": filename,
+                "path": file_path,
+                "type": file_type,
+                "hash": file_hash,
+                "size": file_size,
+                "mtime_ns": mtime_ns,
+                "dept_id": dept_id,
+                "role_id": role_id,
+            },
+        ).mappings().one()
+        return dict(row)
+
+
+def _insert_doc_chunks(
+    conn,
+    doc_id: int,
+    chunks: List[str],
+    token_counts: List[int],
+    point_ids: List[str],
+    embed_model: str,
+) -> None:
+    """Insert chunk rows into doc_chunk with one executemany.
 
+    SQLAlchemy sends it as multi-row INSERTs of up to 500 rows each
+    (insertmanyvalues_page_size) rather than one INSERT per chunk.
+    """
+    if not chunks:
+        return
+    params = [
+        {
+            "doc_id": doc_id,
+            "chunk_idx": idx,
+            "content": chunk,
+            "token_cnt": token_cnt,
+            "qdrant_id": point_id,
+            "embed_model": embed_model,
+        }
+        for idx, (chunk, token_cnt, point_id) in enumerate(zip(chunks, token_counts, point_ids))
+    ]
+    conn.execute(_INSERT_CHUNKS, params)
 
-def insert_doc_chunks(
+
+def persist_document_atomic(
     doc_id: int,
     chunks: List[str],
+    token_counts: List[int],
     point_ids: List[str],
+    replace_existing: bool = False,
     embed_model: str = "e5-large",
 ) -> None:
-    """Insert chunk rows into doc_chunk table."""
+    """Replace a document's chunk rows and mark it indexed in one transaction.
+
+    The document row itself is written up front by upsert_document_metadata,
+    since its doc_id goes into the Qdrant payload.
+    """
     engine = get_db_engine()
     with engine.begin() as conn:
-        for idx, (chunk, point_id) in enumerate(zip(chunks, point_ids)):
+        if replace_existing:
             conn.execute(
-                text(
-                    """
-                    INSERT INTO doc_chunk (
-                        doc_id, chunk_idx, content, token_cnt, qdrant_id, embed_model, created_at, updated_at
-                    )
-                    VALUES (
-                        :doc_id, :chunk_idx, :content, :token_cnt, :qdrant_id, :embed_model, NOW(), NOW()
-                    )
-                    """
-                ),
-                {
-                    "doc_id": doc_id,
-                    "chunk_idx": idx,
-                    "content": chunk,
-                    "token_cnt": len(chunk.split()),
-                    "qdrant_id": point_id,
-                    "embed_model": embed_model,
-                },
+                _DELETE_CHUNKS,
+                {"doc_id": doc_id},
             )
+        _insert_doc_chunks(conn, doc_id, chunks, token_counts, point_ids, embed_model)
+        conn.execute(
+            _MARK_INDEXED,
+            {"doc_id": doc_id},
+        )
 
 
 def mark_document_status(doc_id: int, status: str) -> None:
@@ -256,55 +458,124 @@ def mark_document_status(doc_id: int, status: str) -> None:
     engine = get_db_engine()
     with engine.begin() as conn:
         conn.execute(
-            text("UPDATE document SET status = :status, updated_at = NOW() WHERE doc_id = :doc_id"),
+            _MARK_STATUS,
             {"status": status, "doc_id": doc_id},
         )
 
 
-async def extract_text_async(file_path: str, file_type: str) -> str:
-    """Extract text from document using appropriate service."""
+OCR_FILE_TYPES = frozenset({".tif", ".tiff", ".png", ".jpg", ".jpeg"})
+
+
+def _extract_pdf(file_path: str) -> str:
+    """PDF text via PyMuPDF, page ranges in parallel for long files; PyPDF2 as fallback."""
+    try:
+        return extract_pdf(file_path)
+    except Exception as e:
+        logger.warning(f"PyMuPDF failed on {file_path}, falling back to PyPDF2: {e}")
+
+    from PyPDF2 import PdfReader
+    reader = PdfReader(file_path)
+    return "\n".join([page.extract_text() for page in reader.pages])
+
+
+def _extract_spreadsheet(file_path: str) -> str:
+    """Cell text via python-calamine (Rust, reads .xls too); openpyxl as fallback."""
+    try:
+        from python_calamine import CalamineWorkbook
+        wb = CalamineWorkbook.from_path(file_path)
+        return "\n".join(
+            " ".join([str(cell) for cell in row if cell])
+            for name in wb.sheet_names
+            for row in wb.get_sheet_by_name(name).to_python(skip_empty_area=True)
+        )
+    except Exception as e:
+        logger.warning(f"calamine failed on {file_path}, falling back to openpyxl: {e}")
+
+    import openpyxl
+    # read_only streams rows instead of building the whole cell tree
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        return "\n".join(
+            " ".join([str(cell) for cell in row if cell])
+            for sheet in wb.worksheets
+            for row in sheet.iter_rows(values_only=True)
+        )
+    finally:
+        wb.close()
+
+
+def _extract_docx(file_path: str) -> str:
+    import docx
+    doc = docx.Document(file_path)
+    return "\n".join([para.text for para in doc.paragraphs])
+
+
+def _extract_pptx(file_path: str) -> str:
+    from pptx import Presentation
+    prs = Presentation(file_path)
+    return "\n".join(
+        shape.text
+        for slide in prs.slides
+        for shape in slide.shapes
+        if hasattr(shape, "text")
+    )
+
+
+# Blocking extractor per non-image file type; each imports its parser on first use
+EXTRACTORS: Dict[str, Callable[[str], str]] = {
+    ".pdf": _extract_pdf,
+    ".docx": _extract_docx,
+    ".doc": _extract_docx,
+    ".xlsx": _extract_spreadsheet,
+    ".xls": _extract_spreadsheet,
+    ".pptx": _extract_pptx,
+    ".ppt": _extract_pptx,
+}
+
+
+async def extract_text_async(
+    file_path: str,
+    file_type: str,
+    file_hash: Optional[str] = None,
+    stage: Optional[Callable[[str], Any]] = None,
+) -> str:
+    """Extract text from document using appropriate service.
+
+    Images go to the OCR service, inside stage("ocr") when a stage is
+    given; other formats are parsed in _EXTRACT_POOL, which bounds them
+    itself, so the loop keeps serving other documents' requests.
+    With file_hash, text cached from an earlier run on the same content is
+    returned without touching the file.
+    """
+    if file_hash and text_cache:
+        cached = await text_cache.get(file_hash)
+        if cached is not None:
+            logger.info(f"Using cached text ({len(cached)} chars) for {file_path}")
+            return cached
+
     extracted = ""
 
     try:
-        if file_type in [".tif", ".tiff", ".png", ".jpg", ".jpeg"]:
-            result = await ocr_client.ocr(file_path)
+        if file_type in OCR_FILE_TYPES:
+            async with stage("ocr") if stage else contextlib.nullcontext():
+                result = await ocr_client.ocr(file_path)
             extracted = result.get("text", "")
             logger.info(f"OCR extracted {len(extracted)} chars from {file_path}")
-
-        elif file_type in [".pdf"]:
-            from PyPDF2 import PdfReader
-            reader = PdfReader(file_path)
-            extracted = "\n".join([page.extract_text() for page in reader.pages])
-
-        elif file_type in [".docx", ".doc"]:
-            import docx
-            doc = docx.Document(file_path)
-            extracted = "\n".join([para.text for para in doc.paragraphs])
-
-        elif file_type in [".xlsx", ".xls"]:
-            import openpyxl
-            wb = openpyxl.load_workbook(file_path)
-            extracted = ""
-            for sheet in wb.worksheets:
-                for row in sheet.iter_rows(values_only=True):
-                    extracted += " ".join([str(cell) for cell in row if cell]) + "\n"
-
-        elif file_type in [".pptx", ".ppt"]:
-            from pptx import Presentation
-            prs = Presentation(file_path)
-            extracted = ""
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        extracted += shape.text + "\n"
-
+        elif file_type in EXTRACTORS:
+            loop = asyncio.get_running_loop()
+            extracted = await loop.run_in_executor(_EXTRACT_POOL, EXTRACTORS[file_type], file_path)
+            # Read once; don't let it displace the worker's hot pages
+            await loop.run_in_executor(_EXTRACT_POOL, drop_cached_pages, file_path)
         else:
             logger.warning(f"Unsupported file type: {file_type}")
 
     except Exception as e:
         logger.error(f"Failed to extract text from {file_path}: {e}")
 
-    return extracted.strip()
+    extracted = extracted.strip()
+    if extracted and file_hash and text_cache:
+        await text_cache.set(file_hash, extracted)
+    return extracted
 
 
 async def chunk_text_async(
@@ -312,10 +583,14 @@ async def chunk_text_async(
     method: str = "hybrid",
     chunk_size: int = 1000,
     overlap: int = 200
-) -> List[str]:
-    """Chunk text using Hybrid Chunking Service."""
+) -> Tuple[List[str], List[int]]:
+    """Chunk text using Hybrid Chunking Service.
+
+    Returns the chunks and their word counts (doc_chunk.token_cnt), taken
+    from the service response when it provides them.
+    """
     if not text:
-        return []
+        return [], []
 
     try:
         result = await chunking_client.chunk(
@@ -325,99 +600,189 @@ async def chunk_text_async(
             chunk_overlap=overlap,
         )
         chunks = result.get("chunks", [])
+        token_counts = result.get("token_counts") or [len(chunk.split()) for chunk in chunks]
         logger.info(f"Chunking created {len(chunks)} chunks (method={method})")
-        return chunks
+        return chunks, token_counts
 
     except Exception as e:
         logger.error(f"Chunking failed: {e}")
-        return []
+        return [], []
 
 
-async def embed_chunks_async(chunks: List[str], batch_size: int = 32) -> List[List[float]]:
-    """Generate embeddings using E5 Embedding Service."""
+async def embed_chunks_async(chunks: List[str]) -> np.ndarray:
+    """Generate embeddings using E5 Embedding Service.
+
+    Repeated chunks (headers, footers, disclaimers) are embedded once.
+    Chunks already in the embedding cache are not sent to the service; the
+    rest go through the shared batcher, which merges (and dedupes) them with
+    chunks from other documents being processed on the same loop.
+    The batcher caps each /embed request at EMBED_CLIENT_MAX_BATCH texts
+    and about EMBED_CLIENT_MAX_TOKENS tokens.
+    Returns one contiguous (n, dim) float32 array; empty on failure.
+    """
     if not chunks:
-        return []
+        return _NO_EMBEDDINGS
 
     try:
-        result = await embedding_client.embed(
-            texts=chunks,
-            normalize=True,
-            batch_size=batch_size,
+        row_of = {chunk: i for i, chunk in enumerate(dict.fromkeys(chunks))}
+        unique = list(row_of)
+
+        cached = await embedding_cache.get_many(unique, normalize=True) if embedding_cache else [None] * len(unique)
+        miss_idx = [i for i, vector in enumerate(cached) if vector is None]
+        misses = [unique[i] for i in miss_idx]
+
+        fetched = None
+        if misses:
+            result = await embedding_batcher.embed(misses, normalize=True)
+            fetched = result["embeddings"]
+            if embedding_cache:
+                await embedding_cache.set_many(misses, normalize=True, vectors=fetched)
+
+        dimension = fetched.shape[1] if fetched is not None else len(cached[0])
+        unique_embeddings = np.empty((len(unique), dimension), dtype=np.float32)
+        if fetched is not None:
+            unique_embeddings[miss_idx] = fetched
+        for i, vector in enumerate(cached):
+            if vector is not None:
+                unique_embeddings[i] = vector
+
+        embeddings = (
+            unique_embeddings if len(unique) == len(chunks)
+            else unique_embeddings[[row_of[chunk] for chunk in chunks]]
+        )
+        logger.info(
+            f"Embedded {len(embeddings)} chunks (dimension={dimension}, "
+            f"unique={len(unique)}, cached={len(unique) - len(misses)})"
         )
-        embeddings = result.get("embeddings", [])
-        dimension = result.get("dimension", 0)
-        logger.info(f"Embedded {len(embeddings)} chunks (dimension={dimension})")
         return embeddings
 
     except Exception as e:
         logger.error(f"Embedding failed: {e}")
-        return []
-
-
-@app.task(name="tasks.document_processing.process_document", bind=True)
-def process_document(
-    self: Task,
+        return _NO_EMBEDDINGS
+
+
+def split_sections(text: str, max_chars: int) -> List[str]:
+    """Split text at paragraph (else line) breaks into pieces of at most ~max_chars."""
+    sections = []
+    start = 0
+    while len(text) - start > max_chars:
+        end = start + max_chars
+        cut = text.rfind("\n\n", start, end)
+        if cut <= start:
+            cut = text.rfind("\n", start, end)
+        if cut <= start:
+            cut = end
+        sections.append(text[start:cut])
+        start = cut
+    sections.append(text[start:])
+    return sections
+
+
+async def chunk_and_embed_async(
+    text: str,
+    stage: Callable[[str], Any],
+) -> Tuple[List[str], List[int], np.ndarray]:
+    """Chunk and embed text, overlapping the two stages on long documents.
+
+    Text longer than PIPELINE_SECTION_CHARS is split into sections that are
+    chunked concurrently; each section's chunks are embedded as soon as
+    they arrive instead of after the whole document is chunked. Chunk
+    overlap does not span section borders.
+
+    All or nothing: chunks are empty if any non-blank section fails to
+    chunk, and embeddings are empty if any section fails to embed, so a
+    document is never indexed from part of its text.
+    """
+    async def run(section: str) -> Tuple[List[str], List[int], np.ndarray]:
+        async with stage("chunk"):
+            chunks, token_counts = await chunk_text_async(section, method="hybrid", chunk_size=1000, overlap=200)
+        if not chunks:
+            return [], [], _NO_EMBEDDINGS
+        async with stage("embed"):
+            embeddings = await embed_chunks_async(chunks)
+        return chunks, token_counts, embeddings
+
+    sections = split_sections(text, PIPELINE_SECTION_CHARS)
+    results = await asyncio.gather(*[run(section) for section in sections])
+    if any(section.strip() and not section_chunks for section, (section_chunks, _, _) in zip(sections, results)):
+        return [], [], _NO_EMBEDDINGS
+
+    chunks = [chunk for section_chunks, _, _ in results for chunk in section_chunks]
+    token_counts = [count for _, section_counts, _ in results for count in section_counts]
+    if any(section_chunks and len(embeddings) == 0 for section_chunks, _, embeddings in results):
+        return chunks, token_counts, _NO_EMBEDDINGS
+    parts = [embeddings for section_chunks, _, embeddings in results if section_chunks]
+    return chunks, token_counts, np.concatenate(parts) if parts else _NO_EMBEDDINGS
+
+
+def _stage_limits() -> Dict[str, asyncio.Semaphore]:
+    """Per-service concurrency caps for process_document_batch."""
+    return {
+        "ocr": asyncio.Semaphore(int(os.getenv("PIPELINE_OCR_CONCURRENCY", "4"))),
+        "chunk": asyncio.Semaphore(int(os.getenv("PIPELINE_CHUNK_CONCURRENCY", "8"))),
+        "embed": asyncio.Semaphore(int(os.getenv("PIPELINE_EMBED_CONCURRENCY", "8"))),
+    }
+
+
+async def process_document_async(
     file_path: str,
     file_hash: str,
     dept_id: int,
-    role_id: int
-):
-    """
-    Process a single document using microservices:
-    1. Extract text (GLM-OCR for images, libraries for docs)
-    2. Chunk text (Hybrid Chunking Service)
-    3. Generate embeddings (E5 Embedding Service)
-    4. Upsert to Qdrant
-    5. Log to PostgreSQL (document + doc_chunk)
+    role_id: int,
+    limits: Optional[Dict[str, asyncio.Semaphore]] = None,
+) -> Dict[str, Any]:
+    """Run the full pipeline for one document on the worker loop.
+
+    Blocking Postgres/Qdrant calls go to threads so several documents can
+    share the loop; `limits` caps how many are in each service stage.
     """
-    logger.info(f"Processing document: {file_path}")
+    def stage(name: str):
+        return limits[name] if limits else contextlib.nullcontext()
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    logger.info(f"Processing document: {file_path}")
 
     try:
         path = Path(file_path)
         filename = path.name
         file_type = path.suffix.lower()
-        file_size = path.stat().st_size
-
-        # Check for existing document
-        existing_doc = get_existing_document(file_hash)
-        existing_doc_id = existing_doc["doc_id"] if existing_doc else None
+        stat = path.stat()
 
         # Upsert document metadata (status = processing)
-        doc_id = upsert_document_metadata(
+        document = await asyncio.to_thread(
+            upsert_document_metadata,
             filename=filename,
             file_path=file_path,
             file_type=file_type,
-            file_size=file_size,
+            file_size=stat.st_size,
             file_hash=file_hash,
             dept_id=dept_id,
             role_id=role_id,
-            existing_doc_id=existing_doc_id,
+            mtime_ns=stat.st_mtime_ns,
         )
+        existing_doc_id = document["existing_doc_id"]
+
+        # Same content already indexed at this path: nothing to redo
+        if document["doc_id"] is None:
+            logger.info(f"Skipping unchanged document: {file_path}")
+            return {"status": "skipped", "reason": "unchanged", "doc_id": existing_doc_id}
+        doc_id = document["doc_id"]
 
         # Step 1: Extract text
-        extracted_text = loop.run_until_complete(extract_text_async(file_path, file_type))
+        extracted_text = await extract_text_async(file_path, file_type, file_hash, stage)
         if not extracted_text:
             logger.warning(f"No text extracted from {file_path}")
-            mark_document_status(doc_id, "failed")
+            await asyncio.to_thread(mark_document_status, doc_id, "failed")
             return {"status": "skipped", "reason": "no_text"}
 
-        # Step 2: Chunk text
-        chunks = loop.run_until_complete(
-            chunk_text_async(extracted_text, method="hybrid", chunk_size=1000, overlap=200)
-        )
+        # Steps 2-3: Chunk text and generate embeddings (pipelined on long texts)
+        chunks, token_counts, embeddings = await chunk_and_embed_async(extracted_text, stage)
         if not chunks:
             logger.warning(f"No chunks created from {file_path}")
-            mark_document_status(doc_id, "failed")
+            await asyncio.to_thread(mark_document_status, doc_id, "failed")
             return {"status": "skipped", "reason": "no_chunks"}
-
-        # Step 3: Generate embeddings
-        embeddings = loop.run_until_complete(embed_chunks_async(chunks, batch_size=32))
-        if not embeddings:
+        if len(embeddings) == 0:
             logger.warning(f"No embeddings generated for {file_path}")
-            mark_document_status(doc_id, "failed")
+            await asyncio.to_thread(mark_document_status, doc_id, "failed")
             return {"status": "skipped", "reason": "no_embeddings"}
         if len(embeddings) != len(chunks):
             raise RuntimeError(
@@ -426,16 +791,17 @@ def process_document(
 
         # Step 4: Remove old Qdrant points if re-indexing
         qdrant_client = get_qdrant_client()
-        collection_name = ensure_qdrant_collection(qdrant_client)
+        collection_name = await asyncio.to_thread(ensure_qdrant_collection, qdrant_client)
 
         if existing_doc_id:
-            old_point_ids = get_existing_qdrant_ids(existing_doc_id)
-            delete_existing_qdrant_points(qdrant_client, collection_name, old_point_ids)
-            delete_existing_chunks(existing_doc_id)
+            old_point_ids = await asyncio.to_thread(get_existing_qdrant_ids, existing_doc_id)
+            await asyncio.to_thread(
+                delete_existing_qdrant_points, qdrant_client, collection_name, old_point_ids
+            )
 
         # Step 5: Upsert to Qdrant
-        point_ids = upsert_to_qdrant(
-            client=qdrant_client,
+        point_ids = await upsert_to_qdrant(
+            client=get_async_qdrant_client(),
             collection_name=collection_name,
             doc_id=doc_id,
             chunks=chunks,
@@ -447,16 +813,16 @@ def process_document(
             file_type=file_type,
         )
 
-        # Step 6: Persist chunk metadata in PostgreSQL
-        insert_doc_chunks(
+        # Step 6: Persist chunk metadata and mark indexed in one transaction
+        await asyncio.to_thread(
+            persist_document_atomic,
             doc_id=doc_id,
             chunks=chunks,
+            token_counts=token_counts,
             point_ids=point_ids,
+            replace_existing=bool(existing_doc_id),
         )
 
-        # Mark document as indexed
-        mark_document_status(doc_id, "indexed")
-
         logger.info(
             f"Successfully processed {filename}: chunks={len(chunks)}, vectors={len(point_ids)}"
         )
@@ -472,5 +838,43 @@ def process_document(
     except Exception as e:
         logger.error(f"Failed to process document {file_path}: {e}")
         return {"status": "failed", "error": str(e)}
-    finally:
-        loop.close()
+
+
+@app.task(name="tasks.document_processing.process_document", bind=True)
+def process_document(
+    self: Task,
+    file_path: str,
+    file_hash: str,
+    dept_id: int,
+    role_id: int
+):
+    """
+    Process a single document using microservices:
+    1. Extract text (GLM-OCR for images, libraries for docs)
+    2. Chunk text (Hybrid Chunking Service)
+    3. Generate embeddings (E5 Embedding Service)
+    4. Upsert to Qdrant
+    5. Log to PostgreSQL (document + doc_chunk)
+    """
+    return run_async(process_document_async(file_path, file_hash, dept_id, role_id))
+
+
+@app.task(name="tasks.document_processing.process_document_batch", bind=True)
+def process_document_batch(self: Task, documents: List[Dict[str, Any]]):
+    """
+    Process several documents concurrently through the same pipeline.
+
+    Each item has the process_document arguments (file_path, file_hash,
+    dept_id, role_id). While one document waits on embedding, the next is
+    in OCR/chunking; per-stage semaphores cap load on each service.
+    """
+    async def run_batch() -> List[Dict[str, Any]]:
+        limits = _stage_limits()
+        return list(await asyncio.gather(*[
+            process_document_async(**document, limits=limits) for document in documents
+        ]))
+
+    results = run_async(run_batch())
+    completed = sum(1 for result in results if result.get("status") == "completed")
+    logger.info(f"Processed batch of {len(documents)} documents: {completed} completed")
+    return results
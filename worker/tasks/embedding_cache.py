@@ -0,0 +1,87 @@
+"""Redis-backed cache of chunk embeddings.
+
+Chunks that recur across documents or re-syncs (headers, footers, unchanged
+sections) are embedded once; later lookups skip the embedding service.
+"""
+import hashlib
+import logging
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+# Vectors are stored as raw little-endian float16, the embedding service's wire format
+CACHE_DTYPE = "<f2"
+
+
+class EmbeddingCache:
+    """Embeddings keyed by sha256(model, normalize flag, chunk text).
+
+    Redis errors are logged and treated as misses so the cache never fails
+    a document. The asyncio connection pool is created lazily on the loop
+    that first uses it (the worker's persistent loop).
+    """
+
+    def __init__(self, url: str, model: str, ttl_seconds: int, prefix: str = "emb"):
+        self.url = url
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self._client: Optional[aioredis.Redis] = None
+
+    @property
+    def client(self) -> aioredis.Redis:
+        if self._client is None:
+            self._client = aioredis.Redis.from_url(self.url)
+        return self._client
+
+    def _key(self, text: str, normalize: bool) -> str:
+        digest = hashlib.sha256(f"{self.model}:{int(normalize)}:{text}".encode()).hexdigest()
+        return f"{self.prefix}:{digest}"
+
+    async def get_many(self, texts: Sequence[str], normalize: bool) -> List[Optional[np.ndarray]]:
+        """Cached vector per text, or None for a miss."""
+        if not texts:
+            return []
+        try:
+            values = await self.client.mget([self._key(text, normalize) for text in texts])
+        except Exception as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            return [None] * len(texts)
+        return [np.frombuffer(value, dtype=CACHE_DTYPE) if value else None for value in values]
+
+    async def set_many(self, texts: Sequence[str], normalize: bool, vectors: np.ndarray) -> None:
+        """Store one vector per text with the cache TTL."""
+        if not texts:
+            return
+        data = np.ascontiguousarray(vectors, dtype=CACHE_DTYPE)
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for text, row in zip(texts, data):
+                    pipe.set(self._key(text, normalize), row.tobytes(), ex=self.ttl_seconds)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+def embedding_cache_from_env() -> Optional[EmbeddingCache]:
+    """EmbeddingCache configured from env, or None when disabled."""
+    if os.getenv("EMBED_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    # Own instance: the broker Redis must not evict, this one must
+    host = os.getenv("REDIS_CACHE_HOST", "redis_cache")
+    port = os.getenv("REDIS_CACHE_PORT", "6379")
+    db = os.getenv("EMBED_CACHE_REDIS_DB", "0")
+    return EmbeddingCache(
+        url=f"redis://{host}:{port}/{db}",
+        model=os.getenv("EMBEDDING_MODEL", "intfloat/multilingual-e5-large"),
+        ttl_seconds=int(os.getenv("EMBED_CACHE_TTL_SECONDS", str(30 * 24 * 3600))),
+    )
@@ -0,0 +1,46 @@
+"""Page-cache hints for one-pass reads of NAS files.
+
+Files are read once front to back (hashing, extraction), so ask the kernel
+for aggressive readahead and drop their pages afterwards instead of letting
+them push the worker's own hot pages out of the cache.
+"""
+import os
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator
+
+_HAS_FADVISE = hasattr(os, "posix_fadvise")
+
+
+def _fadvise(fd: int, advice_name: str) -> None:
+    if not _HAS_FADVISE:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, getattr(os, advice_name))
+    except OSError:
+        # Some network filesystems reject the hint; it is only a hint
+        pass
+
+
+@contextmanager
+def open_nas(file_path: str) -> Iterator[BinaryIO]:
+    """Open a file unbuffered for one sequential pass, dropping its pages on close."""
+    with open(file_path, "rb", buffering=0) as f:
+        _fadvise(f.fileno(), "POSIX_FADV_SEQUENTIAL")
+        try:
+            yield f
+        finally:
+            _fadvise(f.fileno(), "POSIX_FADV_DONTNEED")
+
+
+def drop_cached_pages(file_path: str) -> None:
+    """Evict a file that a parser library has finished reading from the page cache."""
+    if not _HAS_FADVISE:
+        return
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        _fadvise(fd, "POSIX_FADV_DONTNEED")
+    finally:
+        os.close(fd)
@@ -2,26 +2,53 @@
 import logging
 import hashlib
 import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 from celery import Task
 from sqlalchemy import create_engine, text
 
 from celery_app import app
-from tasks.document_processing import process_document
+from tasks.document_processing import process_document, process_document_batch
+from tasks.file_io import open_nas
 
 logger = logging.getLogger(__name__)
 
 # Supported file extensions
-SUPPORTED_EXTENSIONS = {
+SUPPORTED_EXTENSIONS = frozenset({
     ".pdf", ".docx", ".doc", ".xlsx", ".xls",
     ".pptx", ".ppt", ".tif", ".tiff", ".png", ".jpg", ".jpeg"
-}
+})
+
+# Documents per process_document_batch task
+NAS_SYNC_BATCH_SIZE = int(os.getenv("NAS_SYNC_BATCH_SIZE", "8"))
+# Files at least this large are queued as single process_document tasks
+NAS_SYNC_LARGE_FILE_BYTES = int(os.getenv("NAS_SYNC_LARGE_FILE_BYTES", str(50 * 1024 * 1024)))
+
+# Directories listed concurrently while scanning the NAS
+NAS_SCAN_THREADS = int(os.getenv("NAS_SCAN_THREADS", "32"))
 
 _db_engine = None
 
+_SELECT_HASHES = text("SELECT path, mtime_ns, size, hash FROM document")
+# All refreshed rows in one statement: psycopg2 sends each list as one array
+_UPDATE_MTIMES = text(
+    """
+    UPDATE document AS d SET mtime_ns = v.mtime_ns
+    FROM unnest(CAST(:paths AS text[]), CAST(:hashes AS text[]), CAST(:mtimes AS bigint[]))
+        AS v(path, hash, mtime_ns)
+    WHERE d.path = v.path AND d.hash = v.hash
+    """
+)
+
+
+class KnownFile(NamedTuple):
+    mtime_ns: Optional[int]
+    size: Optional[int]
+    hash: str
+
 
 def get_db_engine():
     """Create and cache SQLAlchemy engine for NAS sync checks."""
@@ -37,44 +64,79 @@ def get_db_engine():
     return _db_engine
 
 
-def load_existing_hashes() -> Dict[str, str]:
-    """Read current indexed file hashes keyed by file path."""
+def load_existing_hashes() -> Dict[str, KnownFile]:
+    """Read stat info and hash of known files keyed by file path."""
     try:
         engine = get_db_engine()
         with engine.connect() as conn:
-            rows = conn.execute(
-                text("SELECT path, hash FROM document")
-            ).all()
-        return {row[0]: row[1] for row in rows}
+            rows = conn.execute(_SELECT_HASHES).all()
+        return {row[0]: KnownFile(row[1], row[2], row[3]) for row in rows}
     except Exception as exc:
         logger.warning(f"Could not load existing hashes, processing as fresh scan: {exc}")
         return {}
 
 
+def refresh_mtimes(touched: List[Dict[str, Any]]) -> None:
+    """Record new mtimes of files whose content hash did not change."""
+    if not touched:
+        return
+    try:
+        with get_db_engine().begin() as conn:
+            conn.execute(_UPDATE_MTIMES, {
+                "paths": [row["path"] for row in touched],
+                "hashes": [row["hash"] for row in touched],
+                "mtimes": [row["mtime_ns"] for row in touched],
+            })
+    except Exception as exc:
+        logger.warning(f"Could not refresh mtimes of {len(touched)} unchanged files: {exc}")
+
+
 def get_file_hash(file_path: str) -> str:
     """Calculate SHA-256 hash of file"""
-    sha256 = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            sha256.update(chunk)
-    return sha256.hexdigest()
+    # Unbuffered: file_digest reads straight into its own buffer with the GIL released
+    with open_nas(file_path) as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _scan_dir(directory: str) -> Tuple[List[str], List[str]]:
+    """Supported files and subdirectories directly under directory."""
+    files, subdirs = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                # Cheap string test first; is_file() may need a stat on some mounts
+                name = entry.name
+                dot = name.rfind(".")
+                if dot > 0 and name[dot:].lower() in SUPPORTED_EXTENSIONS and entry.is_file():
+                    files.append(entry.path)
+    except OSError as exc:
+        logger.warning(f"Could not scan {directory}: {exc}")
+    return files, subdirs
 
 
 def scan_nas_directory(nas_path: str) -> list:
     """
     Scan NAS directory for documents.
     Returns list of file paths.
-    """
-    files = []
-    nas_root = Path(nas_path)
 
-    if not nas_root.exists():
+    Directories are listed concurrently so NAS round trips overlap.
+    """
+    if not os.path.isdir(nas_path):
         logger.error(f"NAS path does not exist: {nas_path}")
         return []
 
-    for file_path in nas_root.rglob("*"):
-        if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-            files.append(str(file_path))
+    files = []
+    with ThreadPoolExecutor(max_workers=NAS_SCAN_THREADS, thread_name_prefix="nas-scan") as pool:
+        pending = {pool.submit(_scan_dir, nas_path)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                found, subdirs = future.result()
+                files.extend(found)
+                pending.update(pool.submit(_scan_dir, subdir) for subdir in subdirs)
 
     return files
 
@@ -97,13 +159,16 @@ def extract_access_from_path(file_path: str, nas_root: str) -> Tuple[int, int]:
     return 1, 1
 
 
-@app.task(name="tasks.nas_sync.sync_nas_documents", bind=True)
+# Acked on receipt, not acks_late: a scan can outlast the broker's visibility
+# timeout, and a redelivered copy would run concurrently and queue every
+# changed file twice. A lost run is retried by the next scheduled one.
+@app.task(name="tasks.nas_sync.sync_nas_documents", bind=True, ignore_result=True)
 def sync_nas_documents(self: Task):
     """
     Daily NAS Sync Task
 
     Scans NAS directory for new/modified documents and processes them:
-    1. Detect new or modified files (by hash)
+    1. Detect new or modified files (by mtime and size, then by hash)
     2. Extract text (OCR for images)
     3. Chunk and embed
     4. Upsert to Qdrant
@@ -126,34 +191,57 @@ def sync_nas_documents(self: Task):
         files_updated = 0
         files_failed = 0
         files_unchanged = 0
-
-        for file_path in files:
-            try:
-                file_hash = get_file_hash(file_path)
-                existing_hash = existing_hashes.get(file_path)
-                if existing_hash == file_hash:
-                    files_unchanged += 1
-                    continue
-
-                dept_id, role_id = extract_access_from_path(file_path, NAS_MOUNT_PATH)
-
-                # Queue document processing task
-                process_document.delay(
-                    file_path=file_path,
-                    file_hash=file_hash,
-                    dept_id=dept_id,
-                    role_id=role_id
-                )
-
-                if existing_hash:
-                    files_updated += 1
-                else:
-                    files_added += 1
-                logger.info(f"Queued: {file_path}")
-
-            except Exception as e:
-                logger.error(f"Failed to process {file_path}: {e}")
-                files_failed += 1
+        pending = []
+        touched = []
+
+        # One broker connection and channel for every publish in this run
+        with app.producer_or_acquire() as producer:
+            for file_path in files:
+                try:
+                    known = existing_hashes.get(file_path)
+                    stat = os.stat(file_path)
+                    # Same mtime and size as last sync: assume unchanged without reading it
+                    if known and known.mtime_ns == stat.st_mtime_ns and known.size == stat.st_size:
+                        files_unchanged += 1
+                        continue
+
+                    file_hash = get_file_hash(file_path)
+                    existing_hash = known.hash if known else None
+                    if existing_hash == file_hash:
+                        touched.append({"path": file_path, "hash": file_hash, "mtime_ns": stat.st_mtime_ns})
+                        files_unchanged += 1
+                        continue
+
+                    dept_id, role_id = extract_access_from_path(file_path, NAS_MOUNT_PATH)
+
+                    document = {
+                        "file_path": file_path,
+                        "file_hash": file_hash,
+                        "dept_id": dept_id,
+                        "role_id": role_id,
+                    }
+                    # Large files get their own task so they don't hold up a batch
+                    if stat.st_size >= NAS_SYNC_LARGE_FILE_BYTES:
+                        process_document.apply_async(kwargs=document, producer=producer)
+                    else:
+                        pending.append(document)
+                    if len(pending) >= NAS_SYNC_BATCH_SIZE:
+                        process_document_batch.apply_async((pending,), producer=producer)
+                        pending = []
+
+                    if existing_hash:
+                        files_updated += 1
+                    else:
+                        files_added += 1
+                    logger.info(f"Queued: {file_path}")
+
+                except Exception as e:
+                    logger.error(f"Failed to process {file_path}: {e}")
+                    files_failed += 1
+
+            if pending:
+                process_document_batch.apply_async((pending,), producer=producer)
+        refresh_mtimes(touched)
 
         sync_end = datetime.utcnow()
         duration = (sync_end - sync_start).total_seconds()
@@ -182,7 +270,7 @@ def sync_nas_documents(self: Task):
         }
 
 
-@app.task(name="tasks.nas_sync.system_health_check")
+@app.task(name="tasks.nas_sync.system_health_check", ignore_result=True, acks_late=True)
 def system_health_check():
     """Hourly system health check"""
     logger.info("Performing system health check")
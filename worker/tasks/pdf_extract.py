@@ -0,0 +1,90 @@
+"""PDF text extraction with PyMuPDF, split across processes for large files.
+
+Kept free of the Celery/DB imports in document_processing so spawned pool
+processes start quickly.
+"""
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# PDFs with fewer pages are extracted in the calling thread
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_EXTRACT_PROCESSES = int(os.getenv("PDF_EXTRACT_PROCESSES", str(os.cpu_count() or 1)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> str:
+    """Text of pages [start, end); opens its own document so it can run in a child process."""
+    import pymupdf
+    with pymupdf.open(file_path) as doc:
+        return "\n".join(doc[i].get_text("text") for i in range(start, end))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the worker process has live loop and client threads
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+@lru_cache(maxsize=1)
+def _can_spawn() -> bool:
+    """False in daemonic processes, which multiprocessing forbids from having children.
+
+    Celery's prefork children are billiard processes that the stdlib does not
+    see as daemonic, so the pool starts there; this guards other daemonic
+    hosts, where submit() would raise AssertionError on every PDF.
+    """
+    if multiprocessing.current_process().daemon:
+        logger.error(
+            "Parallel PDF extraction disabled: worker process is daemonic and cannot start "
+            "a process pool (set PDF_EXTRACT_PROCESSES=1 to silence)"
+        )
+        return False
+    return True
+
+
+def extract_pdf(file_path: str) -> str:
+    """Text of every page, joined in page order."""
+    import pymupdf
+    with pymupdf.open(file_path) as doc:
+        page_count = doc.page_count
+        if page_count < PDF_PARALLEL_MIN_PAGES or PDF_EXTRACT_PROCESSES < 2 or not _can_spawn():
+            return "\n".join(page.get_text("text") for page in doc)
+
+    step = math.ceil(page_count / PDF_EXTRACT_PROCESSES)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    try:
+        pool = _get_pool()
+        futures = [pool.submit(extract_page_range, file_path, start, end) for start, end in ranges]
+        return "\n".join(future.result() for future in futures)
+    except BrokenProcessPool as e:
+        # A dead pool stays broken; drop it so the next PDF starts a fresh one
+        logger.error(f"PDF extraction pool broke on {file_path}, restarting it and extracting in-process: {e}")
+        shutdown_pool()
+    except Exception as e:
+        logger.error(f"Parallel PDF extraction failed for {file_path}, extracting in-process: {e!r}")
+    return extract_page_range(file_path, 0, page_count)
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
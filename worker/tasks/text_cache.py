@@ -0,0 +1,77 @@
+"""Redis-backed cache of extracted document text.
+
+Re-indexing a document whose content hash is unchanged (new chunking
+settings, new embedding model) reuses its extracted text instead of
+parsing or OCR-ing the file again.
+"""
+import logging
+import os
+import zlib
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractedTextCache:
+    """zlib-compressed extracted text keyed by file content hash.
+
+    Redis errors are logged and treated as misses, like EmbeddingCache.
+    Texts over max_bytes (UTF-8) are not cached, so a few huge documents
+    cannot crowd everything else out of the cache instance.
+    """
+
+    def __init__(self, url: str, ttl_seconds: int, max_bytes: int, prefix: str = "txt"):
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self._client: Optional[aioredis.Redis] = None
+
+    @property
+    def client(self) -> aioredis.Redis:
+        if self._client is None:
+            self._client = aioredis.Redis.from_url(self.url)
+        return self._client
+
+    def _key(self, file_hash: str) -> str:
+        return f"{self.prefix}:{file_hash}"
+
+    async def get(self, file_hash: str) -> Optional[str]:
+        try:
+            value = await self.client.get(self._key(file_hash))
+            return zlib.decompress(value).decode("utf-8") if value else None
+        except Exception as e:
+            logger.warning(f"Text cache read failed: {e}")
+            return None
+
+    async def set(self, file_hash: str, text: str) -> None:
+        data = text.encode("utf-8")
+        if len(data) > self.max_bytes:
+            logger.debug(f"Not caching {len(data)} bytes of text for {file_hash} (limit {self.max_bytes})")
+            return
+        try:
+            # Level 1: most of the size win for a fraction of the CPU
+            await self.client.set(self._key(file_hash), zlib.compress(data, 1), ex=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Text cache write failed: {e}")
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+def text_cache_from_env() -> Optional[ExtractedTextCache]:
+    """ExtractedTextCache configured from env, or None when disabled."""
+    if os.getenv("TEXT_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    host = os.getenv("REDIS_CACHE_HOST", "redis_cache")
+    port = os.getenv("REDIS_CACHE_PORT", "6379")
+    db = os.getenv("TEXT_CACHE_REDIS_DB", "1")
+    return ExtractedTextCache(
+        url=f"redis://{host}:{port}/{db}",
+        ttl_seconds=int(os.getenv("TEXT_CACHE_TTL_SECONDS", str(30 * 24 * 3600))),
+        max_bytes=int(os.getenv("TEXT_CACHE_MAX_BYTES", str(4 * 1024 * 1024))),
+    )